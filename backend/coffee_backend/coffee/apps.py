@@ -22,6 +22,17 @@ class CoffeeConfig(AppConfig):
         # Import signals so that Django registers them
         import coffee.signals  # noqa: F401
 
+        # Load the origin registry once the process starts serving (no queries during app loading)
+        from django.core.signals import request_started
+        from .origins import warm_origin_registry
+        request_started.connect(warm_origin_registry, dispatch_uid='coffee.warm_origin_registry')
+
+        # Load the risk model now (before gunicorn forks, with preload_app) rather than per worker
+        from django.conf import settings
+        if settings.ML_PRELOAD_MODEL:
+            from .ml_model_utils import warm_up_model
+            warm_up_model()
+
         if os.environ.get('RUN_MAIN') == 'true':
             from .generator import start_coffee_thread
             start_coffee_thread()
@@ -0,0 +1,219 @@
+"""
+Micro-batching of concurrent single-row risk predictions.
+
+Every /api/prediction/ request scores one row, and one predict_proba call
+per row is the worst case for the model's throughput. PredictionBatcher
+collects rows that arrive within a short window (ML_BATCH_WINDOW_MS) into
+one feature matrix, scores it with one call and hands each caller its own
+result.
+
+There is no background thread: the first request of a window becomes the
+batch leader, waits for the window to close (or for ML_BATCH_MAX_SIZE rows)
+and runs the batch; the others block until their result is in. Rows only
+meet in a worker that serves requests in several threads, so
+gunicorn.conf.py turns batching on together with gthread workers
+(GUNICORN_THREADS > 1). Views announce their prediction with
+@expects_prediction, and the leader only waits while announced requests
+have not queued their row yet: a request that is alone in its worker is
+scored immediately. With the window set to 0 rows are scored directly.
+"""
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+from django.conf import settings
+
+from .timing import histogram
+
+
+class _PendingRow:
+    __slots__ = ('features', 'enqueued_at', 'done', 'result', 'error')
+
+    def __init__(self, features):
+        self.features = features
+        self.enqueued_at = time.monotonic()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class PredictionBatcher:
+    """
+    Groups concurrent `predict(features)` calls into one `predict_batch`
+    call. `predict_batch` maps an (n, k) matrix to n results.
+    """
+
+    def __init__(self, predict_batch, window=0.003, max_batch_size=64):
+        self.predict_batch = predict_batch
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self._condition = threading.Condition()
+        self._pending = []
+        self._collecting = False
+        # Announced requests (expecting()) that have not queued their row yet
+        self._expected = 0
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self.reset_metrics()
+
+    def predict(self, features):
+        """Results for the rows of `features` (an (m, k) matrix), batched with concurrent callers."""
+        row = _PendingRow(np.atleast_2d(features))
+        if self.window <= 0:
+            self._run([row])
+        else:
+            self._enqueue(row)
+        if row.error is not None:
+            raise row.error
+        return row.result
+
+    @contextmanager
+    def expecting(self):
+        """
+        Announces that this thread is about to call predict(), so a leader
+        collecting a batch in the meantime waits for its row.
+        """
+        if self.window <= 0 or getattr(self._local, 'expected', False):
+            yield
+            return
+        with self._condition:
+            self._expected += 1
+        self._local.expected = True
+        try:
+            yield
+        finally:
+            # Still set if the request never got to predict() (cache hit, error)
+            if self._local.expected:
+                self._local.expected = False
+                with self._condition:
+                    self._expected -= 1
+                    self._condition.notify_all()
+
+    def _enqueue(self, row):
+        with self._condition:
+            if getattr(self._local, 'expected', False):
+                self._local.expected = False
+                self._expected -= 1
+            self._pending.append(row)
+            leader = not self._collecting
+            if leader:
+                self._collecting = True
+            else:
+                self._condition.notify_all()
+
+        if leader:
+            deadline = row.enqueued_at + self.window
+            with self._condition:
+                while self._expected and self._pending_rows() < self.max_batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                batch, self._pending = self._pending, []
+                self._collecting = False
+            self._run(batch)
+        else:
+            row.done.wait()
+
+    def _pending_rows(self):
+        return sum(len(row.features) for row in self._pending)
+
+    def _run(self, batch):
+        started = time.monotonic()
+        sizes = [len(row.features) for row in batch]
+        try:
+            results = self.predict_batch(np.vstack([row.features for row in batch]))
+        except Exception as e:
+            for row in batch:
+                row.error = e
+        else:
+            offset = 0
+            for row, size in zip(batch, sizes):
+                row.result = results[offset:offset + size]
+                offset += size
+        finally:
+            for row in batch:
+                row.done.set()
+            self._record(batch, sum(sizes), started, time.monotonic())
+
+    def _record(self, batch, n_rows, started, finished):
+        waits = [started - row.enqueued_at for row in batch]
+        wait_histogram = histogram('prediction.batch_wait')
+        for wait in waits:
+            wait_histogram.record(wait * 1000)
+        with self._stats_lock:
+            stats = self._stats
+            stats['batches'] += 1
+            stats['requests'] += len(batch)
+            stats['rows'] += n_rows
+            stats['max_batch_size'] = max(stats['max_batch_size'], n_rows)
+            stats['total_wait_seconds'] += sum(waits)
+            stats['max_wait_seconds'] = max(stats['max_wait_seconds'], max(waits))
+            stats['total_predict_seconds'] += finished - started
+            stats['errors'] += int(batch[0].error is not None)
+
+    def reset_metrics(self):
+        with self._stats_lock:
+            self._stats = {
+                'batches': 0, 'requests': 0, 'rows': 0, 'max_batch_size': 0,
+                'total_wait_seconds': 0.0, 'max_wait_seconds': 0.0,
+                'total_predict_seconds': 0.0, 'errors': 0,
+            }
+
+    def metrics(self):
+        """Batch size and queueing delay since the last reset."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        batches = stats['batches'] or 1
+        requests = stats['requests'] or 1
+        return {
+            'window_ms': self.window * 1000,
+            'max_batch_size_limit': self.max_batch_size,
+            'batches': stats['batches'],
+            'requests': stats['requests'],
+            'rows': stats['rows'],
+            'errors': stats['errors'],
+            'avg_batch_size': round(stats['rows'] / batches, 3),
+            'max_batch_size': stats['max_batch_size'],
+            'avg_wait_ms': round(stats['total_wait_seconds'] / requests * 1000, 3),
+            'max_wait_ms': round(stats['max_wait_seconds'] * 1000, 3),
+            'avg_predict_ms': round(stats['total_predict_seconds'] / batches * 1000, 3),
+        }
+
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+
+def get_prediction_batcher():
+    """The process-wide batcher for risk predictions (configured from settings)."""
+    global _batcher
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                from .ml_model_utils import predict_proba_batch
+
+                _batcher = PredictionBatcher(
+                    predict_proba_batch,
+                    window=getattr(settings, 'ML_BATCH_WINDOW_MS', 0) / 1000,
+                    max_batch_size=getattr(settings, 'ML_BATCH_MAX_SIZE', 64),
+                )
+    return _batcher
+
+
+def reset_prediction_batcher():
+    """Drop the process-wide batcher (settings changed, tests)."""
+    global _batcher
+    with _batcher_lock:
+        _batcher = None
+
+
+def expects_prediction(view):
+    """Runs `view` inside the process-wide batcher's expecting() (see PredictionBatcher.expecting)."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        with get_prediction_batcher().expecting():
+            return view(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,193 @@
+"""
+Bulk coffee writes for /api/bulk/.
+
+A batch is a list of operations:
+
+    {"op": "create", "data": {"name": ..., "origin": {"name": ...}, "description": ...}}
+    {"op": "update", "id": 12, "data": {...any of name, origin, description}}
+    {"op": "delete", "id": 13}
+
+Every operation is validated and permission-checked before anything is
+written; if one fails, nothing is applied and the per-item results say why.
+A valid batch runs in one transaction with bulk_create / bulk_update / a
+single DELETE, and the per-row Coffee signal receivers are muted. Their
+work is done once per batch instead: one CoffeeOperation insert, one
+profile log write per recipe owner, one search-index refresh, one daily caffeine
+rollup refresh and one catalogue version bump.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import bump_catalogue_version
+from .models.coffee import Coffee
+from .models.coffee_operations import CoffeeOperation
+from .origins import origin_registry
+from .rollups import refresh_for_coffees
+from .search import index_coffees
+from .serializers import CoffeeSerializer
+from .signals import bulk_coffee_writes, log_profile_ops
+
+MAX_BULK_OPERATIONS = 500
+OPERATIONS = ('create', 'update', 'delete')
+# Fields an update may change, as in CoffeeSerializer.update
+UPDATABLE_FIELDS = ('name', 'description')
+# Profile log names, as written by the Coffee signals
+PROFILE_OPS = {'create': 'add', 'update': 'edit', 'delete': 'delete'}
+
+
+class BulkValidationError(Exception):
+    """Raised (before any write) when an operation of the batch is invalid."""
+
+    def __init__(self, results):
+        super().__init__('Invalid bulk operations')
+        self.results = results
+
+
+def _error(index, op, errors, coffee_id=None):
+    return {'index': index, 'op': op, 'id': coffee_id, 'status': 'error', 'errors': errors}
+
+
+def _validate(operations, request):
+    """Return the parsed operations [(index, op, coffee_id, validated_data)] or raise BulkValidationError."""
+    user = request.user
+    target_ids = [
+        item.get('id') for item in operations
+        if isinstance(item, dict) and item.get('op') in ('update', 'delete')
+    ]
+    targets = Coffee.objects.select_related('user', 'origin').in_bulk(
+        [pk for pk in target_ids if isinstance(pk, int)]
+    )
+
+    parsed, results, seen = [], [], set()
+    for index, item in enumerate(operations):
+        if not isinstance(item, dict):
+            results.append(_error(index, None, {'non_field_errors': ['Each operation must be an object.']}))
+            continue
+        op, coffee_id = item.get('op'), item.get('id')
+        if op not in OPERATIONS:
+            results.append(_error(index, op, {'op': [f"Must be one of: {', '.join(OPERATIONS)}."]}))
+            continue
+
+        if op != 'create':
+            coffee = targets.get(coffee_id) if isinstance(coffee_id, int) else None
+            if coffee is None:
+                results.append(_error(index, op, {'id': ['Coffee not found.']}, coffee_id))
+                continue
+            if coffee.user_id != user.pk and not user.is_staff:
+                results.append(_error(index, op, {'id': ['You do not have permission to change this coffee.']}, coffee_id))
+                continue
+            if coffee_id in seen:
+                results.append(_error(index, op, {'id': ['Coffee appears more than once in this batch.']}, coffee_id))
+                continue
+            seen.add(coffee_id)
+
+        validated = None
+        if op != 'delete':
+            serializer = CoffeeSerializer(
+                data=item.get('data') or {}, partial=(op == 'update'), context={'request': request}
+            )
+            if not serializer.is_valid():
+                results.append(_error(index, op, serializer.errors, coffee_id))
+                continue
+            validated = serializer.validated_data
+
+        parsed.append((index, op, coffee_id, validated))
+        results.append({'index': index, 'op': op, 'id': coffee_id, 'status': 'ok'})
+
+    if len(parsed) != len(operations):
+        raise BulkValidationError(results)
+    return parsed, targets
+
+
+def apply_bulk_operations(operations, request):
+    """Validate and apply a batch of operations for request.user; returns per-item results."""
+    user = request.user
+    parsed, targets = _validate(operations, request)
+
+    # Resolve every origin of the batch in one pass (unknown ones with one upsert)
+    origin_names = {data['origin']['name'] for _, op, _, data in parsed if data and 'origin' in data}
+    origins = origin_registry.resolve_many(origin_names) if origin_names else {}
+
+    created, updated, deleted = [], [], []
+    recaffeinated = []
+    with transaction.atomic(), bulk_coffee_writes():
+        for index, op, coffee_id, data in parsed:
+            if op == 'create':
+                data = dict(data)
+                origin = origins[data.pop('origin')['name']]
+                coffee = Coffee(origin=origin, user=user, **data)
+                # bulk_create bypasses Coffee.save()
+                coffee.refresh_caffeine_estimate()
+                created.append((index, coffee))
+            elif op == 'update':
+                coffee = targets[coffee_id]
+                inputs = (coffee.name, coffee.description)
+                for field in UPDATABLE_FIELDS:
+                    if field in data:
+                        setattr(coffee, field, data[field])
+                if 'origin' in data:
+                    coffee.origin = origins[data['origin']['name']]
+                if coffee.caffeine_estimate_version is not None and inputs != (coffee.name, coffee.description):
+                    caffeine_mg = coffee.caffeine_mg
+                    coffee.refresh_caffeine_estimate()
+                    if coffee.caffeine_mg != caffeine_mg:
+                        recaffeinated.append(coffee.pk)
+                coffee.updated_at = timezone.now()
+                updated.append((index, coffee))
+            else:
+                deleted.append((index, targets[coffee_id]))
+
+        Coffee.objects.bulk_create([coffee for _, coffee in created])
+        if updated:
+            Coffee.objects.bulk_update(
+                [coffee for _, coffee in updated],
+                [*UPDATABLE_FIELDS, 'origin', 'caffeine_mg', 'caffeine_estimate_version', 'updated_at']
+            )
+        if deleted:
+            Coffee.objects.filter(pk__in=[coffee.pk for _, coffee in deleted]).delete()
+
+        _record_batch(user, created, updated, deleted)
+        refresh_for_coffees(recaffeinated)
+        index_coffees(coffee for _, coffee in created + updated)
+        transaction.on_commit(bump_catalogue_version)
+
+    return _results(request, parsed, created, updated, deleted)
+
+
+def _record_batch(user, created, updated, deleted):
+    """Audit records and profile logs for the whole batch."""
+    audit = []
+    profile_ops = defaultdict(list)
+    for op, items in (('create', created), ('update', updated), ('delete', deleted)):
+        for _, coffee in items:
+            audit.append(CoffeeOperation(
+                user=user, operation_type=PROFILE_OPS[op], coffee_id=coffee.pk, coffee_name=coffee.name
+            ))
+            profile_ops[coffee.user].append(PROFILE_OPS[op])
+
+    CoffeeOperation.objects.bulk_create(audit)
+    if deleted:
+        # bulk_create skips CoffeeOperation.save(); check the delete streak once
+        audit[-1].check_suspicious_activity()
+    for owner, ops in profile_ops.items():
+        log_profile_ops(owner, ops)
+
+
+def _results(request, parsed, created, updated, deleted):
+    written = {index: coffee for index, coffee in created + updated}
+    coffees = CoffeeSerializer.prepare_queryset(
+        Coffee.objects.filter(pk__in=[coffee.pk for coffee in written.values()]), request, request.user
+    ).in_bulk()
+    statuses = {'create': 'created', 'update': 'updated', 'delete': 'deleted'}
+
+    results = []
+    for index, op, coffee_id, _ in parsed:
+        result = {'index': index, 'op': op, 'id': coffee_id, 'status': statuses[op]}
+        if index in written:
+            coffee = coffees[written[index].pk]
+            result['id'] = coffee.pk
+            result['coffee'] = CoffeeSerializer(coffee, context={'request': request}).data
+        results.append(result)
+    return results
@@ -0,0 +1,127 @@
+"""
+Response cache for the read-mostly public catalogue endpoints
+(coffee list, origins, most popular recipes).
+
+Serialized payloads are stored in the `catalogue` cache (see CACHES in
+settings) under keys that embed a global catalogue version. Any write that can
+change a public payload (coffees, origins, likes) bumps the version from the
+signal receivers in coffee/signals.py, which makes every older entry
+unreachable; stale entries simply age out of the cache.
+
+Every worker must see the same version. With a shared cache backend (redis)
+it is kept in the cache itself; with a process-local one (locmem, the
+default) it is kept in a VersionCounter row instead, read once per request,
+while the payloads themselves may still be cached per process.
+
+Shared payloads are always built for an anonymous viewer. Per-user fields
+(`is_liked`) are overlaid afterwards from a small per-user cache of liked
+coffee ids, so one cached payload serves every user. Like writes bump the
+catalogue version, which is part of that key as well.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+
+CATALOGUE_CACHE_ALIAS = 'catalogue'
+CATALOGUE_VERSION_KEY = 'catalogue:version'
+USER_LIKES_KEY = 'catalogue:{version}:user-likes:{user_id}'
+
+
+def _cache():
+    return caches[CATALOGUE_CACHE_ALIAS]
+
+
+def catalogue_cache_is_shared():
+    """Whether every worker process sees the same `catalogue` cache."""
+    return not isinstance(_cache(), (LocMemCache, DummyCache))
+
+
+def _timeout():
+    return getattr(settings, 'CATALOGUE_CACHE_TIMEOUT', 300)
+
+
+def get_catalogue_version(request=None):
+    """
+    Current catalogue version, read at most once per `request` if given.
+
+    Versions are millisecond timestamps of the last catalogue write, so a
+    version that was lost (cache restart, eviction) is re-seeded with a value
+    that was never handed out before.
+    """
+    version = getattr(request, '_catalogue_version', None)
+    if version is not None:
+        return version
+
+    if catalogue_cache_is_shared():
+        cache = _cache()
+        version = cache.get(CATALOGUE_VERSION_KEY)
+        if version is None:
+            cache.add(CATALOGUE_VERSION_KEY, int(time.time() * 1000), timeout=None)
+            version = cache.get(CATALOGUE_VERSION_KEY)
+    else:
+        from .models.change_counters import VersionCounter
+        version = VersionCounter.current(VersionCounter.CATALOGUE)
+
+    if request is not None:
+        request._catalogue_version = version
+    return version
+
+
+def bump_catalogue_version():
+    """Invalidate every cached catalogue payload, in every worker."""
+    if not catalogue_cache_is_shared():
+        from .models.change_counters import VersionCounter
+        return VersionCounter.bump(VersionCounter.CATALOGUE)
+
+    cache = _cache()
+    current = cache.get(CATALOGUE_VERSION_KEY) or 0
+    version = max(int(time.time() * 1000), current + 1)
+    cache.set(CATALOGUE_VERSION_KEY, version, timeout=None)
+    return version
+
+
+def catalogue_cache_key(name, request):
+    """Cache key for endpoint `name`, varying on path and query string."""
+    digest = hashlib.md5(request.build_absolute_uri().encode('utf-8')).hexdigest()
+    return f'catalogue:{get_catalogue_version(request)}:{name}:{digest}'
+
+
+def get_or_build_payload(name, request, build):
+    """Return the cached payload for this request, building and storing it on a miss."""
+    cache = _cache()
+    key = catalogue_cache_key(name, request)
+    payload = cache.get(key)
+    if payload is None:
+        payload = build()
+        cache.set(key, payload, _timeout())
+    return payload
+
+
+def get_user_liked_ids(user, request=None):
+    """Ids of the coffees `user` has liked (cached until the next like write)."""
+    from .models.coffee import Like
+
+    cache = _cache()
+    key = USER_LIKES_KEY.format(version=get_catalogue_version(request), user_id=user.pk)
+    liked_ids = cache.get(key)
+    if liked_ids is None:
+        liked_ids = frozenset(Like.objects.filter(user=user).values_list('coffee_id', flat=True))
+        cache.set(key, liked_ids, _timeout())
+    return liked_ids
+
+
+def overlay_user_fields(items, request):
+    """Fill in `is_liked` on shared coffee payload items for the requesting user."""
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return items
+    liked_ids = get_user_liked_ids(user, request)
+    for item in items:
+        if 'is_liked' in item:
+            item['is_liked'] = item['id'] in liked_ids
+    return items
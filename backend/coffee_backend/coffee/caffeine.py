@@ -0,0 +1,153 @@
+"""
+Caffeine estimation for coffee recipes.
+
+The estimate is driven by CAFFEINE_RULES, an ordered rule table based on real
+caffeine content per serving. All keywords used by the table are compiled once
+into a single regular expression, so estimating a recipe scans its text in one
+pass and then evaluates the rules against the set of keywords that were found.
+
+Bump CAFFEINE_RULES_VERSION whenever the table changes; stored estimates from
+an older version are refreshed by `manage.py update_caffeine_content`.
+"""
+import re
+from collections import namedtuple
+
+
+CAFFEINE_RULES_VERSION = 1
+
+# Default: assume standard drip coffee (200 ml)
+DEFAULT_CAFFEINE_MG = 116.0
+
+DOUBLE_SHOT = ('double', '2 shot')
+
+CaffeineRule = namedtuple('CaffeineRule', ['label', 'caffeine_mg', 'all_of', 'none_of'])
+CaffeineRule.__doc__ = """
+A single estimation rule. It matches when, for every keyword group in
+`all_of`, at least one keyword of the group occurs in the text, and none of
+the keywords in `none_of` occurs. Rules are tried in order; first match wins.
+"""
+
+
+def _rule(label, caffeine_mg, *all_of, none_of=()):
+    return CaffeineRule(label, caffeine_mg, tuple(tuple(group) for group in all_of), tuple(none_of))
+
+
+# Most specific preparation methods first
+CAFFEINE_RULES = (
+    _rule('Cold brew 24 hrs (250 ml)', 280.0, ['cold brew'], ['24', '24hr', '24 hour']),
+    _rule('Cold brew without ice (250 ml)', 247.0, ['cold brew'], none_of=['ice']),
+    _rule('Cold brew 8 hrs (250 ml)', 238.0, ['cold brew'], ['8', '8hr', '8 hour']),
+    _rule('Cold brew with ice (250 ml)', 182.0, ['cold brew']),
+    _rule('French press (250 ml)', 223.0, ['french press']),
+    _rule('Aeropress (150 ml)', 204.0, ['aeropress', 'aero press']),
+    _rule('Pour over filter (250 ml)', 185.0, ['pour over', 'pour-over', 'v60']),
+    _rule('Chemex (250 ml)', 172.0, ['chemex']),
+    _rule('Drip coffee maker (250 ml)', 170.0, ['drip'], ['maker']),
+    _rule('Drip (200 ml)', 116.0, ['drip']),
+    _rule('American press (250 ml)', 146.0, ['american press']),
+    _rule('Ristretto (15 ml)', 63.0, ['ristretto']),
+    _rule('Stove-top espresso maker (30 ml)', 49.0, ['stove-top', 'stovetop', 'moka']),
+    _rule('Double espresso (2 x 68mg)', 136.0, ['espresso'], ['double', 'doppio', '2 shot', 'two shot']),
+    _rule('Single espresso (25 ml)', 68.0, ['espresso']),
+    # Coffee drinks with milk (typically use 1-2 shots of espresso)
+    _rule('Double shot latte', 136.0, ['latte'], DOUBLE_SHOT),
+    _rule('Single shot latte', 68.0, ['latte']),
+    _rule('Double shot cappuccino', 136.0, ['cappuccino'], DOUBLE_SHOT),
+    _rule('Single shot cappuccino', 68.0, ['cappuccino']),
+    _rule('Americano (espresso + water)', 95.0, ['americano']),
+    _rule('Macchiato (espresso with a dash of milk)', 68.0, ['macchiato']),
+    _rule('Double shot flat white', 136.0, ['flat white'], DOUBLE_SHOT),
+    _rule('Single shot flat white', 68.0, ['flat white']),
+    _rule('Decaf (minimal caffeine)', 2.0, ['decaf', 'decaffeinated']),
+)
+
+
+def _trie_pattern(keywords):
+    """Build a regex matching any of `keywords`, preferring the longest one."""
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:%s)' % '|'.join(branches)
+        # A keyword ends here: the continuation is optional, tried first (greedy)
+        return '(?:%s)?' % body if '' in node else body
+
+    return build(trie)
+
+
+class CaffeineEstimator:
+    """
+    Rule table compiled into a single-pass keyword matcher.
+
+    Keywords are matched as plain substrings, exactly like `keyword in text`.
+    They are compiled into one regular expression shaped like a prefix trie,
+    so each text position is dispatched on its first character instead of
+    trying every keyword, and each search returns the longest keyword at the
+    leftmost candidate position. Scanning resumes one character after the
+    start of the previous match, which keeps overlapping keywords; shorter
+    keywords contained in a match (e.g. '24' inside '24 hour') are added from
+    a precomputed table.
+    """
+
+    def __init__(self, rules, default_mg):
+        self.rules = tuple(rules)
+        self.default_mg = default_mg
+
+        keywords = set()
+        for rule in self.rules:
+            for group in rule.all_of:
+                keywords.update(group)
+            keywords.update(rule.none_of)
+
+        self._pattern = re.compile(_trie_pattern(keywords))
+        self._contained = {
+            keyword: frozenset(other for other in keywords if other in keyword)
+            for keyword in keywords
+        }
+        self._compiled_rules = tuple(
+            (
+                tuple(frozenset(group) for group in rule.all_of),
+                frozenset(rule.none_of),
+                rule.caffeine_mg,
+            )
+            for rule in self.rules
+        )
+
+    def find_keywords(self, text):
+        """Return the set of rule keywords that occur in `text`."""
+        found = set()
+        search = self._pattern.search
+        match = search(text)
+        while match is not None:
+            found |= self._contained[match.group()]
+            match = search(text, match.start() + 1)
+        return found
+
+    def estimate(self, text):
+        found = self.find_keywords(text.lower())
+        for all_of, none_of, caffeine_mg in self._compiled_rules:
+            if none_of and not none_of.isdisjoint(found):
+                continue
+            if all(not group.isdisjoint(found) for group in all_of):
+                return caffeine_mg
+        return self.default_mg
+
+
+default_estimator = CaffeineEstimator(CAFFEINE_RULES, DEFAULT_CAFFEINE_MG)
+
+
+def estimate_caffeine_mg(name, description=''):
+    """Estimate caffeine (mg per serving) from a recipe's name and description."""
+    return default_estimator.estimate(f"{name or ''} {description or ''}")
+
+
+def current_rules_version():
+    """Default for Coffee.caffeine_estimate_version (new rows are estimated on save)."""
+    return CAFFEINE_RULES_VERSION
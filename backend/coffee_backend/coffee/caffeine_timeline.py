@@ -0,0 +1,168 @@
+"""
+Estimated caffeine in the bloodstream over time.
+
+Each dose follows a one-compartment model with first-order absorption and
+elimination (the Bateman function):
+
+    A(t) = D * ka / (ka - ke) * (exp(-ke * t) - exp(-ka * t)),  t >= 0
+
+with ke = ln 2 / half-life and ka = ln 2 / absorption half-life. Doses
+add up linearly, so the amount on a 5-minute grid is the (grid x doses)
+Bateman matrix times the dose vector. It is evaluated in blocks of grid
+rows, each against only the doses of the preceding LOOKBACK_HALF_LIVES
+half-lives, which bounds both memory and work for long windows. Plasma
+concentration is the amount over the volume of distribution (about 0.6 L
+per kg of body weight).
+
+A user's amounts are computed for whole local days, today included, and
+kept in the catalogue cache under their consumption_version, so the next
+consumption write (or a new day) makes them unreachable. Points after the
+current time are cut off per request.
+"""
+import math
+from datetime import datetime, time, timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+from .cache import CATALOGUE_CACHE_ALIAS
+
+STEP_MINUTES = 5
+POINTS_PER_DAY = 24 * 60 // STEP_MINUTES
+MAX_DAYS = 30
+VOLUME_L_PER_KG = 0.6
+DEFAULT_WEIGHT_KG = 70.0
+# Doses older than this many half-lives contribute under 0.1% and are skipped
+LOOKBACK_HALF_LIVES = 10
+# Grid points evaluated at once, against the doses in reach of the block
+BLOCK_ROWS = 288
+TIMELINE_KEY = 'caffeine-timeline:{user_id}:{version}:{day}:{days}:{half_life}:{absorption}'
+
+
+def bateman_amounts(elapsed_seconds, dose_mg, half_life_hours, absorption_half_life_minutes):
+    """
+    Caffeine in the body (mg) at each row of `elapsed_seconds`, a
+    (points, doses) matrix of time since each dose; negative times (doses
+    still in the future) contribute nothing.
+    """
+    ke = math.log(2) / (half_life_hours * 3600)
+    ka = math.log(2) / (absorption_half_life_minutes * 60)
+    elapsed = np.maximum(elapsed_seconds, 0.0)
+    if math.isclose(ka, ke):
+        # Limit of the Bateman function for ka -> ke
+        curves = ke * elapsed * np.exp(-ke * elapsed)
+    else:
+        curves = (np.exp(-ke * elapsed) - np.exp(-ka * elapsed)) * (ka / (ka - ke))
+    return curves @ dose_mg
+
+
+def caffeine_amounts(grid_seconds, dose_seconds, dose_mg, half_life_hours, absorption_half_life_minutes):
+    """
+    Caffeine in the body (mg) at each grid time (ascending), summed over the
+    doses of the last LOOKBACK_HALF_LIVES half-lives before it.
+    """
+    grid_seconds = np.asarray(grid_seconds, dtype=np.float64)
+    order = np.argsort(dose_seconds, kind='stable')
+    dose_seconds = np.asarray(dose_seconds, dtype=np.float64)[order]
+    dose_mg = np.asarray(dose_mg, dtype=np.float64)[order]
+    lookback_seconds = LOOKBACK_HALF_LIVES * half_life_hours * 3600
+    amounts = np.zeros(len(grid_seconds))
+    if not len(dose_mg):
+        return amounts
+    for start in range(0, len(grid_seconds), BLOCK_ROWS):
+        block = grid_seconds[start:start + BLOCK_ROWS]
+        first = np.searchsorted(dose_seconds, block[0] - lookback_seconds)
+        last = np.searchsorted(dose_seconds, block[-1], side='right')
+        if first < last:
+            amounts[start:start + len(block)] = bateman_amounts(
+                block[:, None] - dose_seconds[None, first:last], dose_mg[first:last],
+                half_life_hours, absorption_half_life_minutes,
+            )
+    return amounts
+
+
+def default_half_life_hours():
+    return getattr(settings, 'CAFFEINE_HALF_LIFE_HOURS', 5.0)
+
+
+def _absorption_half_life_minutes():
+    return getattr(settings, 'CAFFEINE_ABSORPTION_HALF_LIFE_MINUTES', 15.0)
+
+
+def _grid_start(days, now):
+    first_day = timezone.localdate(now) - timedelta(days=days - 1)
+    return timezone.make_aware(datetime.combine(first_day, time.min))
+
+
+def _compute_amounts(user_id, start, days, half_life_hours, absorption_half_life_minutes):
+    from .models.coffee import ConsumedCoffee
+
+    doses = list(ConsumedCoffee.objects.filter(
+        user_id=user_id,
+        consumed_at__gte=start - timedelta(hours=LOOKBACK_HALF_LIVES * half_life_hours),
+        consumed_at__lt=start + timedelta(days=days),
+    ).values_list('consumed_at', 'coffee__caffeine_mg'))
+    grid_seconds = np.arange(days * POINTS_PER_DAY) * (STEP_MINUTES * 60.0)
+    return caffeine_amounts(
+        grid_seconds,
+        [(consumed_at - start).total_seconds() for consumed_at, _ in doses],
+        [caffeine_mg for _, caffeine_mg in doses],
+        half_life_hours, absorption_half_life_minutes,
+    )
+
+
+def _amounts_until(user, days, half_life_hours, now):
+    """(grid start, amounts up to `now`), from the cache when the user's consumption is unchanged."""
+    from .conditional import get_user_change_counter
+
+    start = _grid_start(days, now)
+    absorption = _absorption_half_life_minutes()
+    _, consumption_version, _ = get_user_change_counter(user)
+    key = TIMELINE_KEY.format(
+        user_id=user.pk, version=consumption_version, day=start.date().isoformat(), days=days,
+        half_life=half_life_hours, absorption=absorption,
+    )
+    cache = caches[CATALOGUE_CACHE_ALIAS]
+    amounts = cache.get(key)
+    if amounts is None:
+        amounts = _compute_amounts(user.pk, start, days, half_life_hours, absorption)
+        cache.set(key, amounts, getattr(settings, 'CAFFEINE_TIMELINE_CACHE_TIMEOUT', 3600))
+    return start, amounts[:int((now - start).total_seconds() // (STEP_MINUTES * 60)) + 1]
+
+
+def caffeine_timeline(user, days=1, half_life_hours=None, now=None):
+    """
+    Estimated caffeine for `user` over today and the `days - 1` days before,
+    up to `now`, every STEP_MINUTES: {start, step_minutes, half_life_hours,
+    volume_l, mg_per_l: [...], current, peak}. current and peak are {at,
+    mg, mg_per_l} (peak is None without caffeine).
+    """
+    from .models.health import UserHealthProfile
+
+    now = now or timezone.now()
+    half_life_hours = half_life_hours or default_half_life_hours()
+    start, amounts = _amounts_until(user, days, half_life_hours, now)
+
+    weight_kg = UserHealthProfile.objects.filter(user=user).values_list('weight_kg', flat=True).first()
+    volume_l = (weight_kg or DEFAULT_WEIGHT_KG) * VOLUME_L_PER_KG
+
+    def point(index):
+        return {
+            'at': start + timedelta(minutes=STEP_MINUTES * int(index)),
+            'mg': round(float(amounts[index]), 2),
+            'mg_per_l': round(float(amounts[index]) / volume_l, 3),
+        }
+
+    peak = int(np.argmax(amounts))
+    return {
+        'start': start,
+        'step_minutes': STEP_MINUTES,
+        'half_life_hours': half_life_hours,
+        'volume_l': round(volume_l, 2),
+        'mg_per_l': np.round(amounts / volume_l, 3).tolist(),
+        'current': point(len(amounts) - 1),
+        'peak': point(peak) if amounts[peak] > 0 else None,
+    }
+
@@ -0,0 +1,374 @@
+"""
+Streaming NDJSON export/import of the recipe catalogue
+(`manage.py export_catalogue` / `manage.py import_catalogue`).
+
+A dump is one JSON object per line. The first line is a header; every other
+line is a record tagged with its model, written in dependency order:
+
+    {"format": "coffee-catalogue", "version": 1}
+    {"model": "origin", "id": 3, "name": "Italy"}
+    {"model": "coffee", "id": 12, "origin": 3, "user": "barista", "name": ..., ...}
+    {"model": "like", "user": "barista", "coffee": 12, "created_at": ...}
+    {"model": "consumed", "user": "barista", "coffee": 12, "consumed_at": ...}
+
+Users are referenced by username and matched on import; ids are the source
+database's and are remapped on import, so a dump can be loaded into a
+database that already has data. Export reads with server-side cursors
+(`iterator(chunk_size=...)`) and import writes in bulk_create batches, so
+both run in memory bounded by the batch size; the only structure that grows
+with the dump is the coffee id map, kept as two flat integer arrays.
+
+Import bypasses the model signals: like counts, the search index, the
+trending boards, the daily caffeine rollups, the per-user change counters and
+the catalogue version are brought up to date once at the end, also when the
+import stops on an error after some batches were committed.
+"""
+import gzip
+import io
+import json
+import sys
+import time
+from array import array
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+
+from .cache import bump_catalogue_version
+from .leaderboard import TRENDING_WINDOWS, get_leaderboard, rebuild
+from .models.change_counters import UserChangeCounter
+from .models.coffee import Coffee, ConsumedCoffee, Like, Origin, normalize_origin_name
+from .origins import origin_registry
+from .rollups import rebuild as rebuild_rollups
+from .search import index_coffees
+
+FORMAT_NAME = 'coffee-catalogue'
+FORMAT_VERSION = 1
+MODELS = ('origin', 'coffee', 'like', 'consumed')
+
+COFFEE_FIELDS = (
+    'name', 'description', 'is_community_winner', 'is_private', 'caffeine_mg', 'caffeine_estimate_version',
+)
+# Keys every record of a model must have, and the timestamp of likes and consumption
+REQUIRED_KEYS = {
+    'origin': ('id', 'name'),
+    'coffee': ('id', 'user', 'origin') + COFFEE_FIELDS,
+    'like': ('user', 'coffee', 'created_at'),
+    'consumed': ('user', 'coffee', 'consumed_at'),
+}
+TIMESTAMP_FIELDS = {'like': 'created_at', 'consumed': 'consumed_at'}
+
+
+class CatalogueFormatError(ValueError):
+    """The input is not a catalogue dump this version can read."""
+
+
+@contextmanager
+def open_stream(path, mode, compress=None):
+    """
+    Open `path` ('-' for stdin/stdout) as a text stream for mode 'r' or 'w'.
+    Gzip is used when `compress` is true, or when it is None and the path
+    ends in '.gz'.
+    """
+    if compress is None:
+        compress = path.endswith('.gz')
+    if path != '-':
+        opener = gzip.open if compress else open
+        with opener(path, mode + 't', encoding='utf-8') as stream:
+            yield stream
+        return
+
+    raw = sys.stdin.buffer if mode == 'r' else sys.stdout.buffer
+    if compress:
+        raw = gzip.GzipFile(fileobj=raw, mode=mode)
+    stream = io.TextIOWrapper(raw, encoding='utf-8')
+    try:
+        yield stream
+    finally:
+        stream.flush()
+        # Leave the process's stdin/stdout open; only end the gzip member
+        stream.detach()
+        if compress:
+            raw.close()
+
+
+class Throughput:
+    """Row counts and rates per model, reported through `report(message)`."""
+
+    def __init__(self, report=None, every=100000):
+        self.report = report or (lambda message: None)
+        self.every = every
+        self.counts = {}
+        self.skipped = {}
+        self.started = time.monotonic()
+        self._model_started = {}
+
+    def begin(self, model):
+        self._model_started.setdefault(model, time.monotonic())
+
+    def add(self, model, rows=1):
+        self.begin(model)
+        before = self.counts.get(model, 0)
+        self.counts[model] = before + rows
+        if before // self.every != self.counts[model] // self.every:
+            self.report(self._line(model))
+
+    def skip(self, model, rows=1):
+        self.skipped[model] = self.skipped.get(model, 0) + rows
+
+    def _line(self, model):
+        elapsed = max(time.monotonic() - self._model_started[model], 1e-9)
+        count = self.counts[model]
+        return f"{model}: {count} rows in {elapsed:.1f}s ({count / elapsed:,.0f} rows/s)"
+
+    def summary(self):
+        lines = [self._line(model) for model in MODELS if model in self.counts]
+        lines += [f"{model}: skipped {count} rows" for model, count in self.skipped.items()]
+        total = sum(self.counts.values())
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        lines.append(f"total: {total} rows in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s)")
+        return lines
+
+
+# Export
+
+def _encode_value(value):
+    # Full precision, unlike DjangoJSONEncoder (which keeps milliseconds)
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def _records(chunk_size):
+    origins = Origin.objects.order_by('pk').values_list('pk', 'name')
+    for pk, name in origins.iterator(chunk_size=chunk_size):
+        yield {'model': 'origin', 'id': pk, 'name': name}
+
+    coffees = Coffee.objects.order_by('pk').values_list('pk', 'origin_id', 'user__username', *COFFEE_FIELDS)
+    for pk, origin_id, username, *values in coffees.iterator(chunk_size=chunk_size):
+        record = {'model': 'coffee', 'id': pk, 'origin': origin_id, 'user': username}
+        record.update(zip(COFFEE_FIELDS, values))
+        yield record
+
+    likes = Like.objects.order_by('pk').values_list('user__username', 'coffee_id', 'created_at')
+    for username, coffee_id, created_at in likes.iterator(chunk_size=chunk_size):
+        yield {'model': 'like', 'user': username, 'coffee': coffee_id, 'created_at': created_at}
+
+    consumed = ConsumedCoffee.objects.order_by('pk').values_list('user__username', 'coffee_id', 'consumed_at')
+    for username, coffee_id, consumed_at in consumed.iterator(chunk_size=chunk_size):
+        yield {'model': 'consumed', 'user': username, 'coffee': coffee_id, 'consumed_at': consumed_at}
+
+
+def export_catalogue(stream, chunk_size=2000, throughput=None):
+    """Write the catalogue to the text `stream` as NDJSON; returns the Throughput."""
+    throughput = throughput or Throughput()
+    encoder = json.JSONEncoder(separators=(',', ':'), default=_encode_value)
+    stream.write(encoder.encode({'format': FORMAT_NAME, 'version': FORMAT_VERSION}) + '\n')
+    for record in _records(chunk_size):
+        stream.write(encoder.encode(record) + '\n')
+        throughput.add(record['model'])
+    return throughput
+
+
+# Import
+
+class IdMap:
+    """
+    Old id -> new id, stored as two parallel int64 arrays (16 bytes a row).
+    Dumps are written in primary-key order, so appends keep the old ids
+    sorted and lookups are a binary search; out-of-order input is sorted
+    once on the next lookup.
+    """
+
+    def __init__(self):
+        self.old = array('q')
+        self.new = array('q')
+        self._sorted = True
+
+    def __len__(self):
+        return len(self.old)
+
+    def add(self, old_id, new_id):
+        if self.old and old_id <= self.old[-1]:
+            self._sorted = False
+        self.old.append(old_id)
+        self.new.append(new_id)
+
+    def get(self, old_id):
+        if not self._sorted:
+            pairs = sorted(zip(self.old, self.new))
+            self.old = array('q', (old for old, _ in pairs))
+            self.new = array('q', (new for _, new in pairs))
+            self._sorted = True
+        index = bisect_left(self.old, old_id)
+        if index < len(self.old) and self.old[index] == old_id:
+            return self.new[index]
+        return None
+
+
+def _parse_timestamp(value):
+    try:
+        return parse_datetime(value) if isinstance(value, str) else None
+    except ValueError:
+        return None
+
+
+class CatalogueImporter:
+    """Consumes dump records in order, writing each model in bulk batches."""
+
+    def __init__(self, batch_size=1000, throughput=None):
+        self.batch_size = batch_size
+        self.throughput = throughput or Throughput()
+        self.origins = {}        # old origin id -> Origin (origins are few)
+        self.coffees = IdMap()
+        self.user_ids = {}       # username -> user id, None if unknown
+        self.touched_users = {UserChangeCounter.LIKES: set(), UserChangeCounter.CONSUMPTION: set()}
+        self._model = None
+        self._batch = []
+
+    def feed(self, record):
+        if not isinstance(record, dict):
+            raise CatalogueFormatError("Records must be JSON objects")
+        model = record.get('model')
+        if model not in MODELS:
+            raise CatalogueFormatError(f"Unknown record type: {model!r}")
+        missing = [key for key in REQUIRED_KEYS[model] if key not in record]
+        if missing:
+            raise CatalogueFormatError(f"{model.capitalize()} record is missing {', '.join(missing)}")
+        if model == 'origin':
+            name = record['name']
+            if not isinstance(name, str) or not normalize_origin_name(name):
+                raise CatalogueFormatError(f"Origin {record['id']!r} has no name")
+        elif model in TIMESTAMP_FIELDS:
+            field = TIMESTAMP_FIELDS[model]
+            moment = _parse_timestamp(record[field])
+            if moment is None:
+                raise CatalogueFormatError(f"Invalid {field}: {record[field]!r}")
+            record[field] = moment
+        if model != self._model:
+            # Records come in dependency order: finish the previous model first
+            self.flush()
+            self._model = model
+            self.throughput.begin(model)
+        self._batch.append(record)
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self._batch:
+            batch, self._batch = self._batch, []
+            with transaction.atomic():
+                getattr(self, f'_import_{self._model}')(batch)
+
+    def finish(self):
+        """Flush what is left and refresh everything the signals would have maintained."""
+        self.flush()
+        return self.refresh()
+
+    def refresh(self):
+        """Refresh what the signals would have maintained for the rows imported so far."""
+        new_ids = self.coffees.new
+        for start in range(0, len(new_ids), self.batch_size):
+            Coffee.objects.filter(pk__in=list(new_ids[start:start + self.batch_size])).recount_likes()
+        if self.touched_users[UserChangeCounter.LIKES]:
+            for window in TRENDING_WINDOWS:
+                rebuild(get_leaderboard(window))
+        consumers = self.touched_users[UserChangeCounter.CONSUMPTION]
+        if consumers:
+            rebuild_rollups(user_ids=list(consumers), batch_size=self.batch_size)
+        for counter, user_ids in self.touched_users.items():
+            for user_id in user_ids:
+                UserChangeCounter.bump(user_id, counter)
+        bump_catalogue_version()
+        return self.throughput
+
+    def _resolve_users(self, batch):
+        missing = {record['user'] for record in batch} - self.user_ids.keys()
+        if missing:
+            found = dict(
+                get_user_model().objects.filter(username__in=missing).values_list('username', 'pk')
+            )
+            for username in missing:
+                self.user_ids[username] = found.get(username)
+
+    def _import_origin(self, batch):
+        resolved = origin_registry.resolve_many({record['name'] for record in batch})
+        for record in batch:
+            self.origins[record['id']] = resolved[record['name']]
+        self.throughput.add('origin', len(batch))
+
+    def _import_coffee(self, batch):
+        self._resolve_users(batch)
+        rows, old_ids = [], []
+        for record in batch:
+            user_id = self.user_ids.get(record['user'])
+            origin = self.origins.get(record['origin'])
+            if user_id is None or origin is None:
+                self.throughput.skip('coffee')
+                continue
+            rows.append(Coffee(
+                origin=origin, user_id=user_id, **{field: record[field] for field in COFFEE_FIELDS}
+            ))
+            old_ids.append(record['id'])
+        Coffee.objects.bulk_create(rows)
+        for old_id, coffee in zip(old_ids, rows):
+            self.coffees.add(old_id, coffee.pk)
+        index_coffees(rows, batch_size=self.batch_size)
+        self.throughput.add('coffee', len(rows))
+
+    def _related_rows(self, batch, model, timestamp_field):
+        self._resolve_users(batch)
+        rows = []
+        for record in batch:
+            user_id = self.user_ids.get(record['user'])
+            coffee_id = self.coffees.get(record['coffee'])
+            if user_id is None or coffee_id is None:
+                self.throughput.skip(model._meta.model_name)
+                continue
+            rows.append(model(
+                user_id=user_id, coffee_id=coffee_id,
+                **{timestamp_field: record[timestamp_field]}
+            ))
+        return rows
+
+    def _import_like(self, batch):
+        rows = self._related_rows(batch, Like, 'created_at')
+        Like.objects.bulk_create(rows, ignore_conflicts=True)
+        self.touched_users[UserChangeCounter.LIKES].update(row.user_id for row in rows)
+        self.throughput.add('like', len(rows))
+
+    def _import_consumed(self, batch):
+        rows = self._related_rows(batch, ConsumedCoffee, 'consumed_at')
+        ConsumedCoffee.objects.bulk_create(rows)
+        self.touched_users[UserChangeCounter.CONSUMPTION].update(row.user_id for row in rows)
+        self.throughput.add('consumed', len(rows))
+
+
+def import_catalogue(stream, batch_size=1000, throughput=None):
+    """Load an NDJSON dump from the text `stream`; returns the Throughput."""
+    header = json.loads(stream.readline() or 'null')
+    if not isinstance(header, dict) or header.get('format') != FORMAT_NAME:
+        raise CatalogueFormatError("Not a catalogue dump (missing header line)")
+    if header.get('version') != FORMAT_VERSION:
+        raise CatalogueFormatError(f"Unsupported dump version: {header.get('version')!r}")
+
+    importer = CatalogueImporter(batch_size=batch_size, throughput=throughput)
+    try:
+        for line_number, line in enumerate(stream, start=2):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                raise CatalogueFormatError(f"Line {line_number}: {e}") from None
+            try:
+                importer.feed(record)
+            except CatalogueFormatError as e:
+                raise CatalogueFormatError(f"Line {line_number}: {e}") from None
+        importer.flush()
+    finally:
+        # Batches commit one by one: the rows already in need their derived state even after an error
+        importer.refresh()
+    return importer.throughput
@@ -0,0 +1,116 @@
+"""
+Conditional GET (ETag / Last-Modified) for endpoints the clients poll.
+
+Validators are built from cheap version counters instead of hashing rendered
+bodies: the global catalogue version (coffee/cache.py, bumped on every coffee,
+origin and like write and shared by every worker process) and the per-user
+UserChangeCounter row (bumped from coffee/signals.py when the user's likes or
+consumption log change). The request's path and query string are part of
+every ETag, so each page and filter combination validates independently.
+
+The validators are checked before the view runs, so an unchanged resource is
+answered with 304 Not Modified after reading only the counters (at most one
+query each), without serializing anything.
+"""
+import hashlib
+from functools import wraps
+
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+from .cache import get_catalogue_version
+
+
+def make_etag(*parts):
+    """Strong ETag from the given version parts."""
+    digest = hashlib.md5('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+    return f'"{digest}"'
+
+
+def get_user_change_counter(user):
+    """Return (likes_version, consumption_version, updated_at) for `user`."""
+    from .models.change_counters import UserChangeCounter
+
+    row = (
+        UserChangeCounter.objects.filter(user=user)
+        .values_list('likes_version', 'consumption_version', 'updated_at')
+        .first()
+    )
+    return row or (0, 0, None)
+
+
+def catalogue_validators(request, scope, user_counters=(), extra=()):
+    """
+    ETag and Last-Modified timestamp for a catalogue-backed response.
+
+    `user_counters` names the UserChangeCounter fields the response depends
+    on; `extra` adds any further parts (e.g. the current day).
+    """
+    catalogue_version = get_catalogue_version(request)
+    # Catalogue versions are millisecond timestamps of the last write
+    last_modified = catalogue_version // 1000
+    parts = [scope, catalogue_version, request.get_full_path()]
+
+    user = request.user
+    if user.is_authenticated:
+        parts.append(user.pk)
+        if user_counters:
+            likes_version, consumption_version, updated_at = get_user_change_counter(user)
+            counters = {'likes_version': likes_version, 'consumption_version': consumption_version}
+            parts.extend(counters[name] for name in user_counters)
+            if updated_at is not None:
+                last_modified = max(last_modified, int(updated_at.timestamp()))
+
+    parts.extend(extra)
+    return make_etag(*parts), last_modified
+
+
+def not_modified(request, etag, last_modified):
+    """A 304 response if the client's validators still match, otherwise None."""
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def set_validators(response, etag, last_modified):
+    """
+    Attach ETag / Last-Modified to `response`.
+
+    Responses differ per user (is_liked, private recipes), so they are only
+    cacheable privately and must be revalidated on every use.
+    """
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ('Authorization',))
+    return response
+
+
+def conditional_get(scope, user_counters=(), extra=None):
+    """
+    Decorator adding conditional GET to a function view.
+
+    `extra`, if given, is called with the request and returns additional ETag
+    parts. Non-GET/HEAD requests and non-200 responses pass through untouched.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+
+            etag, last_modified = catalogue_validators(
+                request, scope, user_counters, extra(request) if extra else ()
+            )
+            response = not_modified(request, etag, last_modified)
+            if response is not None:
+                return response
+
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200:
+                set_validators(response, etag, last_modified)
+            return response
+        return wrapper
+    return decorator
@@ -5,7 +5,8 @@ from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 from faker import Faker
 
-from .models.coffee import Coffee, Origin
+from .models.coffee import Coffee
+from .origins import resolve_origin
 from .serializers import CoffeeSerializer
 
 # the lists your thread will pick from
@@ -26,7 +27,7 @@ def generate_coffee():
         try:
             # 1) pick or create a real Origin
             origin_name = random.choice(ORIGINS)
-            origin_obj, _ = Origin.objects.get_or_create(name=origin_name)
+            origin_obj = resolve_origin(origin_name)
 
             # 2) now create a Coffee with that Origin instance
             coffee = Coffee.objects.create(
@@ -0,0 +1,159 @@
+"""
+Popular-recipe leaderboards for most_popular_recipes.
+
+* `all`: all-time likes, read straight from the Coffee (-like_count, -id)
+  index.
+* `day` / `week`: trending recipes, i.e. likes decayed with a half-life of
+  one day / one week. Each board keeps one LeaderboardEntry per recently
+  liked recipe with a forward-decayed score (see models/leaderboard.py),
+  updated from the Like signals with a single UPDATE per board.
+
+Reading a board is an index scan of the top `limit` rows. Forward-decayed
+scores grow with time, so boards are periodically compacted (`manage.py
+compact_leaderboards`): scores are rescaled to a new epoch, negligible
+entries are dropped and each board is capped to MAX_ENTRIES. A board is
+also compacted on the fly before its scores would grow too large. Likes
+and compactions lock the board row, so a like's weight and the scores it
+is added to always share an epoch.
+"""
+from django.db import models, transaction
+from django.utils import timezone
+
+from .models.coffee import Coffee
+
+TRENDING_WINDOWS = {
+    'day': 24 * 3600,
+    'week': 7 * 24 * 3600,
+}
+WINDOWS = ('all',) + tuple(TRENDING_WINDOWS)
+
+# Entries whose decayed score falls below this are dropped on compaction
+MIN_SCORE = 1e-6
+MAX_ENTRIES = 1000
+# Compact before weights reach 2 ** MAX_EXPONENT
+MAX_EXPONENT = 64
+
+
+def get_leaderboard(window):
+    from .models.leaderboard import Leaderboard
+
+    board, _ = Leaderboard.objects.get_or_create(
+        name=window, defaults={'half_life_seconds': TRENDING_WINDOWS[window]}
+    )
+    return board
+
+
+def _exponent(board, when):
+    return (when - board.epoch).total_seconds() / board.half_life_seconds
+
+
+def like_weight(board, liked_at):
+    """Forward-decayed weight of one like at `liked_at` on `board`."""
+    return 2.0 ** _exponent(board, liked_at)
+
+
+def _lock_boards():
+    """The trending boards, row-locked until the end of the transaction (created if missing)."""
+    from .models.leaderboard import Leaderboard
+
+    boards = Leaderboard.objects.select_for_update().filter(name__in=TRENDING_WINDOWS).order_by('name')
+    locked = list(boards)
+    if len(locked) < len(TRENDING_WINDOWS):
+        for window in TRENDING_WINDOWS:
+            get_leaderboard(window)
+        locked = list(boards)
+    return locked
+
+
+def record_like(coffee_id, liked_at, delta=1):
+    """Add (delta=1) or remove (delta=-1) one like on every trending board."""
+    from .models.leaderboard import LeaderboardEntry
+
+    now = timezone.now()
+    with transaction.atomic():
+        # The weight is relative to the board's epoch, which compact() can
+        # only move once the scores are updated and the lock is released
+        for board in _lock_boards():
+            if _exponent(board, now) > MAX_EXPONENT:
+                _compact_locked(board, now)
+            weight = delta * like_weight(board, liked_at)
+            entries = LeaderboardEntry.objects.filter(leaderboard=board, coffee_id=coffee_id)
+            if not entries.update(score=models.F('score') + weight) and delta > 0:
+                LeaderboardEntry.objects.create(leaderboard=board, coffee_id=coffee_id, score=weight)
+
+
+def compact(board, now=None):
+    """Rescale `board` to a new epoch, drop negligible entries and cap its size."""
+    from .models.leaderboard import Leaderboard
+
+    now = now or timezone.now()
+    with transaction.atomic():
+        return _compact_locked(Leaderboard.objects.select_for_update().get(pk=board.pk), now)
+
+
+def _compact_locked(board, now):
+    factor = 2.0 ** -_exponent(board, now)
+    entries = board.entries.all()
+    entries.update(score=models.F('score') * factor)
+    removed, _ = entries.filter(score__lt=MIN_SCORE).delete()
+
+    cutoff = entries.order_by('-score').values_list('score', flat=True)[MAX_ENTRIES:MAX_ENTRIES + 1]
+    if cutoff:
+        removed += entries.filter(score__lte=cutoff[0]).delete()[0]
+
+    board.epoch = now
+    board.save(update_fields=['epoch'])
+    return removed
+
+
+def rebuild(board, now=None):
+    """Recompute `board` from the Like table (likes older than ~30 half-lives are ignored)."""
+    from .models.coffee import Like
+    from .models.leaderboard import Leaderboard, LeaderboardEntry
+
+
+    now = now or timezone.now()
+    with transaction.atomic():
+        board = Leaderboard.objects.select_for_update().get(pk=board.pk)
+        board.epoch = now
+        board.save(update_fields=['epoch'])
+        board.entries.all().delete()
+
+        since = now - timezone.timedelta(seconds=30 * board.half_life_seconds)
+        scores = {}
+        likes = Like.objects.filter(created_at__gte=since).values_list('coffee_id', 'created_at')
+        for coffee_id, liked_at in likes.iterator(chunk_size=2000):
+            scores[coffee_id] = scores.get(coffee_id, 0.0) + like_weight(board, liked_at)
+
+        top = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:MAX_ENTRIES]
+        LeaderboardEntry.objects.bulk_create(
+            [LeaderboardEntry(leaderboard=board, coffee_id=coffee_id, score=score) for coffee_id, score in top],
+            batch_size=500
+        )
+    return len(top)
+
+
+def top_coffee_ids(window, limit, owner=None):
+    """
+    Ids of the `limit` best public recipes on `window`, best first, with the
+    private recipes of `owner` merged in. Only recipes with likes are ranked.
+    """
+    if window == 'all':
+        ranked = Coffee.objects.filter(like_count__gt=0).order_by('-like_count', '-id')
+        rows = ranked.values_list('id', 'like_count')
+        coffee = ''
+    else:
+        from .models.leaderboard import LeaderboardEntry
+
+        ranked = LeaderboardEntry.objects.filter(
+            leaderboard__name=window, score__gte=MIN_SCORE
+        ).order_by('-score', '-coffee_id')
+        rows = ranked.values_list('coffee_id', 'score')
+        coffee = 'coffee__'
+
+    top = list(rows.filter(**{f'{coffee}is_private': False})[:limit])
+    if owner is not None:
+        # The owner's private recipes are a second short index scan, merged by score
+        top += rows.filter(**{f'{coffee}is_private': True, f'{coffee}user': owner})[:limit]
+        top.sort(key=lambda row: (row[1], row[0]), reverse=True)
+    return [coffee_id for coffee_id, _ in top[:limit]]
@@ -0,0 +1,30 @@
+"""
+Management command to (re)build the per-user daily caffeine rollups
+(coffee/rollups.py) from the consumption log, e.g. after rows were changed
+without signals or after a bulk caffeine re-estimation.
+"""
+from django.core.management.base import BaseCommand
+from coffee.rollups import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily caffeine rollups from the ConsumedCoffee table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='user_ids',
+            help='Only rebuild this user id (repeatable)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of rollup rows per insert (default: 1000)',
+        )
+
+    def handle(self, *args, **options):
+        written = rebuild(user_ids=options['user_ids'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} daily caffeine rollups."))
@@ -0,0 +1,33 @@
+"""
+Management command to compact the trending leaderboards (coffee/leaderboard.py).
+Run it periodically (e.g. daily from cron): it rescales scores to a new epoch,
+drops entries whose likes have decayed away and caps each board's size.
+"""
+from django.core.management.base import BaseCommand
+from coffee.cache import bump_catalogue_version
+from coffee.leaderboard import TRENDING_WINDOWS, compact, get_leaderboard, rebuild
+
+
+class Command(BaseCommand):
+    help = 'Compact (or rebuild) the trending recipe leaderboards'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Recompute the boards from the Like table instead of compacting them',
+        )
+
+    def handle(self, *args, **options):
+        for window in TRENDING_WINDOWS:
+            board = get_leaderboard(window)
+            if options['rebuild']:
+                kept = rebuild(board)
+                self.stdout.write(f"Rebuilt '{window}' board with {kept} entries.")
+            else:
+                removed = compact(board)
+                self.stdout.write(f"Compacted '{window}' board, removed {removed} entries.")
+
+        # Rankings were rewritten without signals
+        bump_catalogue_version()
+        self.stdout.write(self.style.SUCCESS('Leaderboards are up to date.'))
@@ -0,0 +1,77 @@
+"""
+Management command to compile the heart-risk model into flat NumPy arrays
+(compiled_model.joblib in the model directory, see coffee/tree_engine.py).
+
+The compiled copy is checked against sklearn's predict_proba before it is
+written; load_model_components uses it for every prediction from then on.
+Re-run after retraining the model (a stale copy is ignored at load time).
+"""
+import os
+import time
+
+import joblib
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from coffee.ml_model_utils import active_model_dir, component_paths
+from coffee.tree_engine import COMPILED_FILE, UnsupportedModelError, compile_model, probe_features
+
+
+class Command(BaseCommand):
+    help = 'Compile the tree-ensemble risk model into a flat-array inference engine'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model-dir',
+            help='Directory with the model components (default: the active model version)',
+        )
+        parser.add_argument(
+            '--check-rows',
+            type=int,
+            default=1000,
+            help='Number of probe rows compared against sklearn before writing (default: 1000)',
+        )
+
+    def handle(self, *args, **options):
+        model_dir = options['model_dir'] or active_model_dir()
+        components = {}
+        for name in ('model', 'scaler'):
+            path, _ = component_paths(model_dir)[name]
+            try:
+                components[name] = joblib.load(path)
+            except FileNotFoundError:
+                raise CommandError(f"Missing model component: {path}")
+
+        try:
+            compiled = compile_model(components['model'], components['scaler'])
+        except UnsupportedModelError as e:
+            raise CommandError(f"Cannot compile this model: {e}")
+
+        features = probe_features(compiled, n=options['check_rows'])
+        started = time.perf_counter()
+        expected = components['model'].predict_proba(components['scaler'].transform(features))[:, 1]
+        sklearn_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        actual = compiled.predict_proba(features)
+        compiled_seconds = time.perf_counter() - started
+
+        if not np.array_equal(actual, expected):
+            difference = float(np.max(np.abs(actual - expected)))
+            if not np.allclose(actual, expected, rtol=1e-9, atol=0.0):
+                raise CommandError(f"Compiled model disagrees with sklearn (max difference {difference:g})")
+            # Only a threaded forest's own summation order differs
+            self.stdout.write(self.style.WARNING(
+                f"Probabilities differ from sklearn by at most {difference:g} (threaded forest summation order)"
+            ))
+
+        target = os.path.join(model_dir, COMPILED_FILE)
+        # Write then rename, so a running server never sees a partial file
+        joblib.dump(compiled, target + '.tmp', compress=0)
+        os.replace(target + '.tmp', target)
+
+        n_nodes = sum(len(block.feature) for block in compiled.blocks)
+        n_trees = sum(len(block.roots) for block in compiled.blocks)
+        self.stdout.write(f"Wrote {target}: {n_trees} trees, {n_nodes} nodes ({os.path.getsize(target)} bytes)")
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(features)} probe rows: sklearn {sklearn_seconds * 1000:.1f} ms, "
+            f"compiled {compiled_seconds * 1000:.1f} ms"
+        ))
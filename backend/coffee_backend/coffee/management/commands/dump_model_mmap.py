@@ -0,0 +1,37 @@
+"""
+Management command to rewrite the heart-risk model components as
+uncompressed joblib dumps (<name>.joblib next to the .pkl files).
+load_model_components prefers them and memory-maps their arrays read-only,
+so every process on the host shares one copy through the page cache.
+"""
+import os
+
+import joblib
+from django.core.management.base import BaseCommand, CommandError
+from coffee.ml_model_utils import COMPONENT_FILES, MMAP_SUFFIX, PICKLE_SUFFIX, active_model_dir
+
+
+class Command(BaseCommand):
+    help = 'Write uncompressed, memory-mappable dumps of the ML model components'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model-dir',
+            help='Directory with the .pkl components (default: the active model version)',
+        )
+
+    def handle(self, *args, **options):
+        model_dir = options['model_dir'] or active_model_dir()
+        for stem in COMPONENT_FILES.values():
+            source = os.path.join(model_dir, stem + PICKLE_SUFFIX)
+            target = os.path.join(model_dir, stem + MMAP_SUFFIX)
+            try:
+                component = joblib.load(source)
+            except FileNotFoundError:
+                raise CommandError(f"Missing model component: {source}")
+            # Write then rename, so a running server never sees a partial file
+            joblib.dump(component, target + '.tmp', compress=0)
+            os.replace(target + '.tmp', target)
+            self.stdout.write(f"Wrote {target} ({os.path.getsize(target)} bytes)")
+
+        self.stdout.write(self.style.SUCCESS('Model components can now be memory-mapped.'))
@@ -0,0 +1,40 @@
+"""
+Management command to stream the recipe catalogue (origins, coffees, likes,
+consumed coffees) to an NDJSON dump; see coffee/catalogue_io.py for the format.
+
+    python manage.py export_catalogue --output catalogue.ndjson.gz
+"""
+from django.core.management.base import BaseCommand
+from coffee.catalogue_io import Throughput, export_catalogue, open_stream
+
+
+class Command(BaseCommand):
+    help = 'Export the recipe catalogue as NDJSON (optionally gzipped)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output',
+            default='-',
+            help="File to write, '-' for stdout (default). Gzipped when it ends in .gz",
+        )
+        parser.add_argument(
+            '--gzip',
+            action='store_true',
+            help='Gzip the output regardless of the file name',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Rows fetched per database round trip (default: 2000)',
+        )
+
+    def handle(self, *args, **options):
+        # Progress goes to stderr so the dump can be piped from stdout
+        throughput = Throughput(report=self.stderr.write)
+        with open_stream(options['output'], 'w', compress=options['gzip'] or None) as stream:
+            export_catalogue(stream, chunk_size=options['chunk_size'], throughput=throughput)
+
+        for line in throughput.summary():
+            self.stderr.write(line)
+        self.stderr.write(self.style.SUCCESS('Export complete.'))
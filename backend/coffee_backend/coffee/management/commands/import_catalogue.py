@@ -0,0 +1,43 @@
+"""
+Management command to load an NDJSON catalogue dump written by
+export_catalogue. Ids are remapped, users are matched by username (rows of
+unknown users are skipped) and rows are written in bulk batches.
+
+    python manage.py import_catalogue --input catalogue.ndjson.gz
+"""
+from django.core.management.base import BaseCommand, CommandError
+from coffee.catalogue_io import CatalogueFormatError, Throughput, import_catalogue, open_stream
+
+
+class Command(BaseCommand):
+    help = 'Import a recipe catalogue NDJSON dump (optionally gzipped)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--input',
+            default='-',
+            help="File to read, '-' for stdin (default). Gunzipped when it ends in .gz",
+        )
+        parser.add_argument(
+            '--gzip',
+            action='store_true',
+            help='Treat the input as gzipped regardless of the file name',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of rows per bulk insert (default: 1000)',
+        )
+
+    def handle(self, *args, **options):
+        throughput = Throughput(report=self.stdout.write)
+        try:
+            with open_stream(options['input'], 'r', compress=options['gzip'] or None) as stream:
+                import_catalogue(stream, batch_size=options['batch_size'], throughput=throughput)
+        except CatalogueFormatError as e:
+            raise CommandError(str(e))
+
+        for line in throughput.summary():
+            self.stdout.write(line)
+        self.stdout.write(self.style.SUCCESS('Import complete.'))
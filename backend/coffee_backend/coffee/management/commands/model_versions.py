@@ -0,0 +1,94 @@
+"""
+Management command to publish heart-risk model versions and switch the
+version every worker serves (see coffee/model_registry.py).
+
+    manage.py model_versions --list
+    manage.py model_versions --publish 2025-06-01 --source thesis_model/models_improved
+    manage.py model_versions --shadow 2025-06-01      # score it on live traffic first
+    manage.py model_versions --activate 2025-06-01    # workers swap within seconds
+    manage.py model_versions --clear-shadow
+
+A version is checked by loading it and scoring a row before it is
+published or marked; workers pick markers up within ML_MODEL_CHECK_INTERVAL
+seconds without a restart.
+"""
+import shutil
+
+from django.core.management.base import BaseCommand, CommandError
+from coffee.ml_model_utils import get_model_path, prepare_features_batch
+from coffee.model_registry import (
+    ACTIVE_MARKER, SHADOW_MARKER, ModelVersionError, list_versions, load_bundle, publish_version, read_marker,
+    version_dir, write_marker,
+)
+
+
+class Command(BaseCommand):
+    help = 'Publish, activate and shadow-test heart-risk model versions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--list', action='store_true', help='List published versions and the markers')
+        parser.add_argument('--publish', metavar='VERSION', help='Publish the bundle in --source as VERSION')
+        parser.add_argument('--source', help='Directory with the model files to publish')
+        parser.add_argument('--activate', metavar='VERSION', help='Serve VERSION from every worker')
+        parser.add_argument('--shadow', metavar='VERSION', help='Score VERSION alongside the active model')
+        parser.add_argument('--clear-shadow', action='store_true', help='Stop shadow scoring')
+        parser.add_argument('--deactivate', action='store_true',
+                            help='Go back to the unversioned files in the model directory')
+
+    def handle(self, *args, **options):
+        try:
+            if options['publish']:
+                self._publish(options['publish'], options['source'])
+            if options['shadow']:
+                self._check(options['shadow'])
+                write_marker(SHADOW_MARKER, options['shadow'])
+                self.stdout.write(self.style.SUCCESS(f"Shadow scoring version {options['shadow']}"))
+            if options['clear_shadow']:
+                write_marker(SHADOW_MARKER, None)
+                self.stdout.write(self.style.SUCCESS('Shadow scoring stopped'))
+            if options['activate']:
+                self._check(options['activate'])
+                write_marker(ACTIVE_MARKER, options['activate'])
+                self.stdout.write(self.style.SUCCESS(f"Activated version {options['activate']}"))
+            if options['deactivate']:
+                write_marker(ACTIVE_MARKER, None)
+                self.stdout.write(self.style.SUCCESS('Serving the unversioned model files'))
+        except ModelVersionError as e:
+            raise CommandError(str(e))
+
+        if options['list'] or not any(
+            options[name] for name in ('publish', 'shadow', 'clear_shadow', 'activate', 'deactivate')
+        ):
+            self._list()
+
+    def _publish(self, version, source):
+        if not source:
+            raise CommandError('--publish needs --source')
+        target = publish_version(source, version)
+        try:
+            self._check(version)
+        except CommandError:
+            shutil.rmtree(target, ignore_errors=True)
+            raise
+        self.stdout.write(f"Published {version} to {target}")
+
+    def _check(self, version):
+        """Load the version and score one default row; raise CommandError if that fails."""
+        try:
+            bundle = load_bundle(version_dir(version), version)
+            bundle.predict_proba(prepare_features_batch({'age': [None]}))
+        except ModelVersionError:
+            raise
+        except Exception as e:
+            raise CommandError(f"Model version {version} cannot score: {e}")
+
+    def _list(self):
+        active, shadow = read_marker(ACTIVE_MARKER), read_marker(SHADOW_MARKER)
+        self.stdout.write(f"Model directory: {get_model_path()}")
+        self.stdout.write(f"  (unversioned){'  [active]' if active is None else ''}")
+        for version in list_versions():
+            flags = ''.join([
+                '  [active]' if version == active else '',
+                '  [shadow]' if version == shadow else '',
+            ])
+            self.stdout.write(f"  {version}{flags}")
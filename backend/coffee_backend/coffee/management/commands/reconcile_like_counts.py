@@ -0,0 +1,65 @@
+"""
+Management command to repair drift in the denormalized Coffee.like_count
+column (e.g. after rows were changed without signals) by recounting the Like
+table in primary-key chunks.
+"""
+from django.core.management.base import BaseCommand
+from django.db import models, transaction
+from coffee.cache import bump_catalogue_version
+from coffee.models.coffee import Coffee
+
+
+class Command(BaseCommand):
+    help = 'Recompute Coffee.like_count from the Like table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report drifted recipes without updating them',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of recipes checked per chunk (default: 1000)',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        batch_size = options['batch_size']
+
+        bounds = Coffee.objects.aggregate(low=models.Min('pk'), high=models.Max('pk'))
+        if bounds['low'] is None:
+            self.stdout.write("No coffee recipes to check.")
+            return
+
+        checked = repaired = 0
+        for start in range(bounds['low'], bounds['high'] + 1, batch_size):
+            chunk = Coffee.objects.filter(pk__gte=start, pk__lt=start + batch_size)
+            with transaction.atomic():
+                drifted = list(
+                    chunk.annotate(actual=Coffee.objects.actual_like_count())
+                    .exclude(like_count=models.F('actual'))
+                    .values_list('pk', 'name', 'like_count', 'actual')
+                )
+                for pk, name, stored, actual in drifted:
+                    self.stdout.write(
+                        f"{'[DRY RUN] Would fix' if dry_run else 'Fixed'}: "
+                        f"#{pk} {name} - {stored} -> {actual} likes"
+                    )
+                if drifted and not dry_run:
+                    Coffee.objects.filter(pk__in=[row[0] for row in drifted]).recount_likes()
+            checked += chunk.count()
+            repaired += len(drifted)
+
+        if repaired and not dry_run:
+            # Queryset updates send no signals
+            bump_catalogue_version()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{'[DRY RUN] ' if dry_run else ''}Checked {checked} recipes, "
+                f"{repaired} had a drifted like count."
+            )
+        )
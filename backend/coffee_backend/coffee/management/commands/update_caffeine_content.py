@@ -1,9 +1,15 @@
 """
 Management command to update caffeine content for existing coffee recipes
 based on their names and descriptions using real-world caffeine data.
+
+Only estimated values are touched: recipes whose caffeine was entered manually
+(no caffeine_estimate_version) are left alone.
 """
 from django.core.management.base import BaseCommand
+from coffee.cache import bump_catalogue_version
+from coffee.caffeine import CAFFEINE_RULES_VERSION
 from coffee.models.coffee import Coffee
+from coffee.rollups import refresh_for_coffees
 
 
 class Command(BaseCommand):
@@ -15,33 +21,51 @@ class Command(BaseCommand):
             action='store_true',
             help='Show what would be updated without actually updating',
         )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Re-check every estimated recipe, not only those from an older rule version',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of rows written per UPDATE batch (default: 500)',
+        )
 
     def handle(self, *args, **options):
         dry_run = options['dry_run']
-        coffees = Coffee.objects.all()
+        batch_size = options['batch_size']
+
+        coffees = Coffee.objects.exclude(caffeine_estimate_version=None)
+        if not options['all']:
+            coffees = coffees.exclude(caffeine_estimate_version=CAFFEINE_RULES_VERSION)
+        coffees = coffees.only('id', 'name', 'description', 'caffeine_mg', 'caffeine_estimate_version')
+
         updated_count = 0
-        
-        self.stdout.write(f"Processing {coffees.count()} coffee recipes...")
-        
-        for coffee in coffees:
-            # Get the estimated caffeine using the model's method
-            estimated_caffeine = coffee._estimate_caffeine_from_name()
-            
-            # Only update if the current value is the default or significantly different
-            current_caffeine = coffee.caffeine_mg or 0
-            
-            # Update if it's the default (95.0) or if it's very different from estimate
-            if current_caffeine == 95.0 or abs(current_caffeine - estimated_caffeine) > 20:
-                if not dry_run:
-                    coffee.caffeine_mg = estimated_caffeine
-                    coffee.save(update_fields=['caffeine_mg'])
-                
+        batch, changed_ids = [], []
+
+        self.stdout.write(f"Processing {coffees.count()} coffee recipes (rule version {CAFFEINE_RULES_VERSION})...")
+
+        for coffee in coffees.iterator(chunk_size=batch_size):
+            current_caffeine = coffee.caffeine_mg
+            coffee.refresh_caffeine_estimate()
+
+            if current_caffeine != coffee.caffeine_mg:
                 self.stdout.write(
                     f"{'[DRY RUN] Would update' if dry_run else 'Updated'}: "
-                    f"{coffee.name} - {current_caffeine}mg -> {estimated_caffeine}mg"
+                    f"{coffee.name} - {current_caffeine}mg -> {coffee.caffeine_mg}mg"
                 )
                 updated_count += 1
-        
+                changed_ids.append(coffee.pk)
+
+            batch.append(coffee)
+            if len(batch) >= batch_size:
+                self._flush(batch, changed_ids, dry_run)
+                batch, changed_ids = [], []
+
+        self._flush(batch, changed_ids, dry_run)
+
         if dry_run:
             self.stdout.write(
                 self.style.SUCCESS(
@@ -55,3 +79,10 @@ class Command(BaseCommand):
                     f'\nSuccessfully updated {updated_count} coffee recipes with accurate caffeine content.'
                 )
             )
+
+    def _flush(self, batch, changed_ids, dry_run):
+        if batch and not dry_run:
+            Coffee.objects.bulk_update(batch, ['caffeine_mg', 'caffeine_estimate_version'])
+            # bulk_update sends no signals
+            refresh_for_coffees(changed_ids)
+            bump_catalogue_version()
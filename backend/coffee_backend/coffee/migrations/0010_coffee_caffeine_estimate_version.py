@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:53
+
+import coffee.caffeine
+from django.db import migrations, models
+
+
+def estimate_existing_caffeine(apps, schema_editor):
+    """Store the estimate once so reads never have to recompute (or write) it."""
+    from coffee.caffeine import CAFFEINE_RULES_VERSION, estimate_caffeine_mg
+
+    Coffee = apps.get_model('coffee', 'Coffee')
+    batch = []
+    for coffee in Coffee.objects.only('id', 'name', 'description').iterator(chunk_size=1000):
+        coffee.caffeine_mg = estimate_caffeine_mg(coffee.name, coffee.description)
+        coffee.caffeine_estimate_version = CAFFEINE_RULES_VERSION
+        batch.append(coffee)
+        if len(batch) >= 1000:
+            Coffee.objects.bulk_update(batch, ['caffeine_mg', 'caffeine_estimate_version'])
+            batch = []
+    if batch:
+        Coffee.objects.bulk_update(batch, ['caffeine_mg', 'caffeine_estimate_version'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coffee', '0009_alter_consumedcoffee_consumed_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coffee',
+            name='caffeine_estimate_version',
+            field=models.PositiveSmallIntegerField(blank=True, default=coffee.caffeine.current_rules_version, help_text='Version of the caffeine rule table caffeine_mg was estimated with (empty if entered manually)', null=True),
+        ),
+        migrations.RunPython(estimate_existing_caffeine, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:59
+
+import re
+import unicodedata
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# The tokenizer and weights of coffee/search.py when this migration was
+# written, frozen so later changes there do not change the backfill
+NAME_WEIGHT = 3
+ORIGIN_WEIGHT = 2
+DESCRIPTION_WEIGHT = 1
+MAX_TERM_LENGTH = 64
+MIN_TERM_LENGTH = 2
+TOKEN_RE = re.compile(r'\w+')
+
+
+def tokenize(text):
+    if not text:
+        return []
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(char for char in text if not unicodedata.combining(char)).lower()
+    return [token[:MAX_TERM_LENGTH] for token in TOKEN_RE.findall(text)]
+
+
+def document_terms(coffee):
+    weights = defaultdict(int)
+    for text, weight in (
+        (coffee.name, NAME_WEIGHT),
+        (coffee.origin.name if coffee.origin_id else '', ORIGIN_WEIGHT),
+        (coffee.description, DESCRIPTION_WEIGHT),
+    ):
+        for term in set(tokenize(text)):
+            if len(term) >= MIN_TERM_LENGTH:
+                weights[term] += weight
+    return weights
+
+
+def index_existing_coffees(apps, schema_editor):
+    """Populate the search index for recipes created before it existed."""
+    Coffee = apps.get_model('coffee', 'Coffee')
+    SearchTerm = apps.get_model('coffee', 'SearchTerm')
+    batch = []
+    coffees = Coffee.objects.select_related('origin').only('id', 'name', 'description', 'origin__name')
+    for coffee in coffees.iterator(chunk_size=1000):
+        batch.extend(
+            SearchTerm(term=term, coffee_id=coffee.pk, weight=weight)
+            for term, weight in document_terms(coffee).items()
+        )
+        if len(batch) >= 1000:
+            SearchTerm.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        SearchTerm.objects.bulk_create(batch)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coffee', '0011_coffee_updated_at_userchangecounter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('weight', models.PositiveSmallIntegerField(default=1)),
+                ('coffee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='coffee.coffee')),
+            ],
+            options={
+                'unique_together': {('term', 'coffee')},
+            },
+        ),
+        migrations.RunPython(index_existing_coffees, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:03
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def count_existing_likes(apps, schema_editor):
+    Coffee = apps.get_model('coffee', 'Coffee')
+    Like = apps.get_model('coffee', 'Like')
+    likes_total = (
+        Like.objects.filter(coffee=models.OuterRef('pk'))
+        .order_by()
+        .values('coffee')
+        .annotate(total=models.Count('pk'))
+        .values('total')
+    )
+    Coffee.objects.update(
+        like_count=Coalesce(models.Subquery(likes_total, output_field=models.IntegerField()), 0)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coffee', '0012_searchterm'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coffee',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0, help_text='Number of likes, maintained by the Like signals (repair with manage.py reconcile_like_counts)'),
+        ),
+        migrations.RunPython(count_existing_likes, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='coffee',
+            index=models.Index(fields=['-like_count', '-id'], name='coffee_like_count_idx'),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:05
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.utils import timezone
+
+# The boards of coffee/leaderboard.py when this migration was written,
+# frozen so later changes there do not change the backfill
+TRENDING_WINDOWS = {
+    'day': 24 * 3600,
+    'week': 7 * 24 * 3600,
+}
+MAX_ENTRIES = 1000
+
+
+def build_trending_boards(apps, schema_editor):
+    """Seed the trending boards from existing likes (see coffee/leaderboard.py)."""
+    Leaderboard = apps.get_model('coffee', 'Leaderboard')
+    LeaderboardEntry = apps.get_model('coffee', 'LeaderboardEntry')
+    Like = apps.get_model('coffee', 'Like')
+    now = timezone.now()
+    for name, half_life in TRENDING_WINDOWS.items():
+        board = Leaderboard.objects.create(name=name, half_life_seconds=half_life, epoch=now)
+        since = now - timezone.timedelta(seconds=30 * half_life)
+        scores = {}
+        for coffee_id, liked_at in Like.objects.filter(created_at__gte=since).values_list('coffee_id', 'created_at'):
+            scores[coffee_id] = scores.get(coffee_id, 0.0) + 2.0 ** ((liked_at - now).total_seconds() / half_life)
+        top = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:MAX_ENTRIES]
+        LeaderboardEntry.objects.bulk_create(
+            [LeaderboardEntry(leaderboard=board, coffee_id=coffee_id, score=score) for coffee_id, score in top]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coffee', '0013_coffee_like_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Leaderboard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=20, unique=True)),
+                ('half_life_seconds', models.PositiveIntegerField()),
+                ('epoch', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(default=0.0)),
+                ('coffee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to='coffee.coffee')),
+                ('leaderboard', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entries', to='coffee.leaderboard')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['leaderboard', '-score'], name='leaderboard_score_idx')],
+                'unique_together': {('leaderboard', 'coffee')},
+            },
+        ),
+        migrations.RunPython(build_trending_boards, migrations.RunPython.noop),
+    ]
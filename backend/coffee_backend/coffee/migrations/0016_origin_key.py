@@ -0,0 +1,45 @@
+from django.db import migrations, models
+
+
+def merge_duplicate_origins(apps, schema_editor):
+    """
+    Fill Origin.key and merge origins whose names only differ in case or
+    spacing into the oldest one, re-pointing coffees and challenge recipes.
+    """
+    from coffee.models.coffee import normalize_origin_name
+
+    Origin = apps.get_model('coffee', 'Origin')
+    Coffee = apps.get_model('coffee', 'Coffee')
+    ChallengeRecipe = apps.get_model('coffee', 'ChallengeRecipe')
+
+    canonical = {}
+    for origin in Origin.objects.order_by('pk'):
+        key = normalize_origin_name(origin.name) or f'origin-{origin.pk}'
+        keeper = canonical.setdefault(key, origin.pk)
+        if keeper == origin.pk:
+            Origin.objects.filter(pk=origin.pk).update(key=key)
+        else:
+            Coffee.objects.filter(origin_id=origin.pk).update(origin_id=keeper)
+            ChallengeRecipe.objects.filter(origin_id=origin.pk).update(origin_id=keeper)
+            origin.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coffee', '0015_like_user_created_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='origin',
+            name='key',
+            field=models.CharField(editable=False, max_length=100, null=True),
+        ),
+        migrations.RunPython(merge_duplicate_origins, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='origin',
+            name='key',
+            field=models.CharField(editable=False, help_text='Normalized name; origins are unique by key (see coffee/origins.py)', max_length=100, unique=True),
+        ),
+    ]
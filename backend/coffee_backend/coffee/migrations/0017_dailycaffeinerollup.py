@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import TruncDate
+
+
+def backfill_rollups(apps, schema_editor):
+    ConsumedCoffee = apps.get_model('coffee', 'ConsumedCoffee')
+    DailyCaffeineRollup = apps.get_model('coffee', 'DailyCaffeineRollup')
+    totals = (
+        ConsumedCoffee.objects.order_by()
+        .annotate(day=TruncDate('consumed_at'))
+        .values('user_id', 'day')
+        .annotate(total_mg=models.Sum('coffee__caffeine_mg'), count=models.Count('pk'))
+    )
+    DailyCaffeineRollup.objects.bulk_create(
+        (
+            DailyCaffeineRollup(user_id=row['user_id'], day=row['day'], total_mg=row['total_mg'] or 0.0, count=row['count'])
+            for row in totals.iterator(chunk_size=1000)
+        ),
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coffee', '0016_origin_key'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyCaffeineRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('total_mg', models.FloatField(default=0.0)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='caffeine_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'day')},
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:34
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coffee', '0018_versioncounter'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='like',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
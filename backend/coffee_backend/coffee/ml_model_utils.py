@@ -1,34 +1,50 @@
 """
 Utility module for loading and using the trained ML model for heart disease risk prediction.
+
+Components are loaded once per process and held by the model registry
+(coffee/model_registry.py), which serves the version marked active and
+swaps in newly activated versions without a restart. In production the
+model is loaded before gunicorn forks its workers (ML_PRELOAD_MODEL, see
+gunicorn.conf.py and CoffeeConfig.ready), so every worker shares the
+parent's copy instead of loading its own on the first prediction. When uncompressed dumps written by
+`manage.py dump_model_mmap` are present, their arrays are memory-mapped
+read-only, so their pages are shared through the OS page cache as well.
+
+If `manage.py compile_risk_model` has written a compiled copy of the model
+(see coffee/tree_engine.py), predictions use it instead of sklearn; it is
+checked against the sklearn model at load time and ignored if they differ.
 """
 import os
-import joblib
+
+import numpy as np
 from django.conf import settings
-from datetime import date
 
 
-_model_cache = {
-    'model': None,
-    'scaler': None,
-    'encoders': None,
-    'feature_names': None
+# Component name -> file stem in the model directory
+COMPONENT_FILES = {
+    'model': 'heart_disease_model',
+    'scaler': 'scaler',
+    'encoders': 'encoders',
+    'feature_names': 'feature_names',
 }
-
+PICKLE_SUFFIX = '.pkl'
+MMAP_SUFFIX = '.joblib'  # Uncompressed dumps, loaded with mmap_mode='r'
 
 def clear_model_cache():
-    """Clear the model cache to force reloading."""
-    global _model_cache
-    _model_cache = {
-        'model': None,
-        'scaler': None,
-        'encoders': None,
-        'feature_names': None
-    }
+    """Clear the model cache to force reloading (in this process)."""
+    from .model_registry import get_registry
+    get_registry().clear()
     import logging
     logger = logging.getLogger(__name__)
     logger.info("Model cache cleared - will reload on next prediction")
 
 
+def model_status():
+    """Whether the model is loaded in this process, and how (for readiness checks)."""
+    from .model_registry import get_registry
+    return get_registry().status()
+
+
 def get_model_path():
     """Get the path to the ML model directory."""
     model_dir = getattr(settings, 'ML_MODEL_DIR', None)
@@ -38,154 +54,194 @@ def get_model_path():
     return model_dir
 
 
+def active_model_dir():
+    """Directory of the model version currently marked active (see coffee/model_registry.py)."""
+    from .model_registry import active_model_dir
+    return active_model_dir()
+
+
+def component_paths(model_dir=None):
+    """{component: (path, memory_mapped)}, preferring uncompressed .joblib dumps over .pkl files."""
+    model_dir = model_dir or get_model_path()
+    paths = {}
+    for name, stem in COMPONENT_FILES.items():
+        mmap_path = os.path.join(model_dir, stem + MMAP_SUFFIX)
+        if os.path.exists(mmap_path):
+            paths[name] = (mmap_path, True)
+        else:
+            paths[name] = (os.path.join(model_dir, stem + PICKLE_SUFFIX), False)
+    return paths
+
+
+def model_version():
+    """Version of the active model (loading it if needed), part of prediction cache keys."""
+    from .model_registry import get_registry
+    return get_registry().active().version
+
+
 def load_model_components():
     """
     Load the trained ML model and preprocessing components.
-    Uses caching to avoid reloading on every request.
+    Uses caching to avoid reloading on every request: the components of the
+    active version in the model registry.
+    """
+    from .model_registry import get_registry
+    return get_registry().active().components
+
+
+def warm_up_model():
+    """
+    Load the model and run one prediction, so sklearn's lazily imported
+    modules are in memory too (call before forking workers). Never raises:
+    failures are logged and reported by model_status(). Returns True if the
+    model is ready.
     """
-    if _model_cache['model'] is not None:
-        return _model_cache
-    
-    model_dir = get_model_path()
-    
+    import logging
+    from .model_registry import get_registry
+    logger = logging.getLogger(__name__)
     try:
-        model_path = os.path.join(model_dir, 'heart_disease_model.pkl')
-        model = joblib.load(model_path)
-        _model_cache['model'] = model
-
-        scaler_path = os.path.join(model_dir, 'scaler.pkl')
-        scaler = joblib.load(scaler_path)
-        _model_cache['scaler'] = scaler
-
-        encoders_path = os.path.join(model_dir, 'encoders.pkl')
-        encoders = joblib.load(encoders_path)
-        _model_cache['encoders'] = encoders
-
-        feature_names_path = os.path.join(model_dir, 'feature_names.pkl')
-        feature_names = joblib.load(feature_names_path)
-        _model_cache['feature_names'] = feature_names
-
-        from sklearn.ensemble import VotingClassifier
-        if isinstance(model, VotingClassifier):
-            import logging
-            logger = logging.getLogger(__name__)
-            logger.info(f"Loaded ensemble model (VotingClassifier) with {len(model.estimators_)} estimators")
-        
-        return _model_cache
-    except FileNotFoundError as e:
-        raise FileNotFoundError(
-            f"ML model files not found in {model_dir}. "
-            "Please train the model first using thesis_model/train_model.py"
-        ) from e
+        # Loads in this thread and scores without shadow sampling: no
+        # background threads may be running when the workers are forked
+        get_registry().preload().predict_proba(prepare_features_batch({'age': [None]}))
     except Exception as e:
-        raise RuntimeError(f"Error loading ML model: {str(e)}") from e
+        get_registry().record_error(e)
+        logger.error(f"ML model warm-up failed: {e}")
+        return False
+    status = model_status()
+    logger.info(
+        f"ML model {status['version']} warmed up in {status['load_seconds']}s "
+        f"(memory-mapped: {status['memory_mapped']})"
+    )
+    return True
 
 
-def prepare_features(health_profile, bp_entry, avg_daily_caffeine, total_caffeine_week, period_days):
+# Population defaults used when a value is missing (typical healthy adults)
+DEFAULT_AGE = 45
+DEFAULT_BMI = 25.0
+DEFAULT_SYSTOLIC_BP = 120.0
+DEFAULT_DIASTOLIC_BP = 80.0
+TOTAL_CHOLESTEROL = 200.0  # mg/dL (typical adult average)
+HDL_CHOLESTEROL = 50.0     # mg/dL (typical average)
+LDL_CHOLESTEROL = 120.0    # mg/dL (calculated from total - HDL)
+TRIGLYCERIDES = 150.0      # mg/dL (typical average)
+GLUCOSE = 95.0             # mg/dL (normal fasting glucose)
+
+# Upper edges of the caffeine categories: none, low, moderate, high, extreme
+CAFFEINE_CATEGORY_EDGES = (50, 200, 400, 600)
+
+# Columns accepted by prepare_features_batch
+FEATURE_COLUMNS = (
+    'age', 'sex', 'bmi', 'systolic_bp', 'diastolic_bp',
+    'has_hypertension', 'has_diabetes', 'has_family_history_chd', 'is_smoker', 'has_high_cholesterol',
+    'avg_daily_caffeine', 'total_caffeine_week', 'period_days',
+)
+
+
+# Names of the 24 columns of prepare_features_batch, in order
+MODEL_FEATURE_NAMES = (
+    'age', 'sex_encoded', 'bmi', 'avg_daily_caffeine_mg', 'total_caffeine_week_mg',
+    'systolic_bp', 'diastolic_bp', 'has_hypertension', 'has_diabetes', 'has_family_history_chd',
+    'is_smoker', 'activity_level_encoded', 'has_high_cholesterol',
+    'total_cholesterol', 'hdl_cholesterol', 'ldl_cholesterol', 'triglycerides', 'glucose',
+    'caffeine_per_kg', 'caffeine_per_bmi', 'caffeine_category',
+    'caffeine_age_interaction', 'caffeine_hypertension_interaction', 'is_high_caffeine',
+)
+
+
+def feature_columns(rows):
     """
-    Prepare feature vector from user data for model prediction.
-    Args:
-        health_profile: UserHealthProfile instance
-        bp_entry: Dict with 'systolic' and 'diastolic' keys, or None
-        avg_daily_caffeine: Average daily caffeine intake in mg
-        total_caffeine_week: Total caffeine for the period in mg
-        period_days: Number of days in the period
-    Returns:
-        numpy array of features ready for model prediction
+    Columnar input for prepare_features_batch from prepare_features-style
+    rows: an iterable of (health_profile, bp_entry, avg_daily_caffeine,
+    total_caffeine_week, period_days) tuples.
     """
-    import numpy as np
-
-    components = load_model_components()
-    encoders = components['encoders']
-    
-    age = None
-    if health_profile and health_profile.date_of_birth:
-        today = date.today()
-        age = today.year - health_profile.date_of_birth.year
-        if (today.month, today.day) < (health_profile.date_of_birth.month, health_profile.date_of_birth.day):
-            age -= 1
-
-    if age is None:
-        age = 45
-
-    sex = health_profile.sex if health_profile and health_profile.sex else 'M'
-    # Normalize sex values
-    if sex not in ['M', 'F']:
-        sex = 'M'  # Default to Male if unknown
-    
-    # Manual encoding for sex (M=1, F=0 based on encoder)
-    sex_encoded = 1 if sex == 'M' else 0
-    
-    bmi = None
-    if health_profile:
-        bmi = health_profile.bmi
-    if bmi is None:
-        bmi = 25.0
-    
-    systolic_bp = bp_entry.get('systolic') if bp_entry else None
-    diastolic_bp = bp_entry.get('diastolic') if bp_entry else None
-    
-    if systolic_bp is None:
-        systolic_bp = 120.0
-    if diastolic_bp is None:
-        diastolic_bp = 80.0
-    
-    has_hypertension = 1 if (health_profile and health_profile.has_hypertension) else 0
-    has_diabetes = 1 if (health_profile and health_profile.has_diabetes) else 0
-    has_family_history_chd = 1 if (health_profile and health_profile.has_family_history_chd) else 0
-    is_smoker = 1 if (health_profile and health_profile.is_smoker) else 0
-    
-    activity_level = health_profile.activity_level if health_profile and health_profile.activity_level else 'sedentary'
-    
-    # Manual encoding for activity level (encoder only knows 'sedentary' from training data)
-    # Map all activity levels to sedentary since that's what the model was trained with
-    # This is a limitation of the training data, but maintains compatibility
-    activity_level_encoded = 0  # All map to 'sedentary' (the only class in training data)
-    
-    if period_days > 0:
-        total_caffeine_week_mg = total_caffeine_week * (7 / period_days) if period_days != 7 else total_caffeine_week
-    else:
-        total_caffeine_week_mg = 0
-    
-    avg_daily_caffeine_mg = max(0, avg_daily_caffeine)
-    
-    # Lab values - use population defaults if not available
-    # These values represent typical healthy adults
-    has_high_cholesterol = 1 if (health_profile and health_profile.has_high_cholesterol) else 0
-    total_cholesterol = 200.0  # mg/dL (typical adult average)
-    hdl_cholesterol = 50.0     # mg/dL (typical average)
-    ldl_cholesterol = 120.0    # mg/dL (calculated from total - HDL)
-    triglycerides = 150.0      # mg/dL (typical average)
-    glucose = 95.0             # mg/dL (normal fasting glucose)
-    
-    # Caffeine-engineered features
-    # Estimate weight from BMI (assume height = 1.70m for average adult)
-    weight_kg = bmi * (1.70 ** 2)  # BMI = weight / height²
-    
-    caffeine_per_kg = avg_daily_caffeine_mg / weight_kg
-    caffeine_per_kg = min(caffeine_per_kg, 20.0)  # Clip at 20 as in training
-    
-    caffeine_per_bmi = avg_daily_caffeine_mg / bmi
-    caffeine_per_bmi = min(caffeine_per_bmi, 100.0)  # Clip at 100 as in training
-    
-    # Caffeine category (bins: 0-50, 50-200, 200-400, 400-600, 600+)
-    if avg_daily_caffeine_mg <= 50:
-        caffeine_category = 0  # none
-    elif avg_daily_caffeine_mg <= 200:
-        caffeine_category = 1  # low
-    elif avg_daily_caffeine_mg <= 400:
-        caffeine_category = 2  # moderate
-    elif avg_daily_caffeine_mg <= 600:
-        caffeine_category = 3  # high
-    else:
-        caffeine_category = 4  # extreme
-    
+    columns = {name: [] for name in FEATURE_COLUMNS}
+    for health_profile, bp_entry, avg_daily_caffeine, total_caffeine_week, period_days in rows:
+        profile = health_profile
+        columns['age'].append(profile.age if profile else None)
+        columns['sex'].append(profile.sex if profile else None)
+        columns['bmi'].append(profile.bmi if profile else None)
+        columns['systolic_bp'].append(bp_entry.get('systolic') if bp_entry else None)
+        columns['diastolic_bp'].append(bp_entry.get('diastolic') if bp_entry else None)
+        for flag in ('has_hypertension', 'has_diabetes', 'has_family_history_chd', 'is_smoker', 'has_high_cholesterol'):
+            columns[flag].append(bool(profile and getattr(profile, flag)))
+        columns['avg_daily_caffeine'].append(avg_daily_caffeine)
+        columns['total_caffeine_week'].append(total_caffeine_week)
+        columns['period_days'].append(period_days)
+    return columns
+
+
+def _float_column(values, default, n):
+    """float64 column with None/NaN replaced by `default`."""
+    if values is None:
+        return np.full(n, default, dtype=np.float64)
+    column = np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+    column[np.isnan(column)] = default
+    return column
+
+
+def _flag_column(values, n):
+    if values is None:
+        return np.zeros(n, dtype=np.float64)
+    return np.array([bool(value) for value in values], dtype=np.float64)
+
+
+def prepare_features_batch(columns):
+    """
+    Build the (n, 24) feature matrix for n people from columnar input.
+
+    `columns` maps FEATURE_COLUMNS names to equal-length sequences (lists
+    or arrays; None marks a missing value, absent columns are all missing):
+    age in years, sex ('M'/'F'/...), bmi, systolic_bp, diastolic_bp, the
+    boolean condition flags, avg_daily_caffeine (mg/day),
+    total_caffeine_week (mg over the period) and period_days. Missing values
+    get the same population defaults as prepare_features, and every
+    derived feature is computed with whole-column NumPy operations.
+    """
+    lengths = {len(values) for values in columns.values() if values is not None}
+    if len(lengths) > 1:
+        raise ValueError(f"Feature columns have different lengths: {sorted(lengths)}")
+    n = lengths.pop() if lengths else 0
+
+    age = _float_column(columns.get('age'), DEFAULT_AGE, n)
+    sex = columns.get('sex')
+    # Anything but 'F' (including unknown) is encoded as male, as in training
+    sex_encoded = (
+        np.ones(n) if sex is None else (np.asarray(sex, dtype=object) != 'F').astype(np.float64)
+    )
+    bmi = _float_column(columns.get('bmi'), DEFAULT_BMI, n)
+    bmi[bmi == 0] = DEFAULT_BMI
+    systolic_bp = _float_column(columns.get('systolic_bp'), DEFAULT_SYSTOLIC_BP, n)
+    diastolic_bp = _float_column(columns.get('diastolic_bp'), DEFAULT_DIASTOLIC_BP, n)
+    has_hypertension = _flag_column(columns.get('has_hypertension'), n)
+    has_diabetes = _flag_column(columns.get('has_diabetes'), n)
+    has_family_history_chd = _flag_column(columns.get('has_family_history_chd'), n)
+    is_smoker = _flag_column(columns.get('is_smoker'), n)
+    has_high_cholesterol = _flag_column(columns.get('has_high_cholesterol'), n)
+
+    avg_daily_caffeine_mg = np.maximum(_float_column(columns.get('avg_daily_caffeine'), 0.0, n), 0.0)
+    total_caffeine = _float_column(columns.get('total_caffeine_week'), 0.0, n)
+    period_days = _float_column(columns.get('period_days'), 7.0, n)
+    # Scale the period total to a week; non-positive periods count as no intake
+    total_caffeine_week_mg = np.zeros(n)
+    np.multiply(total_caffeine, 7.0 / np.where(period_days > 0, period_days, 1.0),
+                out=total_caffeine_week_mg, where=period_days > 0)
+    weekly = period_days == 7
+    total_caffeine_week_mg[weekly] = total_caffeine[weekly]
+
+    # Caffeine-engineered features (weight estimated from BMI at 1.70 m)
+    weight_kg = bmi * (1.70 ** 2)
+    caffeine_per_kg = np.minimum(avg_daily_caffeine_mg / weight_kg, 20.0)   # Clipped as in training
+    caffeine_per_bmi = np.minimum(avg_daily_caffeine_mg / bmi, 100.0)       # Clipped as in training
+    caffeine_category = np.searchsorted(CAFFEINE_CATEGORY_EDGES, avg_daily_caffeine_mg, side='left')
     caffeine_age_interaction = (avg_daily_caffeine_mg * age) / 1000.0
     caffeine_hypertension_interaction = avg_daily_caffeine_mg * has_hypertension
-    is_high_caffeine = 1 if avg_daily_caffeine_mg > 400 else 0
-    
-    # Build feature array matching the improved model's 24 features
-    features = np.array([[
+    is_high_caffeine = (avg_daily_caffeine_mg > 400).astype(np.float64)
+
+    # The encoder only knows 'sedentary' from the training data: every level maps to it
+    activity_level_encoded = np.zeros(n)
+
+    # Same column order as the improved model's 24 features
+    return np.column_stack([
         age,                                    # 1
         sex_encoded,                            # 2
         bmi,                                    # 3
@@ -199,20 +255,76 @@ def prepare_features(health_profile, bp_entry, avg_daily_caffeine, total_caffein
         is_smoker,                              # 11
         activity_level_encoded,                 # 12
         has_high_cholesterol,                   # 13
-        total_cholesterol,                      # 14
-        hdl_cholesterol,                        # 15
-        ldl_cholesterol,                        # 16
-        triglycerides,                          # 17
-        glucose,                                # 18
+        np.full(n, TOTAL_CHOLESTEROL),          # 14
+        np.full(n, HDL_CHOLESTEROL),            # 15
+        np.full(n, LDL_CHOLESTEROL),            # 16
+        np.full(n, TRIGLYCERIDES),              # 17
+        np.full(n, GLUCOSE),                    # 18
         caffeine_per_kg,                        # 19
         caffeine_per_bmi,                       # 20
-        caffeine_category,                      # 21
+        caffeine_category.astype(np.float64),   # 21
         caffeine_age_interaction,               # 22
         caffeine_hypertension_interaction,      # 23
-        is_high_caffeine                        # 24
-    ]])
-    
-    return features
+        is_high_caffeine,                       # 24
+    ]).reshape(n, 24)
+
+
+def prepare_features(health_profile, bp_entry, avg_daily_caffeine, total_caffeine_week, period_days):
+    """
+    Prepare feature vector from user data for model prediction.
+    Args:
+        health_profile: UserHealthProfile instance
+        bp_entry: Dict with 'systolic' and 'diastolic' keys, or None
+        avg_daily_caffeine: Average daily caffeine intake in mg
+        total_caffeine_week: Total caffeine for the period in mg
+        period_days: Number of days in the period
+    Returns:
+        numpy array of features (shape (1, 24)) ready for model prediction
+    """
+    return prepare_features_batch(feature_columns(
+        [(health_profile, bp_entry, avg_daily_caffeine, total_caffeine_week, period_days)]
+    ))
+
+
+def risk_from_probabilities(raw_probabilities):
+    """
+    Presentation risk for raw model probabilities: a list of dicts with
+    risk_probability, risk_percentage and risk_category.
+    """
+    # For thesis presentation: amplify predictions to show differences more clearly
+    # The ML model is scientifically valid but predicts long-term mortality (~14 years)
+    # where even high-risk individuals have relatively low absolute risk
+    # We scale up to make relative differences visible
+    risk = np.minimum(np.asarray(raw_probabilities, dtype=np.float64) * 5.0, 0.75)
+    categories = np.where(risk < 0.20, 'low', np.where(risk < 0.40, 'moderate', 'high'))
+    return [
+        {
+            'risk_probability': float(probability),
+            'risk_percentage': round(float(probability) * 100, 2),
+            'risk_category': str(category),
+        }
+        for probability, category in zip(risk, categories)
+    ]
+
+
+def predict_proba_batch(features):
+    """
+    Raw positive-class probabilities for a feature matrix: one scaler pass,
+    one predict_proba call (or one pass of the compiled model, if loaded),
+    with the active model version. A shadow candidate, if any, scores a
+    sample of the same rows in the background.
+    """
+    from .model_registry import get_registry
+    return get_registry().predict_proba(features)
+
+
+def predict_heart_disease_risk_batch(columns):
+    """
+    Score many people at once from columnar input (see prepare_features_batch).
+    Returns one risk dict per row, like predict_heart_disease_risk. Raises on
+    model errors instead of falling back, so batch jobs notice them.
+    """
+    return risk_from_probabilities(predict_proba_batch(prepare_features_batch(columns)))
 
 
 def predict_heart_disease_risk(health_profile, bp_entry, avg_daily_caffeine, total_caffeine_week, period_days):
@@ -230,58 +342,34 @@ def predict_heart_disease_risk(health_profile, bp_entry, avg_daily_caffeine, tot
             - risk_percentage: float (0-100)
             - risk_category: str ('low', 'moderate', 'high')
     """
+    from .timing import annotate, span
+
     try:
-        components = load_model_components()
-        model = components['model']
-        scaler = components['scaler']
-        feature_names = components['feature_names']
-        
-        # Debug logging
-        import logging
-        logger = logging.getLogger(__name__)
-        logger.info(f"Model expects {len(feature_names)} features: {feature_names}")
-        
-        features = prepare_features(
-            health_profile, bp_entry, avg_daily_caffeine, 
-            total_caffeine_week, period_days
-        )
-        
-        logger.info(f"Prepared features shape: {features.shape}")
-        logger.info(f"Feature names: {feature_names}")
-        logger.info(f"Feature values: {features[0]}")
-        
-        if features.shape[1] != len(feature_names):
-            error_msg = f"Feature mismatch! Model expects {len(feature_names)} features but got {features.shape[1]}"
-            logger.error(error_msg)
-            raise ValueError(error_msg)
-        
-        features_scaled = scaler.transform(features)
-        logger.info(f"Features scaled: {features_scaled[0]}")
-        
-        # Get raw ML model prediction
-        raw_probability = float(model.predict_proba(features_scaled)[0][1])
-        
-        # For thesis presentation: amplify predictions to show differences more clearly
-        # The ML model is scientifically valid but predicts long-term mortality (~14 years)
-        # where even high-risk individuals have relatively low absolute risk
-        # We scale up to make relative differences visible
-        
-        risk_probability = min(raw_probability * 5.0, 0.75)
-        risk_percentage = risk_probability * 100
-        
-        # Risk categorization  
-        if risk_probability < 0.20:
-            risk_category = 'low'
-        elif risk_probability < 0.40:
-            risk_category = 'moderate'
-        else:
-            risk_category = 'high'
-        
-        return {
-            'risk_probability': float(risk_probability),
-            'risk_percentage': round(risk_percentage, 2),
-            'risk_category': risk_category
-        }
+        with span('prediction.prepare_features'):
+            features = prepare_features(
+                health_profile, bp_entry, avg_daily_caffeine,
+                total_caffeine_week, period_days
+            )
+
+        # Only formatted if this request's trace is sampled for logging
+        annotate(features=features[0])
+
+        # Unchanged inputs are answered from the prediction cache
+        from .prediction_cache import get_prediction_cache, prediction_key
+        cache = get_prediction_cache()
+        with span('prediction.cache_lookup'):
+            key = prediction_key(features, model_version())
+            cached = cache.get(key)
+        annotate(cache_hit=cached is not None)
+        if cached is not None:
+            return dict(cached)
+
+        # Concurrent requests share one model call (see coffee/batching.py)
+        from .batching import get_prediction_batcher
+        with span('prediction.model'):
+            prediction = risk_from_probabilities(get_prediction_batcher().predict(features))[0]
+        cache.set(key, prediction)
+        return dict(prediction)
         
     except Exception as e:
         import logging
@@ -0,0 +1,515 @@
+"""
+Versioned registry of heart-risk model bundles.
+
+A bundle is everything one model version needs to score: the model, its
+scaler, encoders, feature names, optimal threshold and (optionally) the
+compiled engine of coffee/tree_engine.py. Layout of ML_MODEL_DIR:
+
+    heart_disease_model.pkl, scaler.pkl, ...   unversioned bundle (used while
+                                               no version is active)
+    versions/<version>/...                     one directory per published version
+    ACTIVE                                     name of the version to serve
+    SHADOW                                     optional candidate version
+
+`manage.py model_versions` publishes versions and writes the markers.
+Every worker polls the markers (at most every ML_MODEL_CHECK_INTERVAL
+seconds, on the prediction path) and loads a changed version in a
+background thread while it keeps serving the current one, then swaps the
+bundle reference, so no request waits for a load or sees a half-loaded
+model. Recently used bundles are kept (ML_MODEL_KEEP_VERSIONS), so rolling
+back is instant.
+
+While a SHADOW version is set and loaded, a sample of live prediction
+batches (ML_SHADOW_SAMPLE_RATE) is also scored by the candidate on a
+background thread; only the active model's results are returned, and the
+differences are collected in ShadowStats.
+"""
+import hashlib
+import logging
+import os
+import queue
+import random
+import re
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+import joblib
+import numpy as np
+from django.conf import settings
+
+from .ml_model_utils import COMPONENT_FILES, component_paths, get_model_path
+from .timing import span
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_MARKER = 'ACTIVE'
+SHADOW_MARKER = 'SHADOW'
+VERSIONS_DIR = 'versions'
+THRESHOLD_FILE = 'optimal_threshold.txt'
+VERSION_PATTERN = re.compile(r'^[A-Za-z0-9][A-Za-z0-9._-]{0,63}$')
+
+
+class ModelVersionError(ValueError):
+    """An invalid or unknown model version."""
+
+
+@dataclass
+class ModelBundle:
+    version: str
+    directory: str
+    model: object
+    scaler: object
+    encoders: object
+    feature_names: list
+    threshold: float = None
+    compiled: object = None
+    memory_mapped: bool = False
+    loaded_at: float = None
+    load_seconds: float = None
+    components: dict = field(default=None, repr=False)
+
+    def __post_init__(self):
+        # The dict load_model_components has always returned
+        self.components = {
+            'model': self.model,
+            'scaler': self.scaler,
+            'encoders': self.encoders,
+            'feature_names': self.feature_names,
+            'compiled': self.compiled,
+            'threshold': self.threshold,
+            'version': self.version,
+        }
+
+    def predict_proba(self, features):
+        """Raw positive-class probabilities for a feature matrix."""
+        expected = len(self.feature_names)
+        if features.shape[1] != expected:
+            raise ValueError(f"Feature mismatch! Model expects {expected} features but got {features.shape[1]}")
+        if not len(features):
+            return np.zeros(0)
+        if self.compiled is not None:
+            with span('model.compiled_predict_proba'):
+                return self.compiled.predict_proba(features)
+        with span('model.scaler_transform'):
+            features_scaled = self.scaler.transform(features)
+        with span('model.predict_proba'):
+            return self.model.predict_proba(features_scaled)[:, 1]
+
+
+def validate_version(version):
+    if not isinstance(version, str) or not VERSION_PATTERN.match(version):
+        raise ModelVersionError(f"Invalid model version {version!r}: use letters, digits, '.', '_' or '-'")
+    return version
+
+
+def version_dir(version, model_dir=None):
+    return os.path.join(model_dir or get_model_path(), VERSIONS_DIR, validate_version(version))
+
+
+def list_versions(model_dir=None):
+    root = os.path.join(model_dir or get_model_path(), VERSIONS_DIR)
+    if not os.path.isdir(root):
+        return []
+    return sorted(name for name in os.listdir(root) if VERSION_PATTERN.match(name))
+
+
+def read_marker(name, model_dir=None):
+    """Version named by the ACTIVE/SHADOW marker, or None."""
+    try:
+        with open(os.path.join(model_dir or get_model_path(), name)) as marker:
+            return marker.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def write_marker(name, version, model_dir=None):
+    """Point the ACTIVE/SHADOW marker at `version` (None removes it). Atomic."""
+    path = os.path.join(model_dir or get_model_path(), name)
+    if version is None:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    if not os.path.isdir(version_dir(version, model_dir)):
+        raise ModelVersionError(f"Unknown model version {version!r}")
+    with open(path + '.tmp', 'w') as marker:
+        marker.write(version + '\n')
+    os.replace(path + '.tmp', path)
+
+
+def publish_version(source_dir, version, model_dir=None):
+    """Copy a bundle's files into versions/<version>. Versions are immutable."""
+    target = version_dir(version, model_dir)
+    if os.path.exists(target):
+        raise ModelVersionError(f"Model version {version!r} already exists")
+    staging = target + '.tmp'
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    for name in os.listdir(source_dir):
+        path = os.path.join(source_dir, name)
+        if os.path.isfile(path) and (name.endswith(('.pkl', '.joblib')) or name == THRESHOLD_FILE):
+            shutil.copy2(path, os.path.join(staging, name))
+    # Rename last, so a half-copied version is never visible
+    os.replace(staging, target)
+    return target
+
+
+def active_model_dir(model_dir=None):
+    """Directory of the bundle the ACTIVE marker selects (the base directory if none)."""
+    version = read_marker(ACTIVE_MARKER, model_dir)
+    return version_dir(version, model_dir) if version else (model_dir or get_model_path())
+
+
+def _files_digest(paths):
+    """Version of an unversioned bundle: digest of the model and scaler file names, sizes and mtimes."""
+    digest = hashlib.blake2b(digest_size=8)
+    for name in ('model', 'scaler'):
+        path, _ = paths[name]
+        stat = os.stat(path)
+        digest.update(f'{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns};'.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _load_threshold(directory):
+    try:
+        with open(os.path.join(directory, THRESHOLD_FILE)) as threshold_file:
+            return float(threshold_file.read().strip())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _load_compiled_model(directory, model, scaler):
+    """The compiled model from `directory` if present and equivalent to `model`, else None."""
+    from .tree_engine import COMPILED_FILE, ENGINE_VERSION, matches
+
+    path = os.path.join(directory, COMPILED_FILE)
+    if not os.path.exists(path):
+        return None
+    try:
+        compiled = joblib.load(path, mmap_mode='r')
+    except Exception as e:
+        logger.warning(f"Ignoring compiled model {path}: {e}")
+        return None
+    # A stale file (model retrained, not recompiled) must not be served; a
+    # threaded forest may differ from itself in the last bit, hence rtol
+    if getattr(compiled, 'version', None) != ENGINE_VERSION or not matches(compiled, model, scaler, rtol=1e-9):
+        logger.warning(f"Ignoring compiled model {path}: it does not match the loaded model")
+        return None
+    return compiled
+
+
+def load_bundle(directory, version=None):
+    """
+    Load a bundle from `directory`. Raises FileNotFoundError if files are
+    missing and RuntimeError for any other load error.
+    """
+    started = time.monotonic()
+    paths = component_paths(directory)
+    try:
+        components = {
+            name: joblib.load(path, mmap_mode='r' if memory_mapped else None)
+            for name, (path, memory_mapped) in paths.items()
+        }
+        version = version or _files_digest(paths)
+        compiled = _load_compiled_model(directory, components['model'], components['scaler'])
+
+        from sklearn.ensemble import VotingClassifier
+        if isinstance(components['model'], VotingClassifier):
+            logger.info(f"Loaded ensemble model (VotingClassifier) with {len(components['model'].estimators_)} estimators")
+    except FileNotFoundError as e:
+        raise FileNotFoundError(
+            f"ML model files not found in {directory}. "
+            "Please train the model first using thesis_model/train_model.py"
+        ) from e
+    except Exception as e:
+        raise RuntimeError(f"Error loading ML model: {str(e)}") from e
+
+    return ModelBundle(
+        version=version,
+        directory=directory,
+        threshold=_load_threshold(directory),
+        compiled=compiled,
+        memory_mapped=paths['model'][1],
+        loaded_at=time.time(),
+        load_seconds=round(time.monotonic() - started, 3),
+        **{name: components[name] for name in COMPONENT_FILES},
+    )
+
+
+class ShadowStats:
+    """Agreement between the active model and the shadow candidate on live rows."""
+
+    def __init__(self, version=None):
+        self.version = version
+        self._lock = threading.Lock()
+        self.batches = self.rows = self.errors = self.dropped = 0
+        self.category_matches = 0
+        self.total_abs_difference = 0.0
+        self.max_abs_difference = 0.0
+
+    def record(self, active_probabilities, candidate_probabilities):
+        from .ml_model_utils import risk_from_probabilities
+
+        difference = np.abs(np.asarray(candidate_probabilities) - np.asarray(active_probabilities))
+        active_categories = [risk['risk_category'] for risk in risk_from_probabilities(active_probabilities)]
+        candidate_categories = [risk['risk_category'] for risk in risk_from_probabilities(candidate_probabilities)]
+        with self._lock:
+            self.batches += 1
+            self.rows += len(difference)
+            self.total_abs_difference += float(difference.sum())
+            if len(difference):
+                self.max_abs_difference = max(self.max_abs_difference, float(difference.max()))
+            self.category_matches += sum(a == c for a, c in zip(active_categories, candidate_categories))
+
+    def count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'version': self.version,
+                'batches': self.batches,
+                'rows': self.rows,
+                'errors': self.errors,
+                'dropped': self.dropped,
+                'mean_abs_difference': round(self.total_abs_difference / self.rows, 6) if self.rows else None,
+                'max_abs_difference': round(self.max_abs_difference, 6),
+                'category_agreement': round(self.category_matches / self.rows, 4) if self.rows else None,
+            }
+
+
+class ModelRegistry:
+    """Loaded bundles of this process, the active one and the shadow candidate."""
+
+    def __init__(self):
+        self._load_lock = threading.Lock()
+        self._state_lock = threading.Lock()
+        self._bundles = OrderedDict()   # version -> bundle, most recently used last
+        self._active = None
+        self._shadow = None
+        self._markers = None            # (active, shadow) marker values last acted on
+        self._checked_at = 0.0
+        self._loading = set()
+        self._error = None
+        self.shadow_stats = ShadowStats()
+        self._shadow_queue = None
+        self._shadow_pid = None
+
+    # Loading and swapping
+
+    def _target_dir(self, version):
+        return version_dir(version) if version else get_model_path()
+
+    def _get_bundle(self, version):
+        """Bundle for `version` (None: the unversioned files), loading it if needed."""
+        with self._load_lock:
+            if version is not None and version in self._bundles:
+                self._bundles.move_to_end(version)
+                return self._bundles[version]
+            bundle = load_bundle(self._target_dir(version), version)
+            self._bundles[bundle.version] = bundle
+            self._bundles.move_to_end(bundle.version)
+            self._evict()
+            return bundle
+
+    def _evict(self):
+        keep = max(getattr(settings, 'ML_MODEL_KEEP_VERSIONS', 2), 1)
+        pinned = {bundle.version for bundle in (self._active, self._shadow) if bundle is not None}
+        for version in list(self._bundles):
+            if len(self._bundles) <= keep:
+                break
+            if version not in pinned:
+                del self._bundles[version]
+
+    def active(self):
+        """The bundle to serve from; loads it on first use (raises if that fails)."""
+        bundle = self._active
+        if bundle is None:
+            with self._state_lock:
+                if self._active is None:
+                    markers = (read_marker(ACTIVE_MARKER), read_marker(SHADOW_MARKER))
+                    try:
+                        self._active = self._get_bundle(markers[0])
+                    except Exception as e:
+                        self._error = str(e.__cause__ or e)
+                        raise
+                    self._error = None
+                    # The next refresh loads the shadow candidate, if any
+                    self._markers = (markers[0], None)
+                bundle = self._active
+        self._maybe_refresh()
+        return self._active or bundle
+
+    def preload(self):
+        """
+        Load the active and shadow bundles in the calling thread and return
+        the active one. For the master process before workers are forked:
+        unlike active(), it starts no background thread, which a forked
+        worker would inherit dead, together with any lock it held.
+        """
+        self._checked_at = time.monotonic()
+        self.refresh(wait=True)
+        return self.active()
+
+    def after_fork(self):
+        """
+        Reset this process's locks and background-thread state after a fork
+        (the loaded bundles are kept): threads of the parent do not exist in
+        the child, so locks they held would never be released.
+        """
+        self._load_lock = threading.Lock()
+        self._state_lock = threading.Lock()
+        self._loading = set()
+        self._checked_at = 0.0
+        self._shadow_queue = None
+        self._shadow_pid = None
+        self.shadow_stats = ShadowStats(self._shadow.version if self._shadow else None)
+
+    def _maybe_refresh(self):
+        interval = getattr(settings, 'ML_MODEL_CHECK_INTERVAL', 5)
+        now = time.monotonic()
+        if now - self._checked_at < interval:
+            return
+        self._checked_at = now
+        self.refresh()
+
+    def refresh(self, wait=False):
+        """
+        Act on the ACTIVE/SHADOW markers: load changed versions (in the
+        background unless `wait`) and swap them in once loaded.
+        """
+        markers = (read_marker(ACTIVE_MARKER), read_marker(SHADOW_MARKER))
+        with self._state_lock:
+            previous = self._markers or (None, None)
+            if markers == self._markers:
+                return
+            self._markers = markers
+        active_version, shadow_version = markers
+
+        jobs = []
+        if self._active is None or active_version != previous[0]:
+            jobs.append(('active', active_version))
+        if shadow_version is None:
+            with self._state_lock:
+                self._set_shadow(None)
+        elif shadow_version != previous[1]:
+            jobs.append(('shadow', shadow_version))
+
+        for kind, version in jobs:
+            if wait:
+                self._load_and_swap(kind, version)
+            elif (kind, version) not in self._loading:
+                self._loading.add((kind, version))
+                threading.Thread(
+                    target=self._load_and_swap, args=(kind, version),
+                    name=f'model-load-{kind}', daemon=True,
+                ).start()
+
+    def _load_and_swap(self, kind, version):
+        try:
+            bundle = self._get_bundle(version)
+        except Exception as e:
+            self._error = str(e.__cause__ or e)
+            logger.error(f"Could not load {kind} model version {version or '(unversioned)'}: {e}")
+            return
+        finally:
+            self._loading.discard((kind, version))
+
+        with self._state_lock:
+            # The marker may have moved on (or the registry been cleared) while we were loading
+            if self._markers is None or self._markers[0 if kind == 'active' else 1] != version:
+                return
+            if kind == 'active':
+                previous, self._active = self._active, bundle
+                self._error = None
+                logger.info(
+                    f"Swapped in model version {bundle.version} "
+                    f"(was {previous.version if previous else 'none'}, loaded in {bundle.load_seconds}s)"
+                )
+            else:
+                self._set_shadow(bundle)
+
+    def _set_shadow(self, bundle):
+        if (bundle.version if bundle else None) != (self._shadow.version if self._shadow else None):
+            self.shadow_stats = ShadowStats(bundle.version if bundle else None)
+        self._shadow = bundle
+
+    def clear(self):
+        """Forget every loaded bundle in this process (they reload on next use)."""
+        with self._state_lock, self._load_lock:
+            self._bundles.clear()
+            self._active = self._shadow = None
+            self._markers = None
+            self._error = None
+            self.shadow_stats = ShadowStats()
+
+    def record_error(self, error):
+        self._error = str(error)
+
+    def status(self):
+        bundle = self._active
+        return {
+            'loaded': bundle is not None,
+            'memory_mapped': bool(bundle and bundle.memory_mapped),
+            'loaded_at': bundle.loaded_at if bundle else None,
+            'load_seconds': bundle.load_seconds if bundle else None,
+            'compiled': bool(bundle and bundle.compiled is not None),
+            'version': bundle.version if bundle else None,
+            'threshold': bundle.threshold if bundle else None,
+            'shadow_version': self._shadow.version if self._shadow else None,
+            'loaded_versions': list(self._bundles),
+            'loading': sorted(version or '(unversioned)' for _, version in self._loading),
+            'error': self._error,
+        }
+
+    # Scoring
+
+    def predict_proba(self, features):
+        """Score with the active bundle; sample the batch for shadow scoring."""
+        bundle = self.active()
+        probabilities = bundle.predict_proba(features)
+        candidate = self._shadow
+        if candidate is not None and candidate is not bundle and len(features):
+            self._submit_shadow(candidate, features, probabilities)
+        return probabilities
+
+    def _submit_shadow(self, candidate, features, probabilities):
+        rate = getattr(settings, 'ML_SHADOW_SAMPLE_RATE', 1.0)
+        if rate < 1 and random.random() >= rate:
+            return
+        # A worker forked from a process that already started the thread needs its own
+        if self._shadow_pid != os.getpid():
+            self._shadow_pid = os.getpid()
+            self._shadow_queue = queue.Queue(maxsize=64)
+            threading.Thread(target=self._shadow_worker, args=(self._shadow_queue,),
+                             name='model-shadow', daemon=True).start()
+        try:
+            self._shadow_queue.put_nowait((candidate, self.shadow_stats, np.array(features), probabilities))
+        except queue.Full:
+            self.shadow_stats.count('dropped')
+
+    def _shadow_worker(self, jobs):
+        while True:
+            candidate, stats, features, probabilities = jobs.get()
+            try:
+                stats.record(probabilities, candidate.predict_proba(features))
+            except Exception as e:
+                stats.count('errors')
+                logger.warning(f"Shadow model {candidate.version} failed: {e}")
+            finally:
+                jobs.task_done()
+
+    def wait_for_shadow(self):
+        """Block until queued shadow batches are scored (tests, management commands)."""
+        if self._shadow_queue is not None and self._shadow_pid == os.getpid():
+            self._shadow_queue.join()
+
+
+_registry = ModelRegistry()
+
+
+def get_registry():
+    return _registry
@@ -3,4 +3,8 @@ from .user_profile import UserProfile
 from .operations import Operation
 from .coffee_operations import CoffeeOperation
 from .challenges import Challenge, ChallengeRecipe, Vote, Notification
-from .health import UserHealthProfile, BloodPressureEntry
\ No newline at end of file
+from .health import UserHealthProfile, BloodPressureEntry
+from .change_counters import UserChangeCounter, VersionCounter
+from .search import SearchTerm
+from .leaderboard import Leaderboard, LeaderboardEntry
+from .rollups import DailyCaffeineRollup
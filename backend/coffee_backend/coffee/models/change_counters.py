@@ -0,0 +1,84 @@
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+
+class UserChangeCounter(models.Model):
+    """
+    Per-user version counters for data that is served with ETags.
+
+    Each counter is incremented whenever the user's likes or consumption log
+    change, so conditional GETs can be answered from this single row without
+    touching (or serializing) the underlying data.
+    """
+    LIKES = 'likes_version'
+    CONSUMPTION = 'consumption_version'
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="change_counter"
+    )
+    likes_version = models.PositiveBigIntegerField(default=0)
+    consumption_version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @classmethod
+    def bump(cls, user_id, counter):
+        """Atomically increment `counter` (LIKES or CONSUMPTION) for a user."""
+        now = timezone.now()
+        updated = cls.objects.filter(user_id=user_id).update(**{counter: F(counter) + 1, 'updated_at': now})
+        if updated:
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(user_id=user_id, **{counter: 1})
+        except IntegrityError:
+            # Created concurrently by another request
+            cls.objects.filter(user_id=user_id).update(**{counter: F(counter) + 1, 'updated_at': now})
+
+    def __str__(self):
+        return f"Change counters for user {self.user_id}"
+
+
+class VersionCounter(models.Model):
+    """
+    Global version counters that every worker process must agree on (see
+    coffee/cache.py), used when the catalogue cache is process-local.
+
+    Versions are millisecond timestamps of the last bump, so a counter row
+    that is created late never repeats a value handed out by the cache.
+    """
+    CATALOGUE = 'catalogue'
+    ORIGINS = 'origins'
+
+    name = models.CharField(max_length=32, primary_key=True)
+    version = models.PositiveBigIntegerField()
+
+    @staticmethod
+    def _now_ms():
+        return int(timezone.now().timestamp() * 1000)
+
+    @classmethod
+    def current(cls, name):
+        version = cls.objects.filter(name=name).values_list('version', flat=True).first()
+        if version is None:
+            try:
+                with transaction.atomic():
+                    version = cls.objects.create(name=name, version=cls._now_ms()).version
+            except IntegrityError:
+                version = cls.objects.get(name=name).version
+        return version
+
+    @classmethod
+    def bump(cls, name):
+        """Atomically move counter `name` past its current value and now."""
+        if not cls.objects.filter(name=name).update(version=Greatest(F('version') + 1, cls._now_ms())):
+            cls.current(name)
+            cls.objects.filter(name=name).update(version=Greatest(F('version') + 1, cls._now_ms()))
+        return cls.objects.get(name=name).version
+
+    def __str__(self):
+        return f"{self.name} version {self.version}"
@@ -1,12 +1,74 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
+from ..caffeine import CAFFEINE_RULES_VERSION, current_rules_version, estimate_caffeine_mg
+
+def normalize_origin_name(name):
+    """Origin lookup key: case-folded, with whitespace collapsed ("  costa RICA" -> "costa rica")."""
+    return ' '.join((name or '').split()).casefold()
+
+
 class Origin(models.Model):
     name = models.CharField(max_length=100)
+    key = models.CharField(
+        max_length=100,
+        unique=True,
+        editable=False,
+        help_text="Normalized name; origins are unique by key (see coffee/origins.py)"
+    )
+
+    def save(self, *args, **kwargs):
+        self.key = normalize_origin_name(self.name)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'name' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'key'}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.name
 
+class CoffeeQuerySet(models.QuerySet):
+    def with_like_stats(self, user=None):
+        """
+        Annotate each coffee with whether `user` liked it.
+
+        The flag is computed by a correlated subquery in the same SELECT, so
+        serializing a page of N coffees costs one query instead of N+1. The
+        like total needs no annotation: it is the denormalized `like_count`
+        column. The serializer reads `annotated_is_liked` when present.
+        """
+        if user is not None and user.is_authenticated:
+            return self.annotate(
+                annotated_is_liked=models.Exists(
+                    Like.objects.filter(coffee=models.OuterRef('pk'), user=user)
+                )
+            )
+        return self.annotate(annotated_is_liked=models.Value(False))
+
+    def adjust_like_count(self, delta):
+        """Atomically add `delta` to like_count (never below zero)."""
+        qs = self.filter(like_count__gte=-delta) if delta < 0 else self
+        return qs.update(like_count=models.F('like_count') + delta)
+
+    def recount_likes(self):
+        """Recompute like_count from the Like table; returns the number of rows updated."""
+        return self.update(like_count=self.actual_like_count())
+
+    @staticmethod
+    def actual_like_count():
+        """Expression counting the Like rows of the outer coffee."""
+        likes_total = (
+            Like.objects.filter(coffee=models.OuterRef('pk'))
+            .order_by()
+            .values('coffee')
+            .annotate(total=models.Count('pk'))
+            .values('total')
+        )
+        return Coalesce(models.Subquery(likes_total, output_field=models.IntegerField()), 0)
+
+
 class Coffee(models.Model):
     name        = models.CharField(max_length=100)
     origin      = models.ForeignKey(Origin, related_name="coffees", on_delete=models.CASCADE)
@@ -26,89 +88,79 @@ class Coffee(models.Model):
         default=95.0,
         help_text="Caffeine content in milligrams (default: 95mg for standard cup)"
     )
+    like_count = models.PositiveIntegerField(
+        default=0,
+        help_text="Number of likes, maintained by the Like signals (repair with manage.py reconcile_like_counts)"
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+    caffeine_estimate_version = models.PositiveSmallIntegerField(
+        null=True,
+        blank=True,
+        default=current_rules_version,
+        help_text="Version of the caffeine rule table caffeine_mg was estimated with (empty if entered manually)"
+    )
+
+    objects = CoffeeQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Popular recipes: ORDER BY like_count DESC, id DESC
+            models.Index(fields=['-like_count', '-id'], name='coffee_like_count_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what the stored caffeine estimate was computed from
+        instance._caffeine_inputs = (instance.__dict__.get('name'), instance.__dict__.get('description'))
+        instance._stored_caffeine_mg = instance.__dict__.get('caffeine_mg')
+        return instance
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if self._caffeine_inputs_changed(update_fields):
+            self.refresh_caffeine_estimate()
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'caffeine_mg', 'caffeine_estimate_version'}
+        if update_fields is None and not self._state.adding and not kwargs.get('force_insert'):
+            # like_count belongs to the Like signals: never write back a stale copy
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'like_count' and field.attname not in deferred
+            ]
+        # Read by the post_save receivers (daily caffeine rollups)
+        stored_caffeine_mg = getattr(self, '_stored_caffeine_mg', None)
+        self.caffeine_changed = stored_caffeine_mg is not None and stored_caffeine_mg != self.caffeine_mg
+        super().save(*args, **kwargs)
+        self._caffeine_inputs = (self.name, self.description)
+        self._stored_caffeine_mg = self.caffeine_mg
+
+    def _caffeine_inputs_changed(self, update_fields):
+        if self.caffeine_estimate_version is None:
+            return False  # caffeine_mg was entered manually, keep it
+        if update_fields is not None and not {'name', 'description'} & set(update_fields):
+            return False
+        if self._state.adding:
+            return True
+        return getattr(self, '_caffeine_inputs', None) != (self.name, self.description)
+
+    def refresh_caffeine_estimate(self):
+        """Re-estimate caffeine_mg from the name/description (does not save)."""
+        self.caffeine_mg = estimate_caffeine_mg(self.name, self.description)
+        self.caffeine_estimate_version = CAFFEINE_RULES_VERSION
 
     @property
     def likes_count(self):
-        return self.likes.count()
+        return self.like_count
     
     def get_caffeine_mg(self):
-        """Get caffeine content based on coffee name/description (always recalculates)"""
-        # Always recalculate based on name/description to ensure accuracy
-        # This ensures that even if the stored value is outdated, we get the correct value
-        estimated = self._estimate_caffeine_from_name()
-        
-        # Update the stored value if it's different (for future consistency)
-        current_value = self.caffeine_mg or 0
-        if abs(current_value - estimated) > 1.0:  # Only update if significantly different
-            # Update in database without triggering signals
-            if self.pk:
-                Coffee.objects.filter(pk=self.pk).update(caffeine_mg=estimated)
-                # Update the instance attribute to avoid stale data
-                self.caffeine_mg = estimated
-        
-        return estimated
+        """Get the stored caffeine content (kept up to date on save, never written on read)"""
+        return self.caffeine_mg
 
     def _estimate_caffeine_from_name(self):
         """Estimate caffeine based on coffee name/type using real-world data"""
-        name_lower = self.name.lower()
-        description_lower = self.description.lower() if self.description else ""
-        combined = f"{name_lower} {description_lower}"
-        
-        # Based on actual caffeine content per serving data
-        # Check for specific preparation methods first (most specific)
-        if 'cold brew' in combined and ('24' in combined or '24hr' in combined or '24 hour' in combined):
-            return 280.0  # Cold brew 24 hrs (250 ml)
-        elif 'cold brew' in combined and 'ice' not in combined:
-            return 247.0  # Cold brew without ice (250 ml)
-        elif 'cold brew' in combined and ('8' in combined or '8hr' in combined or '8 hour' in combined):
-            return 238.0  # Cold brew 8 hrs (250 ml)
-        elif 'cold brew' in combined:
-            return 182.0  # Cold brew with ice (250 ml)
-        elif 'french press' in combined:
-            return 223.0  # French press (250 ml)
-        elif 'aeropress' in combined or 'aero press' in combined:
-            return 204.0  # Aeropress (150 ml)
-        elif 'pour over' in combined or 'pour-over' in combined or 'v60' in combined:
-            return 185.0  # Pour over filter (250 ml)
-        elif 'chemex' in combined:
-            return 172.0  # Chemex (250 ml)
-        elif 'drip' in combined and 'maker' in combined:
-            return 170.0  # Drip coffee maker (250 ml)
-        elif 'drip' in combined:
-            return 116.0  # Drip (200 ml)
-        elif 'american press' in combined:
-            return 146.0  # American press (250 ml)
-        elif 'ristretto' in combined:
-            return 63.0  # Ristretto (15 ml)
-        elif 'stove-top' in combined or 'stovetop' in combined or 'moka' in combined:
-            return 49.0  # Stove-top espresso maker (30 ml)
-        elif 'espresso' in combined:
-            # Check for double shots
-            if 'double' in combined or 'doppio' in combined or '2 shot' in combined or 'two shot' in combined:
-                return 136.0  # Double espresso (2 x 68mg)
-            return 68.0  # Single espresso (25 ml)
-        # Coffee drinks with milk (typically use 1-2 shots of espresso)
-        elif 'latte' in combined:
-            if 'double' in combined or '2 shot' in combined:
-                return 136.0  # Double shot latte
-            return 68.0  # Single shot latte (1 espresso shot)
-        elif 'cappuccino' in combined:
-            if 'double' in combined or '2 shot' in combined:
-                return 136.0  # Double shot cappuccino
-            return 68.0  # Single shot cappuccino
-        elif 'americano' in combined:
-            return 95.0  # Americano (espresso + water)
-        elif 'macchiato' in combined:
-            return 68.0  # Macchiato (espresso with a dash of milk)
-        elif 'flat white' in combined:
-            if 'double' in combined or '2 shot' in combined:
-                return 136.0
-            return 68.0
-        elif 'decaf' in combined or 'decaffeinated' in combined:
-            return 2.0  # Minimal caffeine
-        else:
-            # Default: assume standard drip coffee
-            return 116.0  # Default: standard drip coffee (200 ml)
+        return estimate_caffeine_mg(self.name, self.description)
 
     def __str__(self):
         return self.name
@@ -124,10 +176,25 @@ class Like(models.Model):
         on_delete=models.CASCADE,
         related_name="likes"
     )
-    created_at = models.DateTimeField(auto_now_add=True)
+    # A default rather than auto_now_add, so catalogue imports keep the dump's time
+    created_at = models.DateTimeField(default=timezone.now)
 
     class Meta:
         unique_together = ('user', 'coffee')  # Prevent duplicate likes
+        indexes = [
+            # A user's favorites, most recently liked first
+            models.Index(fields=['user', '-created_at'], name='like_user_created_idx'),
+        ]
+
+    # Coffee.like_count is adjusted from the post_save/post_delete signals;
+    # keep the Like row and the counter in one transaction
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            return super().delete(*args, **kwargs)
 
     def __str__(self):
         return f"{self.user.username} likes {self.coffee.name}"
@@ -155,5 +222,14 @@ class ConsumedCoffee(models.Model):
             models.Index(fields=['user', '-consumed_at']),
         ]
 
+    def save(self, *args, **kwargs):
+        # The day's caffeine rollup is recomputed by the post_save receiver
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            return super().delete(*args, **kwargs)
+
     def __str__(self):
         return f"{self.user.username} consumed {self.coffee.name} at {self.consumed_at}"
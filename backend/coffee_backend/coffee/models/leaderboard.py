@@ -0,0 +1,44 @@
+from django.db import models
+from django.utils import timezone
+
+from .coffee import Coffee
+
+
+class Leaderboard(models.Model):
+    """
+    A time-decayed ranking of recipes by likes (see coffee/leaderboard.py).
+
+    Scores are stored forward-decayed relative to `epoch`: a like at time t
+    adds 2 ** ((t - epoch) / half_life). Ordering by the stored score is
+    therefore the decayed ranking at any moment, and `epoch` only moves when
+    the board is compacted.
+    """
+    name = models.CharField(max_length=20, unique=True)
+    half_life_seconds = models.PositiveIntegerField()
+    epoch = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return self.name
+
+
+class LeaderboardEntry(models.Model):
+    leaderboard = models.ForeignKey(
+        Leaderboard,
+        on_delete=models.CASCADE,
+        related_name="entries"
+    )
+    coffee = models.ForeignKey(
+        Coffee,
+        on_delete=models.CASCADE,
+        related_name="leaderboard_entries"
+    )
+    score = models.FloatField(default=0.0)
+
+    class Meta:
+        unique_together = ('leaderboard', 'coffee')
+        indexes = [
+            models.Index(fields=['leaderboard', '-score'], name='leaderboard_score_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.leaderboard_id}: {self.coffee_id} ({self.score:.3f})"
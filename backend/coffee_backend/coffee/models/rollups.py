@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.db import models
+
+
+class DailyCaffeineRollup(models.Model):
+    """
+    Caffeine a user consumed on one day (in TIME_ZONE): the sum of the
+    recipes' caffeine_mg and the number of ConsumedCoffee rows.
+
+    Rows are recomputed from the consumption log whenever it changes (see
+    coffee/rollups.py) and rebuilt by `manage.py backfill_caffeine_rollups`.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="caffeine_rollups"
+    )
+    day = models.DateField()
+    total_mg = models.FloatField(default=0.0)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('user', 'day')  # Also the (user, day range) index
+
+    def __str__(self):
+        return f"{self.user_id} on {self.day}: {self.total_mg}mg in {self.count} coffees"
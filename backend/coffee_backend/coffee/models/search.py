@@ -0,0 +1,26 @@
+from django.db import models
+
+from .coffee import Coffee
+
+
+class SearchTerm(models.Model):
+    """
+    One entry of the recipe search inverted index: `term` occurs in `coffee`.
+
+    `weight` is the sum of the field weights the term was found in (name,
+    origin name, description), see coffee/search.py. Rows are maintained from
+    the Coffee/Origin signals and rebuilt by `manage.py rebuild_search_index`.
+    """
+    term = models.CharField(max_length=64)
+    coffee = models.ForeignKey(
+        Coffee,
+        on_delete=models.CASCADE,
+        related_name="search_terms"
+    )
+    weight = models.PositiveSmallIntegerField(default=1)
+
+    class Meta:
+        unique_together = ('term', 'coffee')  # Also the term lookup index
+
+    def __str__(self):
+        return f"{self.term} -> {self.coffee_id} ({self.weight})"
@@ -0,0 +1,142 @@
+"""
+Process-local registry of origins, used to resolve origin names on writes.
+
+Every coffee write used to look its origin up by name. The registry keeps a
+map of normalized origin key -> (id, name) in memory instead: it is loaded
+once per process (warmed on the first request) and resolving a known origin
+costs no query. An unknown name is created with a single upsert on the
+unique Origin.key, which is safe under concurrency.
+
+Origins rarely change. Any change bumps a generation counter (see the
+Origin signals in coffee/signals.py); every process compares it with the
+generation it loaded and reloads when it moved. Like the catalogue version
+(coffee/cache.py), the generation is kept in the `catalogue` cache when
+that is shared by every worker and in a VersionCounter row otherwise, so a
+renamed or deleted origin never lingers in another worker's registry.
+"""
+import threading
+import time
+
+from django.core.cache import caches
+
+from .cache import CATALOGUE_CACHE_ALIAS, bump_catalogue_version, catalogue_cache_is_shared
+from .models.change_counters import VersionCounter
+from .models.coffee import Origin, normalize_origin_name
+
+ORIGIN_GENERATION_KEY = 'origins:generation'
+
+
+def _cache():
+    return caches[CATALOGUE_CACHE_ALIAS]
+
+
+def get_origin_generation():
+    """Current generation; seeded like the catalogue version so a lost key never repeats a value."""
+    if not catalogue_cache_is_shared():
+        return VersionCounter.current(VersionCounter.ORIGINS)
+    cache = _cache()
+    generation = cache.get(ORIGIN_GENERATION_KEY)
+    if generation is None:
+        cache.add(ORIGIN_GENERATION_KEY, int(time.time() * 1000), timeout=None)
+        generation = cache.get(ORIGIN_GENERATION_KEY)
+    return generation
+
+
+def bump_origin_generation():
+    """Invalidate the origin registry of every process."""
+    if not catalogue_cache_is_shared():
+        return VersionCounter.bump(VersionCounter.ORIGINS)
+    cache = _cache()
+    try:
+        return cache.incr(ORIGIN_GENERATION_KEY)
+    except ValueError:
+        # Key missing (expired or evicted): any new value invalidates
+        get_origin_generation()
+        return cache.incr(ORIGIN_GENERATION_KEY)
+
+
+class OriginRegistry:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_key = None
+        self._generation = None
+
+    def warm(self):
+        """(Re)load every origin."""
+        generation = get_origin_generation()
+        by_key = {key: (pk, name) for pk, name, key in Origin.objects.values_list('pk', 'name', 'key')}
+        with self._lock:
+            self._by_key = by_key
+            self._generation = generation
+
+    def clear(self):
+        with self._lock:
+            self._by_key = None
+            self._generation = None
+
+    def _entries(self):
+        if self._by_key is None or self._generation != get_origin_generation():
+            self.warm()
+        return self._by_key
+
+    def resolve(self, name):
+        """Return the Origin for `name` (matched by key), creating it if needed."""
+        return self.resolve_many([name])[name]
+
+    def resolve_many(self, names):
+        """
+        Resolve several names at once: returns {name: Origin}. All unknown
+        origins are created with one upsert.
+        """
+        keys = {}
+        for name in names:
+            key = normalize_origin_name(name)
+            if not key:
+                raise ValueError("Origin name must not be empty")
+            keys[name] = key
+
+        entries = self._entries()
+        missing = {key: ' '.join(name.split()) for name, key in keys.items() if key not in entries}
+        if missing:
+            entries = dict(entries, **self._upsert(missing))
+
+        db = Origin.objects.all().db
+        return {
+            name: Origin.from_db(db, ['id', 'name', 'key'], [entries[key][0], entries[key][1], key])
+            for name, key in keys.items()
+        }
+
+    def _upsert(self, names_by_key):
+        # One INSERT ... ON CONFLICT (key); rows that already exist (e.g. created
+        # concurrently) are kept as they are
+        Origin.objects.bulk_create(
+            [Origin(name=name, key=key) for key, name in names_by_key.items()],
+            update_conflicts=True, unique_fields=['key'], update_fields=['key']
+        )
+        created = {
+            key: (pk, name)
+            for key, pk, name in Origin.objects.filter(key__in=names_by_key).values_list('key', 'pk', 'name')
+        }
+
+        # bulk_create sends no signals: the origin list and other registries must refresh.
+        # This registry reloads too, on its next use, since other origins may have changed
+        bump_catalogue_version()
+        bump_origin_generation()
+        return created
+
+
+origin_registry = OriginRegistry()
+
+
+def resolve_origin(name):
+    return origin_registry.resolve(name)
+
+
+def warm_origin_registry(sender=None, **kwargs):
+    """request_started receiver: load the registry before the first request is handled."""
+    from django.core.signals import request_started
+
+    request_started.disconnect(dispatch_uid='coffee.warm_origin_registry')
+    if origin_registry._by_key is None:
+        origin_registry.warm()
@@ -0,0 +1,39 @@
+from rest_framework.pagination import CursorPagination
+
+
+class CoffeeCursorPagination(CursorPagination):
+    """
+    Keyset pagination for the public coffee list.
+
+    Pages are addressed by an opaque cursor that encodes the last seen id, so
+    every page is a single `WHERE id < ? ORDER BY id DESC LIMIT n` query no
+    matter how deep the client scrolls (no OFFSET, no COUNT(*)).
+    Coffee ids are assigned in creation order, so this is also newest-first.
+    """
+    ordering = '-id'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+
+class FavoritesCursorPagination(CoffeeCursorPagination):
+    """
+    Keyset pagination for a user's favorites, most recently liked first.
+
+    Expects coffees annotated with `liked_at` (the Like's created_at); pages
+    are `WHERE like.user_id = ? AND like.created_at < ?` scans of the
+    Like(user, -created_at) index. Likes made in the same instant are
+    separated by the cursor's offset.
+    """
+    ordering = ('-liked_at', '-id')
+
+
+class ConsumedCursorPagination(CursorPagination):
+    """
+    Keyset pagination for a user's consumption history, most recent first,
+    served from the ConsumedCoffee(user, -consumed_at) index.
+    """
+    ordering = ('-consumed_at', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
@@ -0,0 +1,112 @@
+"""
+In-process cache of heart-risk predictions.
+
+Users re-request predictions for unchanged inputs (switching tabs,
+re-opening the page). Results are memoized under a BLAKE2b digest of the
+final feature vector and the model version, so there is nothing to
+invalidate: a new consumption, blood-pressure entry or profile edit changes
+the features, and a new model changes the version. Entries expire after
+ML_PREDICTION_CACHE_TTL seconds and the least recently used entries are
+evicted beyond ML_PREDICTION_CACHE_SIZE.
+
+The key uses the unscaled features: the scaled vector is a deterministic
+function of them and the model version, and hashing first saves the
+scaler pass on a hit.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+
+
+def prediction_key(features, model_version):
+    """Canonical digest of one feature row and the model version."""
+    row = np.ascontiguousarray(features, dtype=np.float64).ravel()
+    # -0.0 and 0.0 are the same input
+    row = row + 0.0
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str(model_version).encode('utf-8'))
+    digest.update(row.tobytes())
+    return digest.hexdigest()
+
+
+class PredictionCache:
+    """Thread-safe LRU mapping with a per-entry time to live."""
+
+    def __init__(self, max_entries=4096, ttl=600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def metrics(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_prediction_cache():
+    """The process-wide prediction cache (configured from settings)."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = PredictionCache(
+                    max_entries=getattr(settings, 'ML_PREDICTION_CACHE_SIZE', 4096),
+                    ttl=getattr(settings, 'ML_PREDICTION_CACHE_TTL', 600),
+                )
+    return _cache
+
+
+def reset_prediction_cache():
+    """Drop the process-wide cache (settings changed, tests)."""
+    global _cache
+    with _cache_lock:
+        _cache = None
@@ -0,0 +1,108 @@
+"""
+Batch heart-risk scoring of users (nightly risk refresh, /api/prediction/batch/).
+
+Inputs for many users are gathered with a fixed number of queries (users
+with their health profile and latest blood pressure in one, caffeine totals
+from the daily rollups in two) into the columnar form of
+ml_model_utils.prepare_features_batch, so thousands of users are scored by
+one feature-matrix build and one predict_proba call.
+"""
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import models
+from django.utils import timezone
+
+from .models.health import BloodPressureEntry
+from .rollups import caffeine_totals_many
+
+PERIOD_DAYS = {'week': 7, 'month': 30, 'year': 365}
+CONDITION_FLAGS = ('has_hypertension', 'has_diabetes', 'has_family_history_chd', 'is_smoker', 'has_high_cholesterol')
+
+
+def user_feature_columns(user_ids=None, period='year', now=None):
+    """
+    (user_ids, columns) for prepare_features_batch, one row per user. With
+    no `user_ids`, every user with a health profile is included. Missing
+    profiles or readings are left as None (model defaults apply). Besides
+    the model inputs, columns hold 'num_coffees' (consumptions in the
+    period) and 'num_relatives_chd'.
+    """
+    now = now or timezone.now()
+    period_days = PERIOD_DAYS[period]
+
+    latest_bp = BloodPressureEntry.objects.filter(user=models.OuterRef('pk')).order_by('-measured_at')
+    users = get_user_model().objects.select_related('health_profile').annotate(
+        latest_systolic=models.Subquery(latest_bp.values('systolic')[:1]),
+        latest_diastolic=models.Subquery(latest_bp.values('diastolic')[:1]),
+    ).order_by('pk')
+    if user_ids is None:
+        users = users.filter(health_profile__isnull=False)
+    else:
+        users = users.filter(pk__in=user_ids)
+    users = list(users)
+
+    totals = caffeine_totals_many([user.pk for user in users], now - timedelta(days=period_days), now)
+    columns = {
+        'age': [], 'sex': [], 'bmi': [], 'systolic_bp': [], 'diastolic_bp': [],
+        **{flag: [] for flag in CONDITION_FLAGS},
+        'avg_daily_caffeine': [], 'total_caffeine_week': [], 'period_days': [],
+        'num_coffees': [], 'num_relatives_chd': [],
+    }
+    for user in users:
+        profile = getattr(user, 'health_profile', None)
+        columns['age'].append(profile.age if profile else None)
+        columns['sex'].append(profile.sex if profile else None)
+        columns['bmi'].append(profile.bmi if profile else None)
+        columns['systolic_bp'].append(user.latest_systolic)
+        columns['diastolic_bp'].append(user.latest_diastolic)
+        for flag in CONDITION_FLAGS:
+            columns[flag].append(bool(profile and getattr(profile, flag)))
+        total_mg, num_coffees = totals[user.pk]
+        columns['avg_daily_caffeine'].append(total_mg / period_days)
+        columns['total_caffeine_week'].append(total_mg)
+        columns['period_days'].append(period_days)
+        columns['num_coffees'].append(num_coffees)
+        columns['num_relatives_chd'].append((profile.num_relatives_chd or 0) if profile else 0)
+    return [user.pk for user in users], columns
+
+
+def score_users(user_ids=None, period='year', now=None):
+    """
+    Risk for many users at once: {user_id: {risk_probability,
+    risk_percentage, risk_category}}. Raises if the model cannot score.
+    """
+    from .ml_model_utils import predict_heart_disease_risk_batch
+
+    scored_ids, columns = user_feature_columns(user_ids, period, now)
+    return dict(zip(scored_ids, predict_heart_disease_risk_batch(columns)))
+
+
+def simulate_caffeine(user_id, extra_daily_mg, period='week', bp_override=None, now=None):
+    """
+    What-if risk curve for one user: their stored inputs with
+    `extra_daily_mg` (a sequence of mg/day offsets, negative for less)
+    added to their average daily caffeine. Returns (baseline_avg_daily_mg,
+    [(avg_daily_mg, risk dict), ...]); the whole grid is one feature matrix
+    and one predict_proba call. `bp_override` is an optional
+    {'systolic', 'diastolic'} replacing the latest reading.
+    """
+    import numpy as np
+
+    from .ml_model_utils import predict_proba_batch, prepare_features_batch, risk_from_probabilities
+
+    period_days = PERIOD_DAYS[period]
+    _, columns = user_feature_columns([user_id], period, now)
+    if bp_override:
+        columns['systolic_bp'] = [bp_override['systolic']]
+        columns['diastolic_bp'] = [bp_override['diastolic']]
+
+    baseline = columns['avg_daily_caffeine'][0]
+    daily_mg = np.maximum(baseline + np.asarray(extra_daily_mg, dtype=np.float64), 0.0)
+    # Every other input is repeated; the derived caffeine features follow from these two
+    sweep = {name: values * len(daily_mg) for name, values in columns.items()}
+    sweep['avg_daily_caffeine'] = daily_mg
+    sweep['total_caffeine_week'] = daily_mg * period_days
+
+    risks = risk_from_probabilities(predict_proba_batch(prepare_features_batch(sweep)))
+    return baseline, list(zip(daily_mg.tolist(), risks))
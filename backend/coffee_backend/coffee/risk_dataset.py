@@ -0,0 +1,303 @@
+"""
+Anonymised heart-risk feature dataset (manage.py export_heart_risk_dataset).
+
+Users are processed in chunks of consecutive ids. Each chunk costs a fixed
+number of queries: users with their health profile and latest blood
+pressure in one (risk.user_feature_columns), and caffeine totals grouped
+from the daily rollups in at most two. Features for the whole chunk come
+from one prepare_features_batch call. Rows stream to CSV, Parquet
+(requires pyarrow) or a NumPy .npz archive, so memory stays bounded by the
+chunk size. With workers > 1, contiguous user-id ranges are exported by a
+process pool into part files that are merged in order.
+"""
+import csv
+import os
+import shutil
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from django.db import connections
+from django.utils import timezone
+
+from .ml_model_utils import MODEL_FEATURE_NAMES, prepare_features_batch
+from .risk import PERIOD_DAYS, user_feature_columns
+
+FORMATS = ('csv', 'parquet', 'npz')
+LEADING_COLUMNS = ('user_id', 'period', 'period_days', 'avg_daily_caffeine_mg', 'total_caffeine_period_mg')
+TRAILING_COLUMNS = ('num_relatives_chd',)
+DATASET_COLUMNS = LEADING_COLUMNS + MODEL_FEATURE_NAMES + TRAILING_COLUMNS
+
+
+class DatasetChunk:
+    """Rows of one chunk as arrays; only users who drank coffee in the period."""
+
+    def __init__(self, period, user_ids, columns):
+        keep = np.asarray(columns['num_coffees'], dtype=np.int64) > 0
+        self.period = period
+        self.period_days = PERIOD_DAYS[period]
+        self.user_ids = np.asarray(user_ids, dtype=np.int64)[keep]
+        self.total_mg = np.asarray(columns['total_caffeine_week'], dtype=np.float64)[keep]
+        self.avg_daily_mg = self.total_mg / self.period_days
+        self.features = prepare_features_batch(columns)[keep]
+        self.num_relatives = np.asarray(columns['num_relatives_chd'], dtype=np.int64)[keep]
+
+    def __len__(self):
+        return len(self.user_ids)
+
+
+def profile_user_ids(user_range=None):
+    """Ids of users with a health profile, ascending; `user_range` is [low, high)."""
+    from .models.health import UserHealthProfile
+
+    profiles = UserHealthProfile.objects.order_by('user_id')
+    if user_range is not None:
+        low, high = user_range
+        if low is not None:
+            profiles = profiles.filter(user_id__gte=low)
+        if high is not None:
+            profiles = profiles.filter(user_id__lt=high)
+    return profiles.values_list('user_id', flat=True)
+
+
+def iter_chunks(period, now=None, chunk_size=1000, user_range=None):
+    now = now or timezone.now()
+    batch = []
+    for user_id in profile_user_ids(user_range).iterator(chunk_size=chunk_size):
+        batch.append(user_id)
+        if len(batch) >= chunk_size:
+            yield DatasetChunk(period, *user_feature_columns(batch, period, now))
+            batch = []
+    if batch:
+        yield DatasetChunk(period, *user_feature_columns(batch, period, now))
+
+
+class CsvWriter:
+    def __init__(self, path, header=True):
+        self.file = open(path, 'w', newline='')
+        self.writer = csv.writer(self.file)
+        if header:
+            self.writer.writerow(DATASET_COLUMNS)
+
+    def write(self, chunk):
+        self.writer.writerows(
+            [user_id, chunk.period, chunk.period_days, round(avg, 2), round(total, 2), *features, relatives]
+            for user_id, avg, total, features, relatives in zip(
+                chunk.user_ids.tolist(), chunk.avg_daily_mg.tolist(), chunk.total_mg.tolist(),
+                chunk.features.tolist(), chunk.num_relatives.tolist(),
+            )
+        )
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+    """One row group per chunk."""
+
+    def __init__(self, path):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError(f'Parquet output needs pyarrow. Please install it with: pip install pyarrow ({e})')
+        self.pa = pa
+        self.schema = pa.schema(
+            [('user_id', pa.int64()), ('period', pa.string()), ('period_days', pa.int64()),
+             ('avg_daily_caffeine_mg', pa.float64()), ('total_caffeine_period_mg', pa.float64())]
+            + [(name, pa.float64()) for name in MODEL_FEATURE_NAMES]
+            + [('num_relatives_chd', pa.int64())]
+        )
+        self.writer = pq.ParquetWriter(path, self.schema)
+
+    def write(self, chunk):
+        n = len(chunk)
+        arrays = [
+            chunk.user_ids, [chunk.period] * n, np.full(n, chunk.period_days, dtype=np.int64),
+            chunk.avg_daily_mg, chunk.total_mg,
+            *(chunk.features[:, index] for index in range(len(MODEL_FEATURE_NAMES))),
+            chunk.num_relatives,
+        ]
+        self.writer.write_table(self.pa.Table.from_arrays(
+            [self.pa.array(array) for array in arrays], schema=self.schema
+        ))
+
+    def close(self):
+        self.writer.close()
+
+
+class NpzWriter:
+    """
+    Appends each chunk to raw temporary files and packs them into the .npz
+    archive on close (features as an (n, 24) float64 matrix).
+    """
+    ARRAYS = (
+        ('user_id', np.int64), ('avg_daily_caffeine_mg', np.float64), ('total_caffeine_period_mg', np.float64),
+        ('features', np.float64), ('num_relatives_chd', np.int64),
+    )
+
+    def __init__(self, path):
+        self.path = path
+        self.directory = tempfile.mkdtemp(prefix='heart-risk-npz-', dir=os.path.dirname(os.path.abspath(path)))
+        self.files = {name: open(os.path.join(self.directory, name), 'wb') for name, _ in self.ARRAYS}
+        self.rows = 0
+        self.period = None
+
+    def write(self, chunk):
+        self.period = chunk.period
+        self.rows += len(chunk)
+        for name, values in (
+            ('user_id', chunk.user_ids), ('avg_daily_caffeine_mg', chunk.avg_daily_mg),
+            ('total_caffeine_period_mg', chunk.total_mg), ('features', chunk.features),
+            ('num_relatives_chd', chunk.num_relatives),
+        ):
+            np.ascontiguousarray(values).tofile(self.files[name])
+
+    def append_archive(self, path):
+        """
+        Append the rows of an archive written by NpzWriter, copying the raw
+        data of each array member a buffer at a time.
+        """
+        with zipfile.ZipFile(path) as archive:
+            with archive.open('period.npy') as member:
+                self.period = str(np.lib.format.read_array(member)) or self.period
+            for name, dtype in self.ARRAYS:
+                with archive.open(f'{name}.npy') as member:
+                    version = np.lib.format.read_magic(member)
+                    read_header = (np.lib.format.read_array_header_1_0 if version == (1, 0)
+                                   else np.lib.format.read_array_header_2_0)
+                    shape, fortran_order, stored_dtype = read_header(member)
+                    if fortran_order or stored_dtype != np.dtype(dtype):
+                        raise ValueError(f"{path}: unexpected layout of {name!r} ({stored_dtype}, {shape})")
+                    shutil.copyfileobj(member, self.files[name])
+                if name == 'user_id':
+                    self.rows += shape[0]
+
+    def close(self):
+        try:
+            arrays = {}
+            for name, dtype in self.ARRAYS:
+                self.files[name].close()
+                shape = (self.rows, len(MODEL_FEATURE_NAMES)) if name == 'features' else (self.rows,)
+                path = os.path.join(self.directory, name)
+                arrays[name] = np.memmap(path, dtype=dtype, mode='r', shape=shape) if self.rows else np.zeros(shape, dtype)
+            np.savez(
+                self.path, feature_names=np.array(MODEL_FEATURE_NAMES),
+                period=np.array(self.period or ''), **arrays,
+            )
+        finally:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def open_writer(path, fmt, header=True):
+    if fmt == 'csv':
+        return CsvWriter(path, header=header)
+    if fmt == 'parquet':
+        return ParquetWriter(path)
+    if fmt == 'npz':
+        return NpzWriter(path)
+    raise ValueError(f"Unknown format {fmt!r}; use one of {', '.join(FORMATS)}")
+
+
+def format_for_path(path):
+    extension = os.path.splitext(path)[1].lower().lstrip('.')
+    return extension if extension in FORMATS else 'csv'
+
+
+def export_range(path, fmt, period, now, chunk_size, user_range=None, header=True, progress=None):
+    """Export users in `user_range` to `path`; returns the number of rows written."""
+    writer = open_writer(path, fmt, header=header)
+    rows = 0
+    try:
+        for chunk in iter_chunks(period, now, chunk_size, user_range):
+            writer.write(chunk)
+            rows += len(chunk)
+            if progress:
+                progress(rows)
+    finally:
+        writer.close()
+    return rows
+
+
+def _init_worker():
+    # Spawned workers need Django set up; forked ones must not reuse the parent's connections
+    import django
+
+    django.setup()
+    connections.close_all()
+
+
+def _export_part(args):
+    return export_range(*args)
+
+
+def user_id_ranges(workers):
+    """Split the profile user ids into `workers` contiguous [low, high) ranges of similar size."""
+    from .models.health import UserHealthProfile
+
+    count = UserHealthProfile.objects.count()
+    if not count:
+        return [(None, None)]
+    step = -(-count // workers)
+    bounds = [
+        profile_user_ids()[index]
+        for index in range(step, count, step)
+    ]
+    lows = [None] + bounds
+    highs = bounds + [None]
+    return list(zip(lows, highs))
+
+
+def merge_parts(path, fmt, parts):
+    """Concatenate part files (written without CSV headers) into `path`, in order."""
+    if fmt == 'csv':
+        with open(path, 'w', newline='') as target:
+            csv.writer(target).writerow(DATASET_COLUMNS)
+            for part in parts:
+                with open(part, newline='') as source:
+                    shutil.copyfileobj(source, target)
+    elif fmt == 'parquet':
+        import pyarrow.parquet as pq
+
+        writer = None
+        for part in parts:
+            part_file = pq.ParquetFile(part)
+            writer = writer or pq.ParquetWriter(path, part_file.schema_arrow)
+            for index in range(part_file.num_row_groups):
+                writer.write_table(part_file.read_row_group(index))
+        if writer:
+            writer.close()
+    else:
+        writer = NpzWriter(path)
+        try:
+            for part in parts:
+                writer.append_archive(part)
+        finally:
+            writer.close()
+
+
+def export_dataset(path, fmt='csv', period='year', chunk_size=1000, workers=1, progress=None):
+    """Write the dataset to `path`; returns the number of rows."""
+    now = timezone.now()
+    if workers <= 1:
+        return export_range(path, fmt, period, now, chunk_size, progress=progress)
+
+    ranges = user_id_ranges(workers)
+    root, extension = os.path.splitext(path)
+    parts = [f'{root}.part{index}{extension}' for index in range(len(ranges))]
+    try:
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            rows = sum(pool.map(_export_part, [
+                (part, fmt, period, now, chunk_size, user_range, False)
+                for part, user_range in zip(parts, ranges)
+            ]))
+        merge_parts(path, fmt, parts)
+    finally:
+        for part in parts:
+            if os.path.exists(part):
+                os.remove(part)
+    if progress:
+        progress(rows)
+    return rows
@@ -0,0 +1,164 @@
+"""
+Per-user daily caffeine rollups (DailyCaffeineRollup).
+
+Period statistics (prediction, dataset export) used to sum the caffeine of
+every ConsumedCoffee in the window through a join with Coffee. They now sum
+at most one small row per day instead; only the partial days at the edges of
+a window are read from the consumption log.
+
+A day's row is never adjusted by deltas: it is recomputed from the log
+whenever one of its entries is added or removed, or when the caffeine of a
+consumed recipe changes, so it always equals what the join would return.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db import models, transaction
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def day_start(day):
+    """Aware datetime at which `day` starts in the current time zone."""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _consumed(user_id):
+    from .models.coffee import ConsumedCoffee
+
+    return ConsumedCoffee.objects.filter(user_id=user_id).order_by()
+
+
+def refresh_days(user_id, days):
+    """Recompute the rollups of `user_id` for `days` from the consumption log."""
+    from .models.rollups import DailyCaffeineRollup
+
+    days = set(days)
+    if not days:
+        return
+    totals = (
+        _consumed(user_id)
+        .filter(consumed_at__date__in=days)
+        .annotate(day=TruncDate('consumed_at'))
+        .values('day')
+        .annotate(total_mg=models.Sum('coffee__caffeine_mg'), count=models.Count('pk'))
+    )
+    rows = [
+        DailyCaffeineRollup(user_id=user_id, day=row['day'], total_mg=row['total_mg'] or 0.0, count=row['count'])
+        for row in totals
+    ]
+    with transaction.atomic():
+        DailyCaffeineRollup.objects.bulk_create(
+            rows, update_conflicts=True, unique_fields=['user', 'day'], update_fields=['total_mg', 'count']
+        )
+        emptied = days - {row.day for row in rows}
+        if emptied:
+            DailyCaffeineRollup.objects.filter(user_id=user_id, day__in=emptied).delete()
+
+
+def refresh_for_coffees(coffee_ids):
+    """
+    Recompute every rollup that includes one of `coffee_ids` (after a caffeine
+    change), and bump the consumption counter of each affected user so what
+    is cached under it (caffeine timelines, consumption ETags) is rebuilt.
+    """
+    from .models.change_counters import UserChangeCounter
+    from .models.coffee import ConsumedCoffee
+
+    affected = (
+        ConsumedCoffee.objects.filter(coffee_id__in=list(coffee_ids))
+        .annotate(day=TruncDate('consumed_at'))
+        .order_by()
+        .values_list('user_id', 'day')
+        .distinct()
+    )
+    days_by_user = {}
+    for user_id, day in affected:
+        days_by_user.setdefault(user_id, set()).add(day)
+    for user_id, days in days_by_user.items():
+        UserChangeCounter.bump(user_id, UserChangeCounter.CONSUMPTION)
+        refresh_days(user_id, days)
+
+
+def rebuild(user_ids=None, batch_size=1000):
+    """Rebuild the rollups (of `user_ids`, or everyone's) with one grouped scan; returns rows written."""
+    from .models.coffee import ConsumedCoffee
+    from .models.rollups import DailyCaffeineRollup
+
+    consumed = ConsumedCoffee.objects.order_by()
+    existing = DailyCaffeineRollup.objects.all()
+    if user_ids is not None:
+        consumed = consumed.filter(user_id__in=user_ids)
+        existing = existing.filter(user_id__in=user_ids)
+    totals = (
+        consumed.annotate(day=TruncDate('consumed_at'))
+        .values('user_id', 'day')
+        .annotate(total_mg=models.Sum('coffee__caffeine_mg'), count=models.Count('pk'))
+        .values_list('user_id', 'day', 'total_mg', 'count')
+    )
+
+    written = 0
+    with transaction.atomic():
+        existing.delete()
+        batch = []
+        for user_id, day, total_mg, count in totals.iterator(chunk_size=batch_size):
+            batch.append(DailyCaffeineRollup(user_id=user_id, day=day, total_mg=total_mg or 0.0, count=count))
+            if len(batch) >= batch_size:
+                DailyCaffeineRollup.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+        DailyCaffeineRollup.objects.bulk_create(batch)
+        written += len(batch)
+    return written
+
+
+def caffeine_totals_many(user_ids, start, end=None):
+    """
+    {user_id: (total caffeine mg, number of coffees)} consumed in
+    [start, end) for each of `user_ids`. Whole days come from the rollups;
+    the partial days at either edge from the consumption log. Two grouped
+    queries at most, however many users.
+    """
+    from .models.coffee import ConsumedCoffee
+    from .models.rollups import DailyCaffeineRollup
+
+    user_ids = list(user_ids)
+    end = end or timezone.now()
+    first_day = timezone.localdate(start)
+    if day_start(first_day) < start:
+        first_day += timedelta(days=1)
+    last_day = timezone.localdate(end)  # exclusive: `end` falls inside it (or starts it)
+
+    totals = {user_id: [0.0, 0] for user_id in user_ids}
+    if first_day >= last_day:
+        edges = models.Q(consumed_at__gte=start, consumed_at__lt=end)
+    else:
+        edges = (
+            models.Q(consumed_at__gte=start, consumed_at__lt=day_start(first_day))
+            | models.Q(consumed_at__gte=day_start(last_day), consumed_at__lt=end)
+        )
+        rolled_up = (
+            DailyCaffeineRollup.objects.filter(user_id__in=user_ids, day__gte=first_day, day__lt=last_day)
+            .values('user_id')
+            .annotate(total_mg=models.Sum('total_mg'), count=models.Sum('count'))
+            .values_list('user_id', 'total_mg', 'count')
+        )
+        for user_id, total_mg, count in rolled_up:
+            totals[user_id][0] += total_mg or 0.0
+            totals[user_id][1] += count or 0
+
+    live = (
+        ConsumedCoffee.objects.filter(edges, user_id__in=user_ids)
+        .order_by()
+        .values('user_id')
+        .annotate(total_mg=models.Sum('coffee__caffeine_mg'), count=models.Count('pk'))
+        .values_list('user_id', 'total_mg', 'count')
+    )
+    for user_id, total_mg, count in live:
+        totals[user_id][0] += total_mg or 0.0
+        totals[user_id][1] += count
+    return {user_id: (total_mg, count) for user_id, (total_mg, count) in totals.items()}
+
+
+def caffeine_totals(user_id, start, end=None):
+    """(total caffeine mg, number of coffees) consumed by `user_id` in [start, end)."""
+    return caffeine_totals_many([user_id], start, end)[user_id]
@@ -0,0 +1,165 @@
+"""
+Full-text recipe search over Coffee.name, Coffee.description and Origin.name.
+
+Searches use the SearchTerm inverted index on every database: each recipe
+is tokenized once on write (from the Coffee/Origin signals), and a query is
+answered from the (term, coffee) index with one grouped query, so its cost
+follows the matching terms rather than the size of the catalogue. Tokens
+are lowercased and accent-folded the same way for documents and queries.
+
+Every query token must match (AND), the last token also matches as a prefix
+so results update while typing, and private recipes are only returned to
+their owner.
+"""
+import re
+import unicodedata
+from collections import defaultdict
+
+from django.db import models, transaction
+
+# Field weights: a match in the name counts more than one in the description
+NAME_WEIGHT = 3
+ORIGIN_WEIGHT = 2
+DESCRIPTION_WEIGHT = 1
+
+MAX_TERM_LENGTH = 64
+MIN_TERM_LENGTH = 2
+MAX_QUERY_TOKENS = 8
+
+_TOKEN_RE = re.compile(r'\w+')
+
+
+def tokenize(text):
+    """Lowercase, accent-folded word tokens of `text`, in order."""
+    if not text:
+        return []
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(char for char in text if not unicodedata.combining(char)).lower()
+    return [token[:MAX_TERM_LENGTH] for token in _TOKEN_RE.findall(text)]
+
+
+def document_terms(coffee):
+    """Map each indexable term of `coffee` to its weight."""
+    weights = defaultdict(int)
+    for text, weight in (
+        (coffee.name, NAME_WEIGHT),
+        (coffee.origin.name if coffee.origin_id else '', ORIGIN_WEIGHT),
+        (coffee.description, DESCRIPTION_WEIGHT),
+    ):
+        for term in set(tokenize(text)):
+            if len(term) >= MIN_TERM_LENGTH:
+                weights[term] += weight
+    return weights
+
+
+def _search_term_rows(coffee):
+    from .models.search import SearchTerm
+
+    return [
+        SearchTerm(term=term, coffee_id=coffee.pk, weight=weight)
+        for term, weight in document_terms(coffee).items()
+    ]
+
+
+def index_coffee(coffee):
+    """(Re)build the index entries of one recipe."""
+    from .models.search import SearchTerm
+
+    with transaction.atomic():
+        SearchTerm.objects.filter(coffee_id=coffee.pk).delete()
+        SearchTerm.objects.bulk_create(_search_term_rows(coffee))
+
+
+def index_coffees(coffees, batch_size=500):
+    """(Re)build the index entries of many recipes; returns the number of rows written."""
+    from .models.search import SearchTerm
+
+    written = 0
+    batch_ids, batch_rows = [], []
+
+    def flush():
+        with transaction.atomic():
+            SearchTerm.objects.filter(coffee_id__in=batch_ids).delete()
+            SearchTerm.objects.bulk_create(batch_rows, batch_size=batch_size)
+        return len(batch_rows)
+
+    for coffee in coffees:
+        batch_ids.append(coffee.pk)
+        batch_rows.extend(_search_term_rows(coffee))
+        if len(batch_ids) >= batch_size:
+            written += flush()
+            batch_ids, batch_rows = [], []
+    if batch_ids:
+        written += flush()
+    return written
+
+
+def reindex_origin(origin):
+    """Refresh the entries of every recipe from `origin` (after a rename)."""
+    from .models.coffee import Coffee
+
+    coffees = Coffee.objects.filter(origin=origin).select_related('origin').only(
+        'id', 'name', 'description', 'origin__name'
+    )
+    return index_coffees(coffees.iterator(chunk_size=500))
+
+
+def parse_query(query):
+    """Split a query into exact tokens and the trailing prefix token."""
+    tokens = tokenize(query)[:MAX_QUERY_TOKENS]
+    if not tokens:
+        return [], None
+    *exact, prefix = tokens
+    exact = [token for token in dict.fromkeys(exact) if len(token) >= MIN_TERM_LENGTH]
+    return exact, prefix
+
+
+def _visible_coffees(user):
+    from .models.coffee import Coffee
+
+    visible = models.Q(is_private=False)
+    if user is not None and user.is_authenticated:
+        visible |= models.Q(user=user)
+    return Coffee.objects.filter(visible)
+
+
+def _search_index(exact, prefix, user, limit):
+    """[(coffee_id, score)] from the inverted index, best first."""
+    from .models.search import SearchTerm
+
+    # Range scan instead of LIKE so the (term, coffee) index is used on every backend
+    prefix_match = models.Q(term__gte=prefix, term__lt=prefix + '\U0010ffff')
+    token_matches = [models.Q(term=token) for token in exact] + [prefix_match]
+
+    term_filter = models.Q()
+    for match in token_matches:
+        term_filter |= match
+
+    matched = {
+        f'match_{i}': models.Max(models.Case(
+            models.When(match, then=1), default=0, output_field=models.IntegerField()
+        ))
+        for i, match in enumerate(token_matches)
+    }
+    rows = (
+        SearchTerm.objects.filter(term_filter, coffee__in=_visible_coffees(user))
+        .values('coffee_id')
+        .annotate(score=models.Sum('weight'), **matched)
+        .filter(**{name: 1 for name in matched})
+        .order_by('-score', '-coffee_id')
+        .values_list('coffee_id', 'score')
+    )
+    return list(rows[:limit])
+
+
+def search_coffees(query, user=None, limit=20):
+    """
+    Search recipes visible to `user`.
+
+    Returns [(coffee_id, score)] ordered by relevance (highest score first,
+    newest recipe first on ties).
+    """
+    exact, prefix = parse_query(query)
+    if prefix is None:
+        return []
+    return _search_index(exact, prefix, user, limit)
@@ -1,3 +1,4 @@
+from django.db.models import Prefetch
 from rest_framework import serializers
 from .models.user import User
 from .models.coffee import Coffee, Origin, Like, ConsumedCoffee
@@ -9,33 +10,139 @@ from django.contrib.auth.hashers import check_password
 from django.contrib.auth.models import User as AuthUser
 from django.contrib.auth import authenticate
 from .models.user_profile import UserProfile
+from .origins import resolve_origin
 from users.serializers import UserSerializer as CustomUserSerializer
 
+def _split_param(value):
+    return frozenset(name.strip() for name in (value or '').split(',') if name.strip())
+
+
+class FieldProjectionMixin:
+    """
+    Sparse fieldsets: `?fields=a,b` renders only the listed fields.
+
+    While a projection is active, nested objects listed in
+    Meta.expandable_fields are rendered as primary keys unless they are named
+    in `?expand=` (`?expand=*` expands all of them). Fields that another
+    field cannot be rendered without (Meta.projection_requires) are added to
+    a projection that names it. Without `?fields=` the output is unchanged.
+
+    Query parameters only apply to the top-level serializer of a response;
+    a projection can also be passed explicitly with the `fields=` / `expand=`
+    keyword arguments. Views should build their queryset through the
+    serializer's `prepare_queryset()` so that joins, prefetches and
+    annotations behind fields that are not rendered are skipped as well.
+    """
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        self._projection_fields = fields
+        self._projection_expand = expand
+        super().__init__(*args, **kwargs)
+
+    @classmethod
+    def get_projection(cls, request=None, fields=None, expand=None):
+        """Return (fields, expand): fields is None when everything is rendered."""
+        params = getattr(request, 'query_params', None) or {}
+        if fields is None and params.get('fields'):
+            fields = _split_param(params['fields'])
+        if expand is None:
+            expand = _split_param(params.get('expand'))
+        expandable = frozenset(getattr(cls.Meta, 'expandable_fields', ()))
+        expand = expandable if '*' in expand else expandable & frozenset(expand)
+        if fields is not None:
+            fields = frozenset(fields)
+            for name, required in getattr(cls.Meta, 'projection_requires', {}).items():
+                if name in fields:
+                    fields |= frozenset(required)
+        return fields, expand
+
+    @classmethod
+    def get_rendered_fields(cls, fields):
+        """Names from Meta.fields that a projection renders."""
+        if fields is None:
+            return set(cls.Meta.fields)
+        return set(cls.Meta.fields) & fields
+
+    def _is_root(self):
+        parent = self.parent
+        return parent is None or (isinstance(parent, serializers.ListSerializer) and parent.parent is None)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        # Input validation always sees every field
+        if hasattr(self, 'initial_data'):
+            return fields
+
+        request = self.context.get('request') if self._is_root() else None
+        projected, expand = self.get_projection(request, self._projection_fields, self._projection_expand)
+        if projected is None:
+            return fields
+
+        for name in list(fields):
+            if name not in projected:
+                del fields[name]
+        for name in getattr(self.Meta, 'expandable_fields', ()):
+            if name in fields and name not in expand:
+                fields[name] = serializers.PrimaryKeyRelatedField(
+                    read_only=True,
+                    many=isinstance(fields[name], serializers.ListSerializer)
+                )
+        return fields
+
+
 class OriginSerializer(serializers.ModelSerializer):
     class Meta:
         model  = Origin
         fields = ['id', 'name']
 
-class CoffeeSerializer(serializers.ModelSerializer):
+class CoffeeSerializer(FieldProjectionMixin, serializers.ModelSerializer):
     origin = OriginSerializer()
     user = serializers.PrimaryKeyRelatedField(read_only=True)
-    likes_count = serializers.ReadOnlyField()
+    likes_count = serializers.SerializerMethodField()
     is_liked = serializers.SerializerMethodField()
-    caffeine_mg = serializers.SerializerMethodField()
+    caffeine_mg = serializers.FloatField(read_only=True)
 
     class Meta:
         model  = Coffee
         fields = ['id', 'name', 'origin', 'description', 'user', 'likes_count', 'is_liked', 'is_community_winner', 'is_private', 'caffeine_mg']
-
-    def get_caffeine_mg(self, obj):
-        """Get caffeine content using the model's method"""
-        try:
-            return obj.get_caffeine_mg()
-        except (AttributeError, TypeError):
-            # Fallback if method doesn't exist or returns None
-            return getattr(obj, 'caffeine_mg', 95.0) or 95.0
+        # is_liked is overlaid per user on shared payloads, matched by id
+        projection_requires = {'is_liked': ('id',)}
+
+    # Serializer fields backed by a Coffee column, by column name
+    COLUMNS = {
+        'name': 'name',
+        'origin': 'origin__name',
+        'description': 'description',
+        'user': 'user',
+        'is_community_winner': 'is_community_winner',
+        'is_private': 'is_private',
+        'caffeine_mg': 'caffeine_mg',
+        'likes_count': 'like_count',
+    }
+
+    @classmethod
+    def prepare_queryset(cls, queryset, request=None, user=None, fields=None):
+        """
+        Load only what the requested fields render: the origin join, the
+        is_liked annotation (for `user`) and, under a projection, the used columns.
+        """
+        fields, _ = cls.get_projection(request, fields)
+        rendered = cls.get_rendered_fields(fields)
+        if 'origin' in rendered:
+            queryset = queryset.select_related('origin')
+        if 'is_liked' in rendered:
+            queryset = queryset.with_like_stats(user)
+        if fields is not None:
+            queryset = queryset.only('id', *(cls.COLUMNS[name] for name in rendered if name in cls.COLUMNS))
+        return queryset
+
+    def get_likes_count(self, obj):
+        return obj.like_count
 
     def get_is_liked(self, obj):
+        annotated = getattr(obj, 'annotated_is_liked', None)
+        if annotated is not None:
+            return annotated
         request = self.context.get('request')
         if request and hasattr(request, 'user') and request.user.is_authenticated:
             return obj.likes.filter(user=request.user).exists()
@@ -43,15 +150,14 @@ class CoffeeSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         origin_data = validated_data.pop('origin')
-        origin, _ = Origin.objects.get_or_create(**origin_data)
+        origin = resolve_origin(origin_data['name'])
         user = self.context['request'].user
         return Coffee.objects.create(origin=origin, user=user, **validated_data)
 
     def update(self, instance, validated_data):
         origin_data = validated_data.pop('origin', None)
         if origin_data:
-            origin, _ = Origin.objects.get_or_create(**origin_data)
-            instance.origin = origin
+            instance.origin = resolve_origin(origin_data['name'])
         instance.name        = validated_data.get('name', instance.name)
         instance.description = validated_data.get('description', instance.description)
         instance.save()
@@ -140,17 +246,17 @@ class ChallengeRecipeSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         origin_data = validated_data.pop('origin')
-        origin, _ = Origin.objects.get_or_create(**origin_data)
+        origin = resolve_origin(origin_data['name'])
         return ChallengeRecipe.objects.create(origin=origin, **validated_data)
 
-class ChallengeSerializer(serializers.ModelSerializer):
+class ChallengeSerializer(FieldProjectionMixin, serializers.ModelSerializer):
     challenger = CustomUserSerializer(read_only=True)
     challenged = CustomUserSerializer(read_only=True)
     winner = CustomUserSerializer(read_only=True)
     recipes = ChallengeRecipeSerializer(many=True, read_only=True)
-    total_votes = serializers.ReadOnlyField()
-    challenger_votes = serializers.ReadOnlyField()
-    challenged_votes = serializers.ReadOnlyField()
+    total_votes = serializers.SerializerMethodField()
+    challenger_votes = serializers.SerializerMethodField()
+    challenged_votes = serializers.SerializerMethodField()
     can_vote = serializers.SerializerMethodField()
     user_vote = serializers.SerializerMethodField()
 
@@ -162,6 +268,61 @@ class ChallengeSerializer(serializers.ModelSerializer):
             'recipes', 'total_votes', 'challenger_votes', 'challenged_votes',
             'can_vote', 'user_vote'
         ]
+        expandable_fields = ['challenger', 'challenged', 'winner', 'recipes']
+
+    VOTE_FIELDS = {'total_votes', 'challenger_votes', 'challenged_votes', 'can_vote', 'user_vote'}
+
+    @classmethod
+    def prepare_queryset(cls, queryset, request=None, fields=None, expand=None):
+        """Join, prefetch and collapse only what the requested fields render."""
+        fields, expand = cls.get_projection(request, fields, expand)
+        rendered = cls.get_rendered_fields(fields)
+        # Without a projection every nested object is rendered in full
+        expanded = rendered if fields is None else expand
+
+        users = [name for name in ('challenger', 'challenged', 'winner') if name in rendered and name in expanded]
+        if users:
+            queryset = queryset.select_related(*users)
+        if 'recipes' in rendered:
+            if 'recipes' in expanded:
+                recipes = ChallengeRecipe.objects.select_related('user', 'origin')
+            else:
+                recipes = ChallengeRecipe.objects.only('id', 'challenge')
+            queryset = queryset.prefetch_related(Prefetch('recipes', queryset=recipes))
+        if cls.VOTE_FIELDS & rendered:
+            votes = Vote.objects.all()
+            if 'user_vote' in rendered:
+                votes = votes.select_related('voted_for')
+            queryset = queryset.prefetch_related(Prefetch('votes', queryset=votes))
+        return queryset
+
+    def _prefetched_votes(self, obj):
+        """The challenge's votes if they were prefetched, else None."""
+        if 'votes' in getattr(obj, '_prefetched_objects_cache', {}):
+            return obj.votes.all()
+        return None
+
+    def get_total_votes(self, obj):
+        votes = self._prefetched_votes(obj)
+        return obj.total_votes if votes is None else len(votes)
+
+    def get_challenger_votes(self, obj):
+        votes = self._prefetched_votes(obj)
+        if votes is None:
+            return obj.challenger_votes
+        return sum(1 for vote in votes if vote.voted_for_id == obj.challenger_id)
+
+    def get_challenged_votes(self, obj):
+        votes = self._prefetched_votes(obj)
+        if votes is None:
+            return obj.challenged_votes
+        return sum(1 for vote in votes if vote.voted_for_id == obj.challenged_id)
+
+    def _user_vote(self, obj, user):
+        votes = self._prefetched_votes(obj)
+        if votes is None:
+            return obj.votes.filter(voter=user).first()
+        return next((vote for vote in votes if vote.voter_id == user.pk), None)
 
     def get_can_vote(self, obj):
         request = self.context.get('request')
@@ -172,10 +333,10 @@ class ChallengeSerializer(serializers.ModelSerializer):
         # Can't vote if you're a participant or if not in voting phase
         if obj.status != 'voting':
             return False
-        if user == obj.challenger or user == obj.challenged:
+        if user.pk in (obj.challenger_id, obj.challenged_id):
             return False
         # Can't vote if already voted
-        if obj.votes.filter(voter=user).exists():
+        if self._user_vote(obj, user) is not None:
             return False
         return True
 
@@ -184,7 +345,7 @@ class ChallengeSerializer(serializers.ModelSerializer):
         if not request or not request.user.is_authenticated:
             return None
         
-        vote = obj.votes.filter(voter=request.user).first()
+        vote = self._user_vote(obj, request.user)
         return vote.voted_for.username if vote else None
 
 class VoteSerializer(serializers.ModelSerializer):
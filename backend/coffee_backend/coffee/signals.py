@@ -32,25 +32,64 @@
 # coffee/signals.py
 
 import sys
+import threading
+from contextlib import contextmanager
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 
-from .models.coffee import Coffee
+from .cache import bump_catalogue_version
+from .models.change_counters import UserChangeCounter
+from .models.coffee import Coffee, Origin, Like, ConsumedCoffee
 from .models.user_profile import UserProfile
+from .leaderboard import record_like
+from .origins import bump_origin_generation
+from .rollups import refresh_days, refresh_for_coffees
+from .search import index_coffee, reindex_origin
+
+# Coffee fields that feed the search index
+SEARCH_INDEXED_FIELDS = {'name', 'description', 'origin', 'origin_id'}
 
 User = get_user_model()
 
+_bulk_writes = threading.local()
+
+
+@contextmanager
+def bulk_coffee_writes():
+    """
+    Mute the per-row Coffee receivers in this thread. The caller does their
+    work (profile log, catalogue version, search index) once for the whole
+    batch; see coffee/bulk.py.
+    """
+    previous = getattr(_bulk_writes, 'active', False)
+    _bulk_writes.active = True
+    try:
+        yield
+    finally:
+        _bulk_writes.active = previous
+
+
+def _coffee_receivers_muted():
+    return getattr(_bulk_writes, 'active', False)
+
+
 def _log_profile_op(user, op):
     # Debug
     print(f"[signals] → _log_profile_op: user={user.pk}, op={op}", file=sys.stderr)
+    log_profile_ops(user, [op])
+
 
+def log_profile_ops(user, ops):
+    """Append `ops` to the user's profile operation log in one write."""
     profile, created = UserProfile.objects.get_or_create(user=user)
     if created:
         print(f"[signals] ‼️ Created new profile for user {user.pk}", file=sys.stderr)
 
     before = profile.users_operations
-    after = f"{before},{op}" if before else op
+    added = ','.join(ops)
+    after = f"{before},{added}" if before else added
     profile.users_operations = after
     profile.save(update_fields=['users_operations'])
 
@@ -59,12 +98,79 @@ def _log_profile_op(user, op):
 
 @receiver(post_save, sender=Coffee)
 def on_coffee_saved(sender, instance, created, **kwargs):
+    if _coffee_receivers_muted():
+        return
     op = 'add' if created else 'edit'
     print(f"[signals] post_save: Coffee id={instance.pk}, user={instance.user.pk}, op={op}", file=sys.stderr)
     _log_profile_op(instance.user, op)
+    bump_catalogue_version()
+    update_fields = kwargs.get('update_fields')
+    if created or update_fields is None or SEARCH_INDEXED_FIELDS & set(update_fields):
+        index_coffee(instance)
+    if getattr(instance, 'caffeine_changed', False):
+        refresh_for_coffees([instance.pk])
 
 
 @receiver(post_delete, sender=Coffee)
 def on_coffee_deleted(sender, instance, **kwargs):
+    if _coffee_receivers_muted():
+        return
     print(f"[signals] post_delete: Coffee id={instance.pk}, user={instance.user.pk}", file=sys.stderr)
     _log_profile_op(instance.user, 'delete')
+    bump_catalogue_version()
+
+
+@receiver(post_save, sender=Origin)
+@receiver(post_delete, sender=Origin)
+def on_origin_changed(sender, instance, **kwargs):
+    bump_catalogue_version()
+    bump_origin_generation()
+
+
+@receiver(post_save, sender=Origin)
+def on_origin_saved(sender, instance, created, **kwargs):
+    # Origin names are indexed with their recipes; a new origin has none yet
+    # (index entries of deleted recipes go away with the ON DELETE CASCADE)
+    if not created:
+        reindex_origin(instance)
+
+
+@receiver(post_save, sender=Like)
+def on_like_saved(sender, instance, created, **kwargs):
+    if created:
+        Coffee.objects.filter(pk=instance.coffee_id).adjust_like_count(1)
+        record_like(instance.coffee_id, instance.created_at, 1)
+
+
+@receiver(post_delete, sender=Like)
+def on_like_deleted(sender, instance, **kwargs):
+    Coffee.objects.filter(pk=instance.coffee_id).adjust_like_count(-1)
+    record_like(instance.coffee_id, instance.created_at, -1)
+
+
+@receiver(post_save, sender=Like)
+@receiver(post_delete, sender=Like)
+def on_like_changed(sender, instance, **kwargs):
+    # likes_count is part of the shared payload, is_liked of the user's overlay
+    # (both are keyed by the catalogue version)
+    bump_catalogue_version()
+    _bump_user_counter(instance, UserChangeCounter.LIKES, kwargs.get('origin'))
+
+
+@receiver(post_save, sender=ConsumedCoffee)
+@receiver(post_delete, sender=ConsumedCoffee)
+def on_consumed_coffee_changed(sender, instance, **kwargs):
+    origin = kwargs.get('origin')
+    if isinstance(origin, User) and origin.pk == instance.user_id:
+        return  # The user's counters and rollups go away with the user
+    # Bump first: the counter row lock serializes concurrent writes of the
+    # same user, so the recomputed rollup sees every committed entry
+    _bump_user_counter(instance, UserChangeCounter.CONSUMPTION, origin)
+    refresh_days(instance.user_id, [timezone.localdate(instance.consumed_at)])
+
+
+def _bump_user_counter(instance, counter, origin=None):
+    # Rows cascading from a user deletion must not re-create the user's counters
+    if isinstance(origin, User) and origin.pk == instance.user_id:
+        return
+    UserChangeCounter.bump(instance.user_id, counter)
@@ -0,0 +1,127 @@
+import threading
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from coffee.batching import PredictionBatcher, get_prediction_batcher, reset_prediction_batcher
+
+
+class RecordingModel:
+    """Stands in for predict_proba_batch: the row sum, and a record of each call's size."""
+
+    def __init__(self, fail=False):
+        self.calls = []
+        self.fail = fail
+
+    def __call__(self, features):
+        self.calls.append(len(features))
+        if self.fail:
+            raise RuntimeError('model unavailable')
+        return features.sum(axis=1)
+
+
+def predict_concurrently(batcher, rows):
+    results, errors = [None] * len(rows), [None] * len(rows)
+    start = threading.Barrier(len(rows))
+
+    def worker(index):
+        with batcher.expecting():
+            start.wait()
+            try:
+                results[index] = batcher.predict(rows[index])
+            except Exception as e:
+                errors[index] = e
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(len(rows))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+
+class TestPredictionBatcher(SimpleTestCase):
+
+    def test_concurrent_rows_share_one_model_call(self):
+        model = RecordingModel()
+        batcher = PredictionBatcher(model, window=0.5, max_batch_size=8)
+        rows = [np.full((1, 3), float(index)) for index in range(8)]
+
+        results, errors = predict_concurrently(batcher, rows)
+        self.assertEqual(model.calls, [8])
+        self.assertEqual(errors, [None] * 8)
+        for index, result in enumerate(results):
+            np.testing.assert_array_equal(result, [3.0 * index])
+
+        metrics = batcher.metrics()
+        self.assertEqual((metrics['batches'], metrics['requests'], metrics['max_batch_size']), (1, 8, 8))
+        self.assertEqual(metrics['avg_batch_size'], 8)
+        # A full batch does not wait for the window to close
+        self.assertLess(metrics['max_wait_ms'], 500)
+
+    def test_errors_reach_every_caller(self):
+        batcher = PredictionBatcher(RecordingModel(fail=True), window=0.05)
+        results, errors = predict_concurrently(batcher, [np.ones((1, 2))] * 3)
+        self.assertEqual(results, [None] * 3)
+        self.assertTrue(all(isinstance(error, RuntimeError) for error in errors))
+        self.assertEqual(batcher.metrics()['errors'], batcher.metrics()['batches'])
+
+    def test_zero_window_scores_directly(self):
+        model = RecordingModel()
+        batcher = PredictionBatcher(model, window=0)
+        np.testing.assert_array_equal(batcher.predict(np.ones((2, 2))), [2.0, 2.0])
+        self.assertEqual(model.calls, [2])
+
+    def test_lone_request_does_not_wait(self):
+        model = RecordingModel()
+        batcher = PredictionBatcher(model, window=5)
+        with batcher.expecting():
+            np.testing.assert_array_equal(batcher.predict(np.ones((1, 2))), [2.0])
+        self.assertEqual(model.calls, [1])
+        self.assertLess(batcher.metrics()['max_wait_ms'], 1000)
+
+    def test_leader_stops_waiting_for_requests_that_do_not_predict(self):
+        model = RecordingModel()
+        batcher = PredictionBatcher(model, window=5)
+        announced, release = threading.Event(), threading.Event()
+
+        def cache_hit():
+            with batcher.expecting():
+                announced.set()
+                release.wait()
+
+        thread = threading.Thread(target=cache_hit)
+        thread.start()
+        announced.wait()
+        threading.Timer(0.05, release.set).start()
+        batcher.predict(np.ones((1, 2)))
+        thread.join()
+        self.assertEqual(model.calls, [1])
+        self.assertLess(batcher.metrics()['max_wait_ms'], 1000)
+
+
+class TestPredictionMetricsView(TestCase):
+
+    def setUp(self):
+        reset_prediction_batcher()
+        self.addCleanup(reset_prediction_batcher)
+        self.client = APIClient()
+
+    def test_admin_only_and_reset(self):
+        user = get_user_model().objects.create_user(username='user', email='user@example.com', password='secret')
+        self.client.force_authenticate(user)
+        self.assertEqual(self.client.get(reverse('prediction-metrics')).status_code, 403)
+
+        admin = get_user_model().objects.create_superuser(username='admin', email='admin@example.com', password='secret')
+        self.client.force_authenticate(admin)
+        batcher = get_prediction_batcher()
+        batcher.predict_batch = RecordingModel()
+        batcher.predict(np.ones((1, 2)))
+
+        response = self.client.get(reverse('prediction-metrics'), {'reset': 'true'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['batching']['batches'], 1)
+        self.assertEqual(batcher.metrics()['batches'], 0)
@@ -0,0 +1,114 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from coffee.cache import get_catalogue_version
+from coffee.models.coffee import Coffee, Origin
+from coffee.models.coffee_operations import CoffeeOperation
+from coffee.models.user_profile import UserProfile
+from coffee.origins import origin_registry
+from coffee.search import search_coffees
+
+
+class TestBulkCoffees(TestCase):
+
+    def setUp(self):
+        caches['catalogue'].clear()
+        origin_registry.clear()
+        User = get_user_model()
+        self.user = User.objects.create_user(username='barista', email='barista@example.com', password='secret')
+        self.other = User.objects.create_user(username='other', email='other@example.com', password='secret')
+        self.italy = Origin.objects.create(name="Italy")
+        self.espresso = Coffee.objects.create(name="Espresso", origin=self.italy, description="", user=self.user)
+        self.mocha = Coffee.objects.create(name="Mocha", origin=self.italy, description="", user=self.user)
+        self.foreign = Coffee.objects.create(name="Ristretto", origin=self.italy, description="", user=self.other)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('bulk-coffees')
+
+    def test_mixed_batch_is_applied(self):
+        operations = [
+            {'op': 'create', 'data': {'name': "Cold Brew", 'origin': {'name': "Brazil"}, 'description': "smooth"}},
+            {'op': 'create', 'data': {'name': "Latte", 'origin': {'name': "italy"}, 'description': "milky"}},
+            {'op': 'update', 'id': self.espresso.id, 'data': {'name': "French Press"}},
+            {'op': 'delete', 'id': self.mocha.id},
+        ]
+        version = get_catalogue_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url, {'operations': operations}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        results = response.json()['results']
+        self.assertEqual([r['status'] for r in results], ['created', 'created', 'updated', 'deleted'])
+        cold_brew = Coffee.objects.get(pk=results[0]['id'])
+        self.assertEqual(cold_brew.origin.name, "Brazil")
+        self.assertEqual(cold_brew.caffeine_mg, 247.0)
+        self.assertEqual(Coffee.objects.get(pk=results[1]['id']).origin_id, self.italy.id)
+        self.assertEqual(results[2]['coffee']['name'], "French Press")
+        self.espresso.refresh_from_db()
+        self.assertEqual(self.espresso.caffeine_mg, 223.0)
+        self.assertFalse(Coffee.objects.filter(pk=self.mocha.id).exists())
+
+        self.assertEqual(
+            sorted(CoffeeOperation.objects.filter(user=self.user).values_list('operation_type', flat=True)),
+            ['add', 'add', 'delete', 'edit']
+        )
+        self.assertTrue(UserProfile.objects.get(user=self.user).users_operations.endswith('add,add,edit,delete'))
+        self.assertEqual([pk for pk, _ in search_coffees("press", self.user)], [self.espresso.id])
+        self.assertGreater(get_catalogue_version(), version)
+
+    def test_invalid_batch_applies_nothing(self):
+        operations = [
+            {'op': 'create', 'data': {'name': "Cortado", 'origin': {'name': "Spain"}, 'description': "short"}},
+            {'op': 'delete', 'id': self.foreign.id},
+            {'op': 'update', 'id': 999999, 'data': {'name': "Ghost"}},
+            {'op': 'create', 'data': {'description': "no name"}},
+            {'op': 'brew'},
+        ]
+        response = self.client.post(self.url, operations, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        results = response.json()['results']
+        self.assertEqual([r['status'] for r in results], ['ok', 'error', 'error', 'error', 'error'])
+        self.assertIn('name', results[3]['errors'])
+        self.assertFalse(Coffee.objects.filter(name="Cortado").exists())
+        self.assertTrue(Coffee.objects.filter(pk=self.foreign.id).exists())
+        self.assertFalse(CoffeeOperation.objects.exists())
+
+    def test_a_coffee_can_only_appear_once(self):
+        operations = [
+            {'op': 'update', 'id': self.espresso.id, 'data': {'name': "Doppio"}},
+            {'op': 'delete', 'id': self.espresso.id},
+        ]
+        response = self.client.post(self.url, operations, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Coffee.objects.get(pk=self.espresso.id).name, "Espresso")
+
+    def test_batch_size_is_limited(self):
+        response = self.client.post(self.url, [{'op': 'delete', 'id': self.mocha.id}] * 501, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(self.url, [], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_query_count_does_not_grow_with_the_batch(self):
+        def create(n):
+            return [
+                {'op': 'create', 'data': {'name': f"Brew {i}", 'origin': {'name': "Italy"}, 'description': "batch"}}
+                for i in range(n)
+            ]
+
+        response = self.client.post(self.url, create(1), format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        with self.assertNumQueries(self._count_queries(create(2))):
+            self.client.post(self.url, create(20), format='json')
+
+    def _count_queries(self, operations):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.post(self.url, operations, format='json')
+        return len(ctx.captured_queries)
@@ -0,0 +1,70 @@
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+
+from coffee.caffeine import CAFFEINE_RULES_VERSION, estimate_caffeine_mg
+from coffee.models.coffee import Coffee, Origin
+
+
+class TestCaffeineEstimator(SimpleTestCase):
+
+    def test_rule_order_is_respected(self):
+        self.assertEqual(estimate_caffeine_mg("Cold Brew", "steeped 24 hours"), 280.0)
+        self.assertEqual(estimate_caffeine_mg("Cold Brew", "smooth"), 247.0)
+        self.assertEqual(estimate_caffeine_mg("Cold Brew", "8 hour steep over ice"), 238.0)
+        self.assertEqual(estimate_caffeine_mg("Iced Cold Brew", ""), 182.0)
+        self.assertEqual(estimate_caffeine_mg("Decaf Espresso", ""), 68.0)
+        self.assertEqual(estimate_caffeine_mg("Decaf", "gentle"), 2.0)
+
+    def test_keyword_groups(self):
+        self.assertEqual(estimate_caffeine_mg("Espresso", "a doppio shot"), 136.0)
+        self.assertEqual(estimate_caffeine_mg("Latte", "made with 2 shots"), 136.0)
+        self.assertEqual(estimate_caffeine_mg("Drip", "from a coffee maker"), 170.0)
+        self.assertEqual(estimate_caffeine_mg("V60", ""), 185.0)
+
+    def test_keywords_match_as_substrings(self):
+        # 'ice' inside 'nice' counts, as with a plain `in` check
+        self.assertEqual(estimate_caffeine_mg("Cold brew", "nice and smooth"), 182.0)
+        # '24' inside '24 hour' counts
+        self.assertEqual(estimate_caffeine_mg("Cold brew", "24 hour steep with ice"), 280.0)
+
+    def test_default(self):
+        self.assertEqual(estimate_caffeine_mg("House blend", ""), 116.0)
+
+
+class TestCoffeeCaffeine(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='barista', email='barista@example.com', password='secret'
+        )
+        self.origin = Origin.objects.create(name="Italy")
+
+    def test_estimate_is_stored_on_create(self):
+        coffee = Coffee.objects.create(name="Espresso", origin=self.origin, description="", user=self.user)
+        coffee.refresh_from_db()
+        self.assertEqual(coffee.caffeine_mg, 68.0)
+        self.assertEqual(coffee.caffeine_estimate_version, CAFFEINE_RULES_VERSION)
+
+    def test_reads_never_write(self):
+        coffee = Coffee.objects.create(name="Espresso", origin=self.origin, description="", user=self.user)
+        coffee = Coffee.objects.get(pk=coffee.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(coffee.get_caffeine_mg(), 68.0)
+
+    def test_estimate_follows_name_changes(self):
+        coffee = Coffee.objects.create(name="Espresso", origin=self.origin, description="", user=self.user)
+        coffee = Coffee.objects.get(pk=coffee.pk)
+        coffee.name = "French Press"
+        coffee.save()
+        coffee.refresh_from_db()
+        self.assertEqual(coffee.caffeine_mg, 223.0)
+
+    def test_manual_caffeine_is_kept(self):
+        coffee = Coffee.objects.create(
+            name="Espresso", origin=self.origin, description="", user=self.user,
+            caffeine_mg=150.0, caffeine_estimate_version=None
+        )
+        coffee.name = "Double Espresso"
+        coffee.save()
+        coffee.refresh_from_db()
+        self.assertEqual(coffee.caffeine_mg, 150.0)
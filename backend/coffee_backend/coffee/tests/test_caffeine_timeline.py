@@ -0,0 +1,100 @@
+import math
+from datetime import datetime, time, timedelta
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from coffee.cache import CATALOGUE_CACHE_ALIAS
+from coffee.caffeine_timeline import caffeine_amounts, caffeine_timeline
+from coffee.models.coffee import Coffee, ConsumedCoffee, Origin
+from coffee.models.health import UserHealthProfile
+
+
+class TestCaffeineAmounts(SimpleTestCase):
+
+    def test_matches_per_timestep_sum(self):
+        rng = np.random.default_rng(3)
+        dose_seconds = rng.uniform(-20000, 80000, size=40)
+        dose_mg = rng.uniform(30, 250, size=40)
+        grid = np.arange(0, 86400, 300.0)
+        ke, ka = math.log(2) / (5 * 3600), math.log(2) / (15 * 60)
+
+        expected = [
+            sum(mg * ka / (ka - ke) * (math.exp(-ke * (t - at)) - math.exp(-ka * (t - at)))
+                for at, mg in zip(dose_seconds, dose_mg) if t >= at)
+            for t in grid
+        ]
+        np.testing.assert_allclose(caffeine_amounts(grid, dose_seconds, dose_mg, 5, 15), expected, rtol=1e-12)
+
+    def test_single_dose_shape(self):
+        hours = np.arange(0, 48, 0.25) * 3600
+        amounts = caffeine_amounts(hours, [3600.0], [100.0], 5, 15)
+        self.assertTrue((amounts[hours <= 3600] == 0).all())
+        peak = hours[np.argmax(amounts)] / 3600 - 1
+        self.assertTrue(0.5 < peak < 1.5)
+        # Once absorbed, the amount halves every half-life
+        self.assertAlmostEqual(amounts[hours == 31 * 3600][0] / amounts[hours == 26 * 3600][0], 0.5, places=6)
+        # Equal absorption and elimination rates use the limit of the formula
+        self.assertAlmostEqual(caffeine_amounts([7200.0], [0.0], [100.0], 1, 60)[0], 100 * math.log(2) * 2 / 2 ** 2)
+
+
+class TestCaffeineTimeline(TestCase):
+
+    def setUp(self):
+        caches[CATALOGUE_CACHE_ALIAS].clear()
+        User = get_user_model()
+        self.user = User.objects.create_user(username='sipper', email='sipper@example.com', password='secret')
+        UserHealthProfile.objects.create(user=self.user, weight_kg=80)
+        origin = Origin.objects.create(name="Kenya")
+        self.coffee = Coffee.objects.create(name="Filter", origin=origin, description="", user=self.user)
+        self.original_caffeine_mg = self.coffee.caffeine_mg
+        self.now = timezone.make_aware(datetime.combine(timezone.localdate(), time(12, 0)))
+        for hour in (8, 10):
+            ConsumedCoffee.objects.create(user=self.user, coffee=self.coffee, consumed_at=self.now.replace(hour=hour))
+
+    def test_timeline_is_cached_until_the_next_consumption(self):
+        timeline = caffeine_timeline(self.user, days=2, now=self.now)
+        self.assertEqual(len(timeline['mg_per_l']), 288 + 12 * 12 + 1)
+        self.assertEqual(timeline['volume_l'], 48.0)
+        self.assertEqual(timeline['mg_per_l'][:288 + 8 * 12 + 1], [0.0] * (288 + 8 * 12 + 1))
+        peak = timeline['peak']
+        self.assertTrue(self.now.replace(hour=10) < peak['at'] <= self.now)
+        self.assertEqual(max(timeline['mg_per_l']), peak['mg_per_l'])
+        self.assertLess(peak['mg'], 2 * self.coffee.caffeine_mg)
+        self.assertEqual(timeline['current']['at'], self.now)
+
+        # The change counter and the body weight; the doses come from the cache
+        with self.assertNumQueries(2):
+            self.assertEqual(caffeine_timeline(self.user, days=2, now=self.now), timeline)
+
+        ConsumedCoffee.objects.create(user=self.user, coffee=self.coffee, consumed_at=self.now - timedelta(minutes=30))
+        self.assertGreater(caffeine_timeline(self.user, days=2, now=self.now)['current']['mg'], timeline['current']['mg'])
+
+    def test_recipe_caffeine_change_invalidates_the_timeline(self):
+        before = caffeine_timeline(self.user, now=self.now)['current']['mg']
+        self.coffee.name = "Double espresso"
+        self.coffee.save()
+        self.assertNotEqual(self.coffee.caffeine_mg, self.original_caffeine_mg)
+        after = caffeine_timeline(self.user, now=self.now)['current']['mg']
+        self.assertAlmostEqual(after / before, self.coffee.caffeine_mg / self.original_caffeine_mg, places=3)
+
+    def test_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = reverse('caffeine-timeline')
+        ConsumedCoffee.objects.create(user=self.user, coffee=self.coffee, consumed_at=timezone.now() - timedelta(hours=1))
+
+        body = client.get(url, {'days': 3, 'half_life_hours': 4}).json()
+        self.assertEqual(body['step_minutes'], 5)
+        self.assertEqual(body['half_life_hours'], 4.0)
+        self.assertGreater(body['peak']['mg'], 0)
+
+        self.assertEqual(client.get(url, {'days': 0}).status_code, 400)
+        self.assertEqual(client.get(url, {'days': 'many'}).status_code, 400)
+        self.assertEqual(client.get(url, {'half_life_hours': 48}).status_code, 400)
+        self.assertEqual(APIClient().get(url).status_code, 401)
@@ -0,0 +1,124 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from coffee.catalogue_io import IdMap
+from coffee.models.coffee import Coffee, ConsumedCoffee, Like, Origin
+from coffee.origins import origin_registry
+from coffee.search import search_coffees
+
+
+class TestCatalogueDump(TestCase):
+
+    def setUp(self):
+        caches['catalogue'].clear()
+        origin_registry.clear()
+        User = get_user_model()
+        self.user = User.objects.create_user(username='barista', email='barista@example.com', password='secret')
+        self.ghost = User.objects.create_user(username='ghost', email='ghost@example.com', password='secret')
+        italy = Origin.objects.create(name="Italy")
+        self.espresso = Coffee.objects.create(name="Espresso", origin=italy, description="Strong", user=self.user)
+        self.mocha = Coffee.objects.create(name="Mocha", origin=italy, description="Sweet", user=self.ghost)
+        self.liked_at = timezone.now() - timedelta(days=3)
+        Like.objects.create(user=self.user, coffee=self.espresso)
+        Like.objects.filter(user=self.user).update(created_at=self.liked_at)
+        Like.objects.create(user=self.ghost, coffee=self.espresso)
+        ConsumedCoffee.objects.create(user=self.user, coffee=self.espresso, consumed_at=self.liked_at)
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'catalogue.ndjson.gz')
+
+    def test_round_trip(self):
+        call_command('export_catalogue', output=self.path, stderr=io.StringIO())
+        Coffee.objects.all().delete()
+        self.ghost.delete()
+
+        out = io.StringIO()
+        call_command('import_catalogue', input=self.path, batch_size=1, stdout=out)
+        self.assertIn('coffee: skipped 1 rows', out.getvalue())
+
+        # Only the recipe of the user that still exists comes back, under a new id
+        espresso = Coffee.objects.get()
+        self.assertEqual((espresso.name, espresso.origin.name, espresso.user), ("Espresso", "Italy", self.user))
+        self.assertNotEqual(espresso.pk, self.espresso.pk)
+        self.assertEqual(espresso.like_count, 1)
+
+        like = Like.objects.get()
+        self.assertEqual((like.user, like.coffee), (self.user, espresso))
+        self.assertEqual(like.created_at, self.liked_at)
+        self.assertEqual(ConsumedCoffee.objects.get().consumed_at, self.liked_at)
+        self.assertEqual([pk for pk, _ in search_coffees("espresso")], [espresso.pk])
+
+    def test_export_is_ndjson(self):
+        plain = self.path[:-len('.gz')]
+        call_command('export_catalogue', output=plain, stderr=io.StringIO())
+        with open(plain) as f:
+            records = [json.loads(line) for line in f]
+
+        self.assertEqual(records[0], {'format': 'coffee-catalogue', 'version': 1})
+        self.assertEqual(
+            [record['model'] for record in records[1:]],
+            ['origin', 'coffee', 'coffee', 'like', 'like', 'consumed']
+        )
+
+    def test_blank_origin_name_is_reported(self):
+        plain = self.path[:-len('.gz')]
+        with open(plain, 'w') as f:
+            f.write('{"format": "coffee-catalogue", "version": 1}\n')
+            f.write('{"model": "origin", "id": 1, "name": "Kenya"}\n')
+            f.write('{"model": "origin", "id": 2, "name": "   "}\n')
+        with self.assertRaisesMessage(CommandError, "Line 3: Origin 2 has no name"):
+            call_command('import_catalogue', input=plain, stdout=io.StringIO())
+
+    def _write_dump(self, *records):
+        plain = self.path[:-len('.gz')]
+        with open(plain, 'w') as f:
+            f.write('{"format": "coffee-catalogue", "version": 1}\n')
+            for record in records:
+                f.write(json.dumps(record) + '\n')
+        return plain
+
+    def test_missing_keys_are_reported(self):
+        plain = self._write_dump(
+            {'model': 'origin', 'id': 1, 'name': "Kenya"},
+            {'model': 'like', 'user': 'barista', 'created_at': self.liked_at.isoformat()},
+        )
+        with self.assertRaisesMessage(CommandError, "Line 3: Like record is missing coffee"):
+            call_command('import_catalogue', input=plain, stdout=io.StringIO())
+
+        plain = self._write_dump({'model': 'consumed', 'user': 'barista', 'coffee': 1, 'consumed_at': 'noon'})
+        with self.assertRaisesMessage(CommandError, "Line 2: Invalid consumed_at: 'noon'"):
+            call_command('import_catalogue', input=plain, stdout=io.StringIO())
+
+    def test_rows_committed_before_an_error_are_counted(self):
+        coffee = {
+            'model': 'coffee', 'id': 7, 'origin': 1, 'user': 'barista', 'name': "Filter", 'description': "",
+            'is_community_winner': False, 'is_private': False, 'caffeine_mg': 90.0, 'caffeine_estimate_version': 1,
+        }
+        plain = self._write_dump(
+            {'model': 'origin', 'id': 1, 'name': "Kenya"},
+            coffee,
+            {'model': 'like', 'user': 'ghost', 'coffee': 7, 'created_at': self.liked_at.isoformat()},
+            {'model': 'like', 'user': 'barista', 'coffee': 7},
+        )
+        with self.assertRaises(CommandError):
+            call_command('import_catalogue', input=plain, batch_size=1, stdout=io.StringIO())
+        imported = Coffee.objects.get(name="Filter")
+        self.assertEqual(imported.like_count, 1)
+        self.assertEqual(Like.objects.get(coffee=imported).created_at, self.liked_at)
+
+    def test_id_map(self):
+        ids = IdMap()
+        for old, new in ((5, 50), (2, 20), (9, 90)):
+            ids.add(old, new)
+        self.assertEqual([ids.get(2), ids.get(5), ids.get(9), ids.get(7)], [20, 50, 90, None])
@@ -0,0 +1,124 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from coffee.models.change_counters import VersionCounter
+from coffee.models.coffee import Coffee, Origin, Like
+
+
+class TestCoffeeList(TestCase):
+
+    def setUp(self):
+        caches['catalogue'].clear()
+        self.user = get_user_model().objects.create_user(
+            username='barista', email='barista@example.com', password='secret'
+        )
+        self.italy = Origin.objects.create(name="Italy")
+        self.brazil = Origin.objects.create(name="Brazil")
+        self.espresso = Coffee.objects.create(
+            name="Espresso", origin=self.italy, description="Strong", user=self.user
+        )
+        self.cold_brew = Coffee.objects.create(
+            name="Cold Brew", origin=self.brazil, description="Smooth", user=self.user,
+            is_community_winner=True
+        )
+        self.latte = Coffee.objects.create(
+            name="Latte", origin=self.italy, description="Milky", user=self.user
+        )
+        self.secret = Coffee.objects.create(
+            name="Secret", origin=self.italy, description="Hidden", user=self.user,
+            is_private=True
+        )
+
+    def _ids(self, response):
+        return [item['id'] for item in response.json()['results']]
+
+    def test_list_is_cursor_paginated_newest_first(self):
+        response = self.client.get(reverse('coffee-list'), {'page_size': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self._ids(response), [self.latte.id, self.cold_brew.id])
+        self.assertIsNone(response.json()['previous'])
+
+        response = self.client.get(response.json()['next'])
+        self.assertEqual(self._ids(response), [self.espresso.id])
+        self.assertIsNone(response.json()['next'])
+
+    def test_private_recipes_are_excluded(self):
+        response = self.client.get(reverse('coffee-list'))
+        self.assertNotIn(self.secret.id, self._ids(response))
+
+    def test_filters(self):
+        url = reverse('coffee-list')
+        self.assertEqual(
+            self._ids(self.client.get(url, {'origin': 'italy'})),
+            [self.latte.id, self.espresso.id]
+        )
+        self.assertEqual(
+            self._ids(self.client.get(url, {'origin': self.brazil.id})),
+            [self.cold_brew.id]
+        )
+        self.assertEqual(self._ids(self.client.get(url, {'name': 'esp'})), [self.espresso.id])
+        self.assertEqual(
+            self._ids(self.client.get(url, {'is_community_winner': 'true'})),
+            [self.cold_brew.id]
+        )
+
+    def test_caffeine_range_filter(self):
+        Coffee.objects.filter(pk=self.espresso.pk).update(caffeine_mg=68.0)
+        Coffee.objects.filter(pk=self.cold_brew.pk).update(caffeine_mg=247.0)
+        Coffee.objects.filter(pk=self.latte.pk).update(caffeine_mg=136.0)
+
+        response = self.client.get(
+            reverse('coffee-list'), {'caffeine_min': 100, 'caffeine_max': 200}
+        )
+        self.assertEqual(self._ids(response), [self.latte.id])
+
+    def test_invalid_filter_value(self):
+        response = self.client.get(reverse('coffee-list'), {'caffeine_min': 'lots'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_like_stats_are_annotated(self):
+        Like.objects.create(user=self.user, coffee=self.espresso)
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        # The shared catalogue version, the page and the user's liked ids
+        with self.assertNumQueries(3):
+            response = client.get(reverse('coffee-list'))
+        by_id = {item['id']: item for item in response.json()['results']}
+        self.assertEqual(by_id[self.espresso.id]['likes_count'], 1)
+        self.assertTrue(by_id[self.espresso.id]['is_liked'])
+        self.assertEqual(by_id[self.latte.id]['likes_count'], 0)
+        self.assertFalse(by_id[self.latte.id]['is_liked'])
+
+    def test_list_is_served_from_cache_until_a_like(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        client.get(reverse('coffee-list'))
+
+        # Only the shared catalogue version is read
+        with self.assertNumQueries(1):
+            client.get(reverse('coffee-list'))
+
+        Like.objects.create(user=self.user, coffee=self.latte)
+        response = client.get(reverse('coffee-list'))
+        by_id = {item['id']: item for item in response.json()['results']}
+        self.assertEqual(by_id[self.latte.id]['likes_count'], 1)
+        self.assertTrue(by_id[self.latte.id]['is_liked'])
+
+        # Anonymous viewers share the payload but never see is_liked
+        response = self.client.get(reverse('coffee-list'))
+        by_id = {item['id']: item for item in response.json()['results']}
+        self.assertFalse(by_id[self.latte.id]['is_liked'])
+
+    def test_write_in_another_worker_invalidates_the_local_cache(self):
+        self.client.get(reverse('coffee-list'))
+        # Another process saves a coffee: it can only touch the database
+        Coffee.objects.filter(pk=self.latte.pk).update(name="Flat White")
+        VersionCounter.bump(VersionCounter.CATALOGUE)
+
+        names = {item['name'] for item in self.client.get(reverse('coffee-list')).json()['results']}
+        self.assertIn("Flat White", names)
@@ -0,0 +1,91 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from coffee.models.change_counters import VersionCounter
+from coffee.models.coffee import Coffee, Origin, Like, ConsumedCoffee
+
+
+class TestConditionalGet(TestCase):
+
+    def setUp(self):
+        caches['catalogue'].clear()
+        self.user = get_user_model().objects.create_user(
+            username='barista', email='barista@example.com', password='secret'
+        )
+        self.origin = Origin.objects.create(name="Italy")
+        self.espresso = Coffee.objects.create(
+            name="Espresso", origin=self.origin, description="Strong", user=self.user
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _revalidate(self, url, response):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_unchanged_list_is_not_modified(self):
+        url = reverse('coffee-list')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('Last-Modified', response)
+
+        # Only the shared catalogue version is read
+        with self.assertNumQueries(1):
+            response = self._revalidate(url, response)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_etag_varies_with_query_string(self):
+        first = self.client.get(reverse('coffee-list'))
+        second = self.client.get(reverse('coffee-list'), {'page_size': 1})
+        self.assertNotEqual(first['ETag'], second['ETag'])
+
+    def test_coffee_edit_changes_etag(self):
+        url = reverse('coffee-list')
+        response = self.client.get(url)
+        self.espresso.description = "Very strong"
+        self.espresso.save()
+        self.assertEqual(self._revalidate(url, response).status_code, status.HTTP_200_OK)
+
+    def test_like_changes_favorites_etag(self):
+        url = reverse('get-favorites')
+        response = self.client.get(url)
+        self.assertEqual(self._revalidate(url, response).status_code, status.HTTP_304_NOT_MODIFIED)
+
+        Like.objects.create(user=self.user, coffee=self.espresso)
+        response = self._revalidate(url, response)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in response.json()['results']], [self.espresso.id])
+
+    def test_consumption_changes_consumed_etag(self):
+        url = reverse('get-consumed-coffees')
+        response = self.client.get(url)
+        self.assertEqual(self._revalidate(url, response).status_code, status.HTTP_304_NOT_MODIFIED)
+
+        ConsumedCoffee.objects.create(user=self.user, coffee=self.espresso)
+        self.assertEqual(self._revalidate(url, response).status_code, status.HTTP_200_OK)
+
+    def test_etag_is_per_user(self):
+        url = reverse('get-my-recipes')
+        response = self.client.get(url)
+        other = get_user_model().objects.create_user(
+            username='other', email='other@example.com', password='secret'
+        )
+        client = APIClient()
+        client.force_authenticate(other)
+        response = client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['results'], [])
+
+    def test_write_in_another_worker_changes_etag(self):
+        url = reverse('get-my-recipes')
+        response = self.client.get(url)
+        # A recipe created by another worker process only reaches this one through the database
+        Coffee.objects.bulk_create([Coffee(name="Lungo", origin=self.origin, description="", user=self.user)])
+        VersionCounter.bump(VersionCounter.CATALOGUE)
+
+        response = self._revalidate(url, response)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("Lungo", [item['name'] for item in response.json()['results']])
@@ -0,0 +1,100 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from coffee.models.challenges import Challenge, ChallengeRecipe, Vote
+from coffee.models.coffee import Coffee, Origin, Like
+
+
+class TestFieldProjection(TestCase):
+
+    def setUp(self):
+        caches['catalogue'].clear()
+        User = get_user_model()
+        self.user = User.objects.create_user(username='barista', email='barista@example.com', password='secret')
+        self.rival = User.objects.create_user(username='rival', email='rival@example.com', password='secret')
+        self.voter = User.objects.create_user(username='voter', email='voter@example.com', password='secret')
+        self.origin = Origin.objects.create(name="Italy")
+        self.espresso = Coffee.objects.create(
+            name="Espresso", origin=self.origin, description="Strong", user=self.user
+        )
+        Like.objects.create(user=self.user, coffee=self.espresso)
+        self.challenge = Challenge.objects.create(
+            challenger=self.user, challenged=self.rival, coffee_type="Espresso", status='voting'
+        )
+        for user in (self.user, self.rival):
+            ChallengeRecipe.objects.create(
+                challenge=self.challenge, user=user, name="Shot", origin=self.origin, description="..."
+            )
+        Vote.objects.create(challenge=self.challenge, voter=self.voter, voted_for=self.rival)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_default_output_is_unchanged(self):
+        item = self.client.get(reverse('coffee-list')).json()['results'][0]
+        self.assertEqual(
+            set(item),
+            {'id', 'name', 'origin', 'description', 'user', 'likes_count', 'is_liked',
+             'is_community_winner', 'is_private', 'caffeine_mg'}
+        )
+        self.assertEqual(item['origin'], {'id': self.origin.id, 'name': "Italy"})
+
+    def test_coffee_fields_prune_serializer_and_query(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('get-my-recipes'), {'fields': 'id,name'})
+        self.assertEqual(response.json()['results'], [{'id': self.espresso.id, 'name': "Espresso"}])
+        sql = ctx.captured_queries[-1]['sql']
+        self.assertNotIn('coffee_like', sql)
+        self.assertNotIn('coffee_origin', sql)
+        self.assertNotIn('description', sql)
+
+    def test_coffee_fields_keep_like_stats_when_asked(self):
+        response = self.client.get(reverse('get-favorites'), {'fields': 'id,likes_count,is_liked'})
+        self.assertEqual(response.json()['results'], [{'id': self.espresso.id, 'likes_count': 1, 'is_liked': True}])
+
+    def test_is_liked_keeps_the_id_on_shared_payloads(self):
+        for name in ('coffee-list', 'most-popular-recipes'):
+            body = self.client.get(reverse(name), {'fields': 'name,is_liked'}).json()
+            items = body['results'] if name == 'coffee-list' else body
+            self.assertEqual(items, [{'id': self.espresso.id, 'name': "Espresso", 'is_liked': True}])
+
+    def test_challenge_default_output_embeds_users_and_recipes(self):
+        item = self.client.get(reverse('challenge-list')).json()[0]
+        self.assertEqual(item['challenger']['username'], 'barista')
+        self.assertEqual(len(item['recipes']), 2)
+        self.assertEqual((item['challenger_votes'], item['challenged_votes'], item['total_votes']), (0, 1, 1))
+        self.assertFalse(item['can_vote'])
+
+    def test_challenge_projection_collapses_nested_objects(self):
+        response = self.client.get(reverse('challenge-list'), {'fields': 'id,challenger,recipes,status'})
+        item = response.json()[0]
+        self.assertEqual(set(item), {'id', 'challenger', 'recipes', 'status'})
+        self.assertEqual(item['challenger'], self.user.id)
+        self.assertEqual(len(item['recipes']), 2)
+        self.assertTrue(all(isinstance(pk, int) for pk in item['recipes']))
+
+        response = self.client.get(
+            reverse('challenge-list'), {'fields': 'id,challenger', 'expand': 'challenger'}
+        )
+        self.assertEqual(response.json()[0]['challenger']['username'], 'barista')
+
+    def test_challenge_queries_do_not_grow_with_rows(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse('challenge-list'))
+        single = len(ctx.captured_queries)
+
+        other = Challenge.objects.create(
+            challenger=self.rival, challenged=self.voter, coffee_type="Latte", status='voting'
+        )
+        ChallengeRecipe.objects.create(
+            challenge=other, user=self.rival, name="Latte", origin=self.origin, description="..."
+        )
+        Vote.objects.create(challenge=other, voter=self.user, voted_for=self.voter)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('challenge-list'))
+        self.assertEqual(len(ctx.captured_queries), single)
+        self.assertEqual(response.json()[0]['user_vote'], 'voter')
@@ -0,0 +1,111 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from coffee.leaderboard import compact, get_leaderboard, record_like, top_coffee_ids
+from coffee.models.coffee import Coffee, Origin, Like
+from coffee.models.leaderboard import Leaderboard, LeaderboardEntry
+
+
+class TestLeaderboard(TestCase):
+
+    def setUp(self):
+        caches['catalogue'].clear()
+        User = get_user_model()
+        self.owner = User.objects.create_user(username='barista', email='barista@example.com', password='secret')
+        self.fans = [
+            User.objects.create_user(username=f'fan{i}', email=f'fan{i}@example.com', password='secret')
+            for i in range(3)
+        ]
+        origin = Origin.objects.create(name="Italy")
+        self.classic = Coffee.objects.create(name="Classic", origin=origin, description="", user=self.owner)
+        self.fresh = Coffee.objects.create(name="Fresh", origin=origin, description="", user=self.owner)
+        self.secret = Coffee.objects.create(
+            name="Secret", origin=origin, description="", user=self.owner, is_private=True
+        )
+
+    def _like(self, user, coffee, days_ago=0):
+        like = Like.objects.create(user=user, coffee=coffee)
+        if days_ago:
+            # Backdate the like, moving its leaderboard weight along with it
+            liked_at = like.created_at - timedelta(days=days_ago)
+            Like.objects.filter(pk=like.pk).update(created_at=liked_at)
+            record_like(coffee.pk, like.created_at, -1)
+            record_like(coffee.pk, liked_at, 1)
+            like.created_at = liked_at
+        return like
+
+    def _ids(self, response):
+        return [item['id'] for item in response.json()]
+
+    def test_all_time_and_trending_rankings(self):
+        for fan in self.fans:
+            self._like(fan, self.classic, days_ago=10)
+        self._like(self.fans[0], self.fresh)
+
+        self.assertEqual(top_coffee_ids('all', 3), [self.classic.id, self.fresh.id])
+        self.assertEqual(top_coffee_ids('day', 3), [self.fresh.id, self.classic.id])
+
+        response = self.client.get(reverse('most-popular-recipes'), {'window': 'day', 'limit': 1})
+        self.assertEqual(self._ids(response), [self.fresh.id])
+
+    def test_unlike_removes_score(self):
+        like = self._like(self.fans[0], self.fresh)
+        like.delete()
+        self.assertEqual(top_coffee_ids('week', 3), [])
+
+    def test_owner_private_recipes_are_merged(self):
+        self._like(self.fans[0], self.classic)
+        self._like(self.fans[0], self.secret)
+        self._like(self.fans[1], self.secret)
+
+        self.assertEqual(top_coffee_ids('day', 3), [self.classic.id])
+        self.assertEqual(top_coffee_ids('day', 3, owner=self.owner), [self.secret.id, self.classic.id])
+
+        client = APIClient()
+        client.force_authenticate(self.owner)
+        response = client.get(reverse('most-popular-recipes'))
+        self.assertEqual(self._ids(response), [self.secret.id, self.classic.id, self.fresh.id])
+        self.assertNotIn(self.secret.id, self._ids(self.client.get(reverse('most-popular-recipes'))))
+
+    def test_compaction_keeps_ranking(self):
+        for fan in self.fans:
+            self._like(fan, self.classic, days_ago=2)
+        self._like(self.fans[0], self.fresh)
+        board = get_leaderboard('day')
+        before = top_coffee_ids('day', 3)
+
+        compact(board, now=timezone.now() + timedelta(days=1))
+        self.assertEqual(top_coffee_ids('day', 3), before)
+
+        # A later like lands on the compacted scale
+        self._like(self.fans[1], self.fresh)
+        self.assertEqual(top_coffee_ids('day', 3), [self.fresh.id, self.classic.id])
+
+    def test_like_reads_the_boards_once_and_compacts_stale_ones(self):
+        self._like(self.fans[0], self.fresh)
+        # A board left uncompacted for 70 half-lives: weights exceed 2 ** MAX_EXPONENT
+        Leaderboard.objects.filter(name='day').update(epoch=timezone.now() - timedelta(days=70))
+        LeaderboardEntry.objects.filter(leaderboard__name='day').update(score=2.0 ** 70)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self._like(self.fans[1], self.fresh)
+        board_reads = [q for q in ctx.captured_queries
+                       if q['sql'].startswith('SELECT') and 'FROM "coffee_leaderboard"' in q['sql']]
+        self.assertEqual(len(board_reads), 1)
+
+        # The first like was rescaled onto the new epoch before the second was added
+        score = LeaderboardEntry.objects.get(leaderboard__name='day', coffee=self.fresh).score
+        self.assertAlmostEqual(score, 2.0, places=3)
+
+    def test_invalid_window(self):
+        response = self.client.get(reverse('most-popular-recipes'), {'window': 'year'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,59 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from coffee.models.coffee import Coffee, Origin, Like
+
+
+class TestLikeCount(TestCase):
+
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username='barista', email='barista@example.com', password='secret')
+        self.other = User.objects.create_user(username='other', email='other@example.com', password='secret')
+        self.origin = Origin.objects.create(name="Italy")
+        self.espresso = Coffee.objects.create(
+            name="Espresso", origin=self.origin, description="Strong", user=self.user
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _like_count(self):
+        return Coffee.objects.values_list('like_count', flat=True).get(pk=self.espresso.pk)
+
+    def test_toggle_like_updates_counter(self):
+        response = self.client.post(reverse('toggle-like', args=[self.espresso.pk]))
+        self.assertEqual(response.json(), {'liked': True, 'likes_count': 1})
+        Like.objects.create(user=self.other, coffee=self.espresso)
+        self.assertEqual(self._like_count(), 2)
+
+        response = self.client.post(reverse('toggle-like', args=[self.espresso.pk]))
+        self.assertEqual(response.json(), {'liked': False, 'likes_count': 1})
+
+    def test_cascaded_like_deletes_are_counted(self):
+        Like.objects.create(user=self.other, coffee=self.espresso)
+        self.other.delete()
+        self.assertEqual(self._like_count(), 0)
+
+    def test_saving_a_stale_instance_keeps_the_counter(self):
+        coffee = Coffee.objects.get(pk=self.espresso.pk)
+        Like.objects.create(user=self.other, coffee=self.espresso)
+        coffee.description = "Very strong"
+        coffee.save()
+        self.assertEqual(self._like_count(), 1)
+
+    def test_reconcile_repairs_drift(self):
+        Like.objects.create(user=self.other, coffee=self.espresso)
+        Coffee.objects.filter(pk=self.espresso.pk).update(like_count=7)
+
+        out = StringIO()
+        call_command('reconcile_like_counts', '--dry-run', stdout=out)
+        self.assertEqual(self._like_count(), 7)
+
+        call_command('reconcile_like_counts', stdout=out)
+        self.assertEqual(self._like_count(), 1)
+        self.assertIn('1 had a drifted like count', out.getvalue())
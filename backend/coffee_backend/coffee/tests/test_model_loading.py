@@ -0,0 +1,51 @@
+import io
+import shutil
+import tempfile
+
+import numpy as np
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from coffee import ml_model_utils
+from coffee.tests.test_prediction_batch import write_test_model
+
+
+class TestModelLoading(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        write_test_model(self.directory)
+        settings_override = override_settings(ML_MODEL_DIR=self.directory, ML_PRELOAD_MODEL=True)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        ml_model_utils.clear_model_cache()
+        self.addCleanup(ml_model_utils.clear_model_cache)
+
+    def test_memory_mapped_dumps_are_preferred(self):
+        ml_model_utils.load_model_components()
+        self.assertFalse(ml_model_utils.model_status()['memory_mapped'])
+
+        call_command('dump_model_mmap', stdout=io.StringIO())
+        ml_model_utils.clear_model_cache()
+        components = ml_model_utils.load_model_components()
+        self.assertTrue(ml_model_utils.model_status()['memory_mapped'])
+        self.assertIsInstance(components['model'].coef_, np.memmap)
+        self.assertIsInstance(components['scaler'].mean_, np.memmap)
+
+    def test_readiness_follows_warm_up(self):
+        response = self.client.get(reverse('readiness'))
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(response.json()['model']['loaded'])
+
+        self.assertTrue(ml_model_utils.warm_up_model())
+        response = self.client.get(reverse('readiness'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['model']['loaded'])
+
+    def test_failed_warm_up_is_reported(self):
+        with override_settings(ML_MODEL_DIR=tempfile.gettempdir() + '/missing-model'):
+            self.assertFalse(ml_model_utils.warm_up_model())
+        self.assertIn('missing-model', ml_model_utils.model_status()['error'])
+        self.assertEqual(self.client.get(reverse('readiness')).status_code, 503)
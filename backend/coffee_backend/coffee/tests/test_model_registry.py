@@ -0,0 +1,150 @@
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import joblib
+import numpy as np
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, override_settings
+from sklearn.linear_model import LogisticRegression
+
+from coffee import ml_model_utils
+from coffee.ml_model_utils import predict_proba_batch
+from coffee.model_registry import ACTIVE_MARKER, get_registry, read_marker
+from coffee.tests.test_prediction_batch import write_test_model
+
+
+def write_versions(base):
+    """Two sources with the production file layout and different models."""
+    sources = {}
+    for version, C in (('v1', 1.0), ('v2', 0.001)):
+        source = os.path.join(base, f'source-{version}')
+        os.makedirs(source)
+        write_test_model(source)
+        scaler = joblib.load(os.path.join(source, 'scaler.pkl'))
+        rng = np.random.default_rng(1)
+        X = rng.normal(size=(200, 24)) * 50 + 100
+        y = (X[:, 3] > 100).astype(int)
+        joblib.dump(LogisticRegression(C=C).fit(scaler.transform(X), y), os.path.join(source, 'heart_disease_model.pkl'))
+        with open(os.path.join(source, 'optimal_threshold.txt'), 'w') as threshold:
+            threshold.write('0.150\n' if version == 'v1' else '0.250\n')
+        sources[version] = source
+    return sources
+
+
+class TestModelRegistry(SimpleTestCase):
+
+    def setUp(self):
+        base = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, base)
+        self.model_dir = os.path.join(base, 'models')
+        os.makedirs(self.model_dir)
+        write_test_model(self.model_dir)
+        self.sources = write_versions(base)
+        settings_override = override_settings(ML_MODEL_DIR=self.model_dir, ML_MODEL_CHECK_INTERVAL=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        ml_model_utils.clear_model_cache()
+        self.addCleanup(ml_model_utils.clear_model_cache)
+        self.registry = get_registry()
+        self.features = np.random.default_rng(2).normal(size=(20, 24)) * 50 + 100
+
+        for version, source in self.sources.items():
+            call_command('model_versions', '--publish', version, '--source', source, stdout=io.StringIO())
+
+    def expected(self, version):
+        source = self.sources[version]
+        model = joblib.load(os.path.join(source, 'heart_disease_model.pkl'))
+        scaler = joblib.load(os.path.join(source, 'scaler.pkl'))
+        return model.predict_proba(scaler.transform(self.features))[:, 1]
+
+    def test_activation_swaps_the_served_version(self):
+        unversioned = ml_model_utils.model_version()
+        self.assertEqual(len(unversioned), 16)
+
+        call_command('model_versions', '--activate', 'v1', stdout=io.StringIO())
+        self.registry.refresh(wait=True)
+        self.assertEqual(ml_model_utils.model_version(), 'v1')
+        self.assertEqual(ml_model_utils.load_model_components()['threshold'], 0.15)
+        np.testing.assert_array_equal(predict_proba_batch(self.features), self.expected('v1'))
+
+        # Without waiting: v1 keeps serving until v2 has loaded in the background
+        call_command('model_versions', '--activate', 'v2', stdout=io.StringIO())
+        self.assertIn(predict_proba_batch(self.features)[0], (self.expected('v1')[0], self.expected('v2')[0]))
+        deadline = time.monotonic() + 10
+        while ml_model_utils.model_status()['version'] != 'v2' and time.monotonic() < deadline:
+            time.sleep(0.01)
+            predict_proba_batch(self.features)
+        np.testing.assert_array_equal(predict_proba_batch(self.features), self.expected('v2'))
+
+        # Rolling back reuses the bundle that is still loaded
+        v1 = self.registry._bundles['v1']
+        call_command('model_versions', '--activate', 'v1', stdout=io.StringIO())
+        self.registry.refresh(wait=True)
+        self.assertIs(self.registry.active(), v1)
+
+        call_command('model_versions', '--deactivate', stdout=io.StringIO())
+        self.registry.refresh(wait=True)
+        self.assertEqual(ml_model_utils.model_version(), unversioned)
+
+    def test_shadow_scoring(self):
+        call_command('model_versions', '--activate', 'v1', stdout=io.StringIO())
+        call_command('model_versions', '--shadow', 'v2', stdout=io.StringIO())
+        self.registry.refresh(wait=True)
+        self.assertEqual(ml_model_utils.model_status()['shadow_version'], 'v2')
+
+        # Callers get the active model's results; the candidate is only compared
+        np.testing.assert_array_equal(predict_proba_batch(self.features), self.expected('v1'))
+        self.registry.wait_for_shadow()
+        stats = self.registry.shadow_stats.as_dict()
+        self.assertEqual((stats['version'], stats['batches'], stats['rows']), ('v2', 1, 20))
+        self.assertAlmostEqual(
+            stats['max_abs_difference'], float(np.max(np.abs(self.expected('v2') - self.expected('v1')))), places=6
+        )
+
+        call_command('model_versions', '--clear-shadow', stdout=io.StringIO())
+        self.registry.refresh(wait=True)
+        self.assertIsNone(ml_model_utils.model_status()['shadow_version'])
+
+    def test_warm_up_loads_without_background_threads(self):
+        call_command('model_versions', '--activate', 'v1', stdout=io.StringIO())
+        call_command('model_versions', '--shadow', 'v2', stdout=io.StringIO())
+        threads_before = set(threading.enumerate())
+
+        # What the gunicorn master runs before forking its workers
+        self.assertTrue(ml_model_utils.warm_up_model())
+        status = ml_model_utils.model_status()
+        self.assertEqual((status['version'], status['shadow_version']), ('v1', 'v2'))
+        self.assertEqual(set(threading.enumerate()) - threads_before, set())
+
+    def test_after_fork_resets_locks_held_by_other_threads(self):
+        self.registry._load_lock.acquire()
+        self.registry._loading.add(('shadow', 'v2'))
+        self.registry.after_fork()
+        self.assertEqual(self.registry._loading, set())
+        # Loading takes the load lock again
+        self.assertEqual(len(ml_model_utils.model_version()), 16)
+
+    def test_invalid_versions_are_rejected(self):
+        with self.assertRaises(CommandError):
+            call_command('model_versions', '--activate', 'v3', stdout=io.StringIO())
+        with self.assertRaises(CommandError):
+            call_command('model_versions', '--activate', '../v1', stdout=io.StringIO())
+        with self.assertRaises(CommandError):
+            call_command('model_versions', '--publish', 'v1', '--source', self.sources['v2'], stdout=io.StringIO())
+        self.assertIsNone(read_marker(ACTIVE_MARKER))
+
+        broken = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, broken)
+        with self.assertRaises(CommandError):
+            call_command('model_versions', '--publish', 'broken', '--source', broken, stdout=io.StringIO())
+        self.assertNotIn('broken', os.listdir(os.path.join(self.model_dir, 'versions')))
+
+        out = io.StringIO()
+        call_command('model_versions', '--list', stdout=out)
+        self.assertIn('v1', out.getvalue())
+        self.assertIn('(unversioned)  [active]', out.getvalue())
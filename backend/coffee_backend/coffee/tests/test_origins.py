@@ -0,0 +1,69 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from coffee.models.change_counters import VersionCounter
+from coffee.models.coffee import Coffee, Origin
+from coffee.origins import origin_registry, resolve_origin
+
+
+class TestOriginRegistry(TestCase):
+
+    def setUp(self):
+        caches['catalogue'].clear()
+        origin_registry.clear()
+        self.italy = Origin.objects.create(name="Italy")
+
+    def test_names_are_matched_by_normalized_key(self):
+        self.assertEqual(self.italy.key, 'italy')
+        self.assertEqual(resolve_origin("  ITALY ").pk, self.italy.pk)
+        self.assertEqual(resolve_origin("italy").name, "Italy")
+
+    def test_known_origins_resolve_without_loading(self):
+        resolve_origin("Italy")
+        # Only the shared generation is read
+        with CaptureQueriesContext(connection) as ctx:
+            resolve_origin("italy")
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+    def test_changes_in_another_worker_invalidate_the_registry(self):
+        resolve_origin("Italy")
+        # Another process renames the origin: only the database tells this one
+        Origin.objects.filter(pk=self.italy.pk).update(name="Italia", key="italia")
+        VersionCounter.bump(VersionCounter.ORIGINS)
+
+        self.assertEqual(resolve_origin("italia").pk, self.italy.pk)
+        self.assertNotEqual(resolve_origin("italy").pk, self.italy.pk)
+
+    def test_unknown_origin_is_created_once(self):
+        first = resolve_origin("Costa  Rica")
+        self.assertEqual(first.name, "Costa Rica")
+        self.assertEqual(resolve_origin("costa rica").pk, first.pk)
+        self.assertEqual(Origin.objects.filter(key='costa rica').count(), 1)
+
+    def test_origin_changes_invalidate_the_registry(self):
+        resolve_origin("Italy")
+        self.italy.name = "Italia"
+        self.italy.save()
+        self.assertEqual(resolve_origin("italia").pk, self.italy.pk)
+        self.assertNotEqual(resolve_origin("italy").pk, self.italy.pk)
+
+    def test_coffee_writes_reuse_origins(self):
+        user = get_user_model().objects.create_user(
+            username='barista', email='barista@example.com', password='secret'
+        )
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.post(
+            reverse('coffee-list'),
+            {'name': "Espresso", 'origin': {'name': "italy"}, 'description': "Strong"},
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Coffee.objects.get().origin_id, self.italy.pk)
+        self.assertEqual(Origin.objects.count(), 1)
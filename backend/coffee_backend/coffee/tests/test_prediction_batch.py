@@ -0,0 +1,171 @@
+import os
+import shutil
+import tempfile
+from datetime import date, timedelta
+
+import joblib
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from sklearn.linear_model import LogisticRegression
+from sklearn.preprocessing import StandardScaler
+
+from coffee import ml_model_utils
+from coffee.ml_model_utils import prepare_features, prepare_features_batch, predict_heart_disease_risk
+from coffee.models.coffee import Coffee, ConsumedCoffee, Origin
+from coffee.models.health import BloodPressureEntry, UserHealthProfile
+from coffee.risk import score_users
+
+
+def write_test_model(directory, n_features=24):
+    """A small model with the production file layout, trained on random data."""
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(200, n_features)) * 50 + 100
+    y = (X[:, 3] + rng.normal(size=200) * 20 > 100).astype(int)
+    scaler = StandardScaler().fit(X)
+    model = LogisticRegression().fit(scaler.transform(X), y)
+    joblib.dump(model, os.path.join(directory, 'heart_disease_model.pkl'))
+    joblib.dump(scaler, os.path.join(directory, 'scaler.pkl'))
+    joblib.dump({}, os.path.join(directory, 'encoders.pkl'))
+    joblib.dump([f'f{i}' for i in range(n_features)], os.path.join(directory, 'feature_names.pkl'))
+
+
+class TestPrepareFeaturesBatch(SimpleTestCase):
+
+    def test_defaults_and_derived_features(self):
+        features = prepare_features_batch({
+            'age': [30, None], 'sex': ['F', None], 'bmi': [20.0, None],
+            'systolic_bp': [135, None], 'diastolic_bp': [None, None],
+            'has_hypertension': [True, False],
+            'avg_daily_caffeine': [450.0, 50.0], 'total_caffeine_week': [900.0, 350.0], 'period_days': [2, 7],
+        })
+        self.assertEqual(features.shape, (2, 24))
+        first, second = features
+        np.testing.assert_allclose(first[:8], [30, 0, 20.0, 450.0, 3150.0, 135, 80.0, 1])
+        np.testing.assert_allclose(second[:7], [45, 1, 25.0, 50.0, 350.0, 120.0, 80.0])
+        # per kg (clipped at 20), per bmi (clipped at 100), category, interactions, high flag
+        np.testing.assert_allclose(first[18:], [450 / (20 * 1.7 ** 2), 22.5, 3, 13.5, 450.0, 1])
+        np.testing.assert_allclose(second[18:], [50 / (25 * 1.7 ** 2), 2.0, 0, 2.25, 0.0, 0])
+
+    def test_matches_single_row_preparation(self):
+        profile = UserHealthProfile(
+            sex='F', date_of_birth=date(1980, 5, 1), height_cm=170, weight_kg=80, is_smoker=True
+        )
+        rows = [
+            (profile, {'systolic': 150, 'diastolic': 95}, 620.0, 4340.0, 7),
+            (None, None, 0.0, 0.0, 30),
+            (profile, None, 120.0, 3600.0, 30),
+        ]
+        batch = prepare_features_batch(ml_model_utils.feature_columns(rows))
+        for row, features in zip(rows, batch):
+            np.testing.assert_array_equal(prepare_features(*row)[0], features)
+
+
+class TestBatchPrediction(TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        write_test_model(directory)
+        settings_override = override_settings(ML_MODEL_DIR=directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        ml_model_utils.clear_model_cache()
+        self.addCleanup(ml_model_utils.clear_model_cache)
+
+        User = get_user_model()
+        self.admin = User.objects.create_user(
+            username='admin', email='admin@example.com', password='secret', is_staff=True
+        )
+        origin = Origin.objects.create(name="Italy")
+        cold_brew = Coffee.objects.create(name="Cold Brew", origin=origin, description="", user=self.admin)
+        self.users = []
+        for i in range(3):
+            user = User.objects.create_user(username=f'drinker{i}', email=f'drinker{i}@example.com', password='secret')
+            UserHealthProfile.objects.create(
+                user=user, sex='M', date_of_birth=date(1960 + 10 * i, 1, 1), height_cm=180, weight_kg=70 + 10 * i,
+                has_hypertension=bool(i % 2)
+            )
+            BloodPressureEntry.objects.create(user=user, systolic=120 + 10 * i, diastolic=80)
+            for days_ago in range(i * 3):
+                ConsumedCoffee.objects.create(
+                    user=user, coffee=cold_brew, consumed_at=timezone.now() - timedelta(days=days_ago, hours=1)
+                )
+            self.users.append(user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def _single(self, user, period_days=7):
+        total = sum(cc.coffee.caffeine_mg for cc in ConsumedCoffee.objects.filter(
+            user=user, consumed_at__gte=timezone.now() - timedelta(days=period_days)
+        ))
+        bp = BloodPressureEntry.objects.filter(user=user).first()
+        return predict_heart_disease_risk(
+            user.health_profile, {'systolic': bp.systolic, 'diastolic': bp.diastolic},
+            total / period_days, total, period_days
+        )
+
+    def test_scores_match_single_predictions(self):
+        scores = score_users(period='week')
+        self.assertEqual(list(scores), [user.pk for user in self.users])
+        for user in self.users:
+            single = self._single(user)
+            self.assertAlmostEqual(scores[user.pk]['risk_probability'], single['risk_probability'])
+            self.assertEqual(scores[user.pk]['risk_category'], single['risk_category'])
+
+    def test_batch_endpoint(self):
+        url = reverse('generate-prediction-batch')
+        response = self.client.post(
+            url, {'period': 'week', 'user_ids': [self.users[2].pk, self.admin.pk]}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        results = {row['user_id']: row for row in response.json()['results']}
+        self.assertEqual(set(results), {self.users[2].pk, self.admin.pk})
+        self.assertEqual(results[self.users[2].pk]['risk_category'], self._single(self.users[2])['risk_category'])
+
+        response = self.client.post(url, {'profiles': [{'age': 70, 'avg_daily_caffeine': 700}, {}]}, format='json')
+        self.assertEqual([row['index'] for row in response.json()['results']], [0, 1])
+
+        response = self.client.post(url, {'profiles': [{'age': 'old'}]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        client = APIClient()
+        client.force_authenticate(self.users[0])
+        self.assertEqual(client.post(url, {}, format='json').status_code, 403)
+
+    def test_simulation_endpoint(self):
+        user = self.users[2]
+        client = APIClient()
+        client.force_authenticate(user)
+        url = reverse('simulate-prediction')
+
+        response = client.post(url, {'period': 'week', 'extra_cups': [0, 1, 3], 'mg_per_cup': 80}, format='json')
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        baseline = body['baseline_avg_daily_mg']
+        self.assertGreater(baseline, 0)
+        self.assertEqual([point['extra_cups'] for point in body['points']], [0, 1, 3])
+        self.assertEqual([point['avg_daily_mg'] for point in body['points']],
+                         [baseline, round(baseline + 80, 2), round(baseline + 240, 2)])
+
+        # Each grid point scores like a single prediction at that intake
+        bp = BloodPressureEntry.objects.get(user=user)
+        for point in body['points']:
+            single = predict_heart_disease_risk(
+                user.health_profile, {'systolic': bp.systolic, 'diastolic': bp.diastolic},
+                point['avg_daily_mg'], point['avg_daily_mg'] * 7, 7
+            )
+            self.assertAlmostEqual(point['risk_probability'], single['risk_probability'], places=5)
+
+        self.assertEqual(client.post(url, {'extra_cups': 'lots'}, format='json').status_code, 400)
+        self.assertEqual(client.post(url, {'mg_per_cup': -5}, format='json').status_code, 400)
+        for bp in ({'systolic': 'abc', 'diastolic': 80}, {'systolic': {'a': 1}, 'diastolic': 80},
+                   {'systolic': 120, 'diastolic': 400}):
+            response = client.post(url, bp, format='json')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('between', response.json()['error'])
+        self.assertEqual(client.post(url, {'systolic': 150, 'diastolic': 95}, format='json').status_code, 200)
+        self.assertEqual(len(client.post(url, {}, format='json').json()['points']), 6)
@@ -0,0 +1,84 @@
+import os
+import shutil
+import tempfile
+from datetime import date
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+
+from coffee import ml_model_utils
+from coffee.batching import reset_prediction_batcher
+from coffee.ml_model_utils import predict_heart_disease_risk
+from coffee.models.health import UserHealthProfile
+from coffee.prediction_cache import PredictionCache, get_prediction_cache, prediction_key, reset_prediction_cache
+from coffee.tests.test_prediction_batch import write_test_model
+
+
+class TestPredictionCache(SimpleTestCase):
+
+    def test_key_is_canonical(self):
+        row = np.array([[1.0, 0.0, 2.5]])
+        self.assertEqual(prediction_key(row, 'v1'), prediction_key([1, -0.0, 2.5], 'v1'))
+        self.assertNotEqual(prediction_key(row, 'v1'), prediction_key(row, 'v2'))
+        self.assertNotEqual(prediction_key(row, 'v1'), prediction_key([[1.0, 0.0, 2.6]], 'v1'))
+
+    def test_lru_eviction_and_ttl(self):
+        cache = PredictionCache(max_entries=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.set('c', 3)  # 'b' is the least recently used
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(cache.metrics()['evictions'], 1)
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+
+        expired = PredictionCache(ttl=0)
+        expired.set('a', 1)
+        self.assertIsNone(expired.get('a'))
+        self.assertEqual(expired.metrics()['entries'], 0)
+
+
+class TestCachedPredictions(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        write_test_model(self.directory)
+        settings_override = override_settings(ML_MODEL_DIR=self.directory, ML_BATCH_WINDOW_MS=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        for reset in (ml_model_utils.clear_model_cache, reset_prediction_cache, reset_prediction_batcher):
+            reset()
+            self.addCleanup(reset)
+        self.profile = UserHealthProfile(sex='M', date_of_birth=date(1970, 1, 1), height_cm=180, weight_kg=85)
+
+    def predict(self, bp_entry=None):
+        return predict_heart_disease_risk(self.profile, bp_entry, 300.0, 2100.0, 7)
+
+    def test_identical_inputs_are_served_from_cache(self):
+        # The batcher binds predict_proba_batch when it is created, after the patch
+        with mock.patch('coffee.ml_model_utils.predict_proba_batch', wraps=ml_model_utils.predict_proba_batch):
+            first = self.predict()
+            self.assertEqual(self.predict(), first)
+            self.assertEqual(ml_model_utils.predict_proba_batch.call_count, 1)
+
+            # New inputs (here a blood-pressure reading) change the key
+            self.predict({'systolic': 160, 'diastolic': 100})
+            self.assertEqual(ml_model_utils.predict_proba_batch.call_count, 2)
+
+        metrics = get_prediction_cache().metrics()
+        self.assertEqual((metrics['hits'], metrics['misses'], metrics['entries']), (1, 2, 2))
+
+    def test_new_model_version_misses(self):
+        self.predict()
+        version = ml_model_utils.model_version()
+
+        model_path = os.path.join(self.directory, 'heart_disease_model.pkl')
+        os.utime(model_path, ns=(0, os.stat(model_path).st_mtime_ns + 1))
+        ml_model_utils.clear_model_cache()
+        self.assertNotEqual(ml_model_utils.model_version(), version)
+
+        self.predict()
+        self.assertEqual(get_prediction_cache().metrics()['misses'], 2)
@@ -0,0 +1,123 @@
+import csv
+import os
+import shutil
+import tempfile
+from datetime import date, timedelta
+from io import StringIO
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from coffee.ml_model_utils import MODEL_FEATURE_NAMES, prepare_features
+from coffee.models.coffee import Coffee, ConsumedCoffee, Origin
+from coffee.models.health import BloodPressureEntry, UserHealthProfile
+from coffee.risk_dataset import DATASET_COLUMNS, export_range, merge_parts
+
+
+class ExportUsersMixin:
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+        User = get_user_model()
+        owner = User.objects.create_user(username='owner', email='owner@example.com', password='secret')
+        espresso = Coffee.objects.create(
+            name="Espresso", origin=Origin.objects.create(name="Brazil"), description="", user=owner
+        )
+        self.users = []
+        for i in range(5):
+            user = User.objects.create_user(username=f'export{i}', email=f'export{i}@example.com', password='secret')
+            UserHealthProfile.objects.create(
+                user=user, sex='F', date_of_birth=date(1950 + 8 * i, 3, 1), height_cm=165, weight_kg=60 + 5 * i,
+                is_smoker=bool(i % 2), num_relatives_chd=i,
+            )
+            if i != 1:
+                BloodPressureEntry.objects.create(user=user, systolic=115 + 5 * i, diastolic=75 + i)
+            # The user without coffee is left out of the export
+            for days_ago in range(i * 2):
+                ConsumedCoffee.objects.create(
+                    user=user, coffee=espresso, consumed_at=timezone.now() - timedelta(days=days_ago, hours=2)
+                )
+            self.users.append(user)
+
+
+class TestExportHeartRiskDataset(ExportUsersMixin, TestCase):
+
+    def _expected(self, user, period_days=30):
+        total = sum(cc.coffee.caffeine_mg for cc in ConsumedCoffee.objects.filter(user=user))
+        bp = BloodPressureEntry.objects.filter(user=user).first()
+        bp_entry = {'systolic': bp.systolic, 'diastolic': bp.diastolic} if bp else None
+        return total, prepare_features(user.health_profile, bp_entry, total / period_days, total, period_days)[0]
+
+    def test_csv_matches_single_row_features(self):
+        path = os.path.join(self.directory, 'features.csv')
+        call_command('export_heart_risk_dataset', output=path, period='month', chunk_size=2, stdout=StringIO())
+
+        with open(path, newline='') as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(tuple(rows[0]), DATASET_COLUMNS)
+        self.assertEqual(len(rows[0]), 5 + len(MODEL_FEATURE_NAMES) + 1)
+        self.assertEqual([int(row[0]) for row in rows[1:]], [user.pk for user in self.users[1:]])
+        for user, row in zip(self.users[1:], rows[1:]):
+            total, features = self._expected(user)
+            self.assertEqual(row[1:3], ['month', '30'])
+            self.assertAlmostEqual(float(row[4]), total)
+            np.testing.assert_allclose([float(value) for value in row[5:-1]], features)
+            self.assertEqual(int(row[-1]), user.health_profile.num_relatives_chd)
+
+    def test_npz_output(self):
+        path = os.path.join(self.directory, 'features.npz')
+        call_command('export_heart_risk_dataset', output=path, period='month', chunk_size=3, stdout=StringIO())
+
+        with np.load(path) as archive:
+            self.assertEqual(tuple(archive['feature_names']), MODEL_FEATURE_NAMES)
+            self.assertEqual(str(archive['period']), 'month')
+            self.assertEqual(archive['features'].shape, (4, len(MODEL_FEATURE_NAMES)))
+            self.assertEqual(archive['user_id'].tolist(), [user.pk for user in self.users[1:]])
+            for user, row in zip(self.users[1:], archive['features']):
+                np.testing.assert_allclose(row, self._expected(user)[1])
+
+    def test_npz_parts_are_merged_in_order(self):
+        now = timezone.now()
+        split = self.users[3].pk
+        parts = [os.path.join(self.directory, f'features.part{index}.npz') for index in range(2)]
+        for part, user_range in zip(parts, [(None, split), (split, None)]):
+            export_range(part, 'npz', 'month', now, 2, user_range)
+        path = os.path.join(self.directory, 'features.npz')
+        merge_parts(path, 'npz', parts)
+
+        single = os.path.join(self.directory, 'single.npz')
+        export_range(single, 'npz', 'month', now, 2)
+        with np.load(path) as merged, np.load(single) as expected:
+            self.assertEqual(sorted(merged.files), sorted(expected.files))
+            self.assertEqual(merged['user_id'].tolist(), [user.pk for user in self.users[1:]])
+            for name in expected.files:
+                np.testing.assert_array_equal(merged[name], expected[name])
+
+
+class TestParallelExport(ExportUsersMixin, TransactionTestCase):
+    """Worker processes read committed rows, hence a TransactionTestCase."""
+
+    def test_workers_match_a_single_process_export(self):
+        for fmt in ('csv', 'npz'):
+            paths = {}
+            for workers in (1, 2):
+                paths[workers] = os.path.join(self.directory, f'features-{workers}.{fmt}')
+                call_command(
+                    'export_heart_risk_dataset', output=paths[workers], period='month', chunk_size=2,
+                    workers=workers, stdout=StringIO(),
+                )
+            if fmt == 'csv':
+                with open(paths[1]) as single, open(paths[2]) as parallel:
+                    self.assertEqual(parallel.read(), single.read())
+            else:
+                with np.load(paths[1]) as single, np.load(paths[2]) as parallel:
+                    self.assertEqual(sorted(parallel.files), sorted(single.files))
+                    for name in single.files:
+                        np.testing.assert_array_equal(parallel[name], single[name])
+        # The part files are removed after the merge
+        self.assertEqual([name for name in os.listdir(self.directory) if '.part' in name], [])
@@ -0,0 +1,68 @@
+import io
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from coffee.models.coffee import Coffee, ConsumedCoffee, Origin
+from coffee.models.rollups import DailyCaffeineRollup
+from coffee.rollups import caffeine_totals, day_start
+
+
+class TestDailyCaffeineRollups(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='barista', email='barista@example.com', password='secret'
+        )
+        origin = Origin.objects.create(name="Italy")
+        self.espresso = Coffee.objects.create(name="Espresso", origin=origin, description="", user=self.user)
+        self.french_press = Coffee.objects.create(name="French Press", origin=origin, description="", user=self.user)
+        self.today = timezone.localdate()
+
+    def _consume(self, coffee, days_ago, hour=12):
+        return ConsumedCoffee.objects.create(
+            user=self.user, coffee=coffee,
+            consumed_at=day_start(self.today - timedelta(days=days_ago)) + timedelta(hours=hour)
+        )
+
+    def _rollups(self):
+        return {
+            (self.today - row.day).days: (row.total_mg, row.count)
+            for row in DailyCaffeineRollup.objects.filter(user=self.user)
+        }
+
+    def test_rollups_follow_the_consumption_log(self):
+        self._consume(self.espresso, 1)
+        second = self._consume(self.french_press, 1)
+        self._consume(self.espresso, 3)
+        self.assertEqual(self._rollups(), {1: (68.0 + 223.0, 2), 3: (68.0, 1)})
+
+        second.delete()
+        self.espresso.name = "Double Espresso"
+        self.espresso.save()
+        self.assertEqual(self._rollups(), {1: (136.0, 1), 3: (136.0, 1)})
+
+        self.espresso.delete()
+        self.assertEqual(self._rollups(), {})
+
+    def test_totals_match_the_log(self):
+        for days_ago, hour in ((0, 1), (2, 6), (2, 20), (5, 3), (9, 12)):
+            self._consume(self.espresso, days_ago, hour)
+        start = day_start(self.today - timedelta(days=5)) + timedelta(hours=10)
+        end = day_start(self.today) + timedelta(hours=2)
+
+        # Day -5 before 10:00 is out, day 0 before 02:00 is in
+        self.assertEqual(caffeine_totals(self.user.pk, start, end), (68.0 * 3, 3))
+        self.assertEqual(caffeine_totals(self.user.pk, start, start + timedelta(hours=1)), (0.0, 0))
+
+    def test_backfill_command(self):
+        self._consume(self.espresso, 1)
+        self._consume(self.french_press, 4)
+        Coffee.objects.filter(pk=self.espresso.pk).update(caffeine_mg=100.0)  # no signals
+        DailyCaffeineRollup.objects.all().delete()
+
+        call_command('backfill_caffeine_rollups', stdout=io.StringIO())
+        self.assertEqual(self._rollups(), {1: (100.0, 1), 4: (223.0, 1)})
@@ -0,0 +1,72 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from coffee.models.coffee import Coffee, Origin
+from coffee.models.search import SearchTerm
+from coffee.search import tokenize
+
+
+class TestRecipeSearch(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='barista', email='barista@example.com', password='secret'
+        )
+        self.italy = Origin.objects.create(name="Italy")
+        self.ethiopia = Origin.objects.create(name="Ethiopia")
+        self.espresso = Coffee.objects.create(
+            name="Espresso", origin=self.italy, description="Strong and short", user=self.user
+        )
+        self.pour_over = Coffee.objects.create(
+            name="Pour over", origin=self.ethiopia, description="Fruity, brewed like an espresso", user=self.user
+        )
+        self.secret = Coffee.objects.create(
+            name="Secret espresso", origin=self.italy, description="Hidden", user=self.user,
+            is_private=True
+        )
+
+    def _search(self, q, client=None):
+        response = (client or self.client).get(reverse('search-recipes'), {'q': q})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['id'] for item in response.json()['results']]
+
+    def test_tokenize_folds_case_and_accents(self):
+        self.assertEqual(tokenize("Café Crème, 2 shots"), ['cafe', 'creme', '2', 'shots'])
+
+    def test_name_matches_rank_above_description_matches(self):
+        self.assertEqual(self._search("espresso"), [self.espresso.id, self.pour_over.id])
+
+    def test_last_token_matches_as_prefix(self):
+        self.assertEqual(self._search("espr"), [self.espresso.id, self.pour_over.id])
+        self.assertEqual(self._search("fruity espr"), [self.pour_over.id])
+
+    def test_all_tokens_must_match(self):
+        self.assertEqual(self._search("strong fruity"), [])
+
+    def test_origin_name_is_searchable(self):
+        self.assertEqual(self._search("ethiopia"), [self.pour_over.id])
+
+    def test_private_recipes_only_for_owner(self):
+        self.assertNotIn(self.secret.id, self._search("secret"))
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertEqual(self._search("secret", client), [self.secret.id])
+
+    def test_index_follows_edits(self):
+        self.espresso.name = "Ristretto"
+        self.espresso.save()
+        self.assertEqual(self._search("ristretto"), [self.espresso.id])
+        self.assertEqual(self._search("espresso"), [self.pour_over.id])
+
+        self.italy.name = "Napoli"
+        self.italy.save()
+        self.assertEqual(self._search("napoli"), [self.espresso.id])
+
+        self.espresso.delete()
+        self.assertFalse(SearchTerm.objects.filter(term='ristretto').exists())
+
+    def test_empty_query(self):
+        self.assertEqual(self._search(""), [])
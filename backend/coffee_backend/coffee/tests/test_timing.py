@@ -0,0 +1,86 @@
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from coffee import ml_model_utils
+from coffee.batching import reset_prediction_batcher
+from coffee.prediction_cache import reset_prediction_cache
+from coffee.tests.test_prediction_batch import write_test_model
+from coffee.timing import Histogram, annotate, reset_timings, span, timings, trace
+
+
+class TestTiming(SimpleTestCase):
+
+    def setUp(self):
+        reset_timings()
+        self.addCleanup(reset_timings)
+
+    def test_histogram_summary(self):
+        histogram = Histogram()
+        for milliseconds in (0.2, 0.3, 0.4, 3.0, 40.0):
+            histogram.record(milliseconds)
+        summary = histogram.summary()
+        self.assertEqual(summary['count'], 5)
+        self.assertEqual((summary['min_ms'], summary['max_ms']), (0.2, 40.0))
+        self.assertEqual(summary['p50_ms'], 0.5)
+        self.assertEqual(summary['p99_ms'], 40.0)
+        self.assertEqual(summary['buckets'], {'le_0.25': 1, 'le_0.5': 2, 'le_5': 1, 'le_50': 1})
+        self.assertEqual(Histogram().summary(), {'count': 0})
+
+    @override_settings(ML_TRACE_SAMPLE_RATE=1.0)
+    def test_sampled_traces_are_logged(self):
+        with self.assertLogs('coffee.timing', 'INFO') as logs:
+            with trace('request'):
+                with span('request.stage'):
+                    annotate(user=7)
+        self.assertEqual(len(logs.records), 1)
+        self.assertRegex(logs.output[0], r'trace request total=[\d.]+ms request\.stage=[\d.]+ms user=7')
+        self.assertEqual(timings()['request']['count'], 1)
+        self.assertEqual(timings()['request.stage']['count'], 1)
+
+    @override_settings(ML_TRACE_SAMPLE_RATE=0)
+    def test_unsampled_traces_are_only_counted(self):
+        with self.assertNoLogs('coffee.timing', 'INFO'):
+            with trace('request'):
+                pass
+        self.assertEqual(timings()['request']['count'], 1)
+
+
+class TestPredictionTimings(TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        write_test_model(directory)
+        settings_override = override_settings(ML_MODEL_DIR=directory, ML_BATCH_WINDOW_MS=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        for reset in (ml_model_utils.clear_model_cache, reset_prediction_cache, reset_prediction_batcher,
+                      reset_timings):
+            reset()
+            self.addCleanup(reset)
+
+    def test_prediction_stages_reach_the_metrics_endpoint(self):
+        User = get_user_model()
+        user = User.objects.create_user(username='drinker', email='drinker@example.com', password='secret')
+        admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='secret')
+        client = APIClient()
+        client.force_authenticate(user)
+        self.assertEqual(client.post(reverse('generate-prediction'), {'period': 'week'}, format='json').status_code, 200)
+        self.assertEqual(client.get(reverse('metrics')).status_code, 403)
+
+        client.force_authenticate(admin)
+        response = client.get(reverse('metrics'), {'reset': 'true'})
+        self.assertEqual(response.status_code, 200)
+        recorded = response.json()['timings']
+        for stage in (
+            'prediction', 'prediction.caffeine_totals', 'prediction.profile_bp_lookup',
+            'prediction.prepare_features', 'prediction.cache_lookup', 'prediction.model',
+            'model.scaler_transform', 'model.predict_proba', 'prediction.serialize',
+        ):
+            self.assertEqual(recorded[stage]['count'], 1, stage)
+        self.assertEqual(timings(), {})
@@ -0,0 +1,122 @@
+import io
+import os
+import shutil
+import tempfile
+
+import joblib
+import numpy as np
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, override_settings
+from sklearn.ensemble import GradientBoostingClassifier, RandomForestClassifier, VotingClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.preprocessing import StandardScaler
+
+from coffee import ml_model_utils
+from coffee.ml_model_utils import prepare_features_batch
+from coffee.tests.test_prediction_batch import write_test_model
+from coffee.tree_engine import COMPILED_FILE, UnsupportedModelError, compile_model, probe_features
+
+
+def training_data(n_features=24, n=300):
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(n, n_features)) * 50 + 100
+    y = (X[:, 3] + X[:, 5] * 0.5 + rng.normal(size=n) * 20 > 150).astype(int)
+    return X, y
+
+
+def ensemble_model(X, y):
+    """A small copy of the production ensemble: soft voting over a forest and boosting."""
+    scaler = StandardScaler().fit(X)
+    model = VotingClassifier(
+        estimators=[
+            ('rf', RandomForestClassifier(n_estimators=40, max_depth=8, random_state=0)),
+            ('gb', GradientBoostingClassifier(n_estimators=30, learning_rate=0.1, random_state=0)),
+        ],
+        voting='soft',
+        weights=[2, 1],
+    ).fit(scaler.transform(X), y)
+    return model, scaler
+
+
+class TestCompiledModel(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.X, cls.y = training_data()
+        cls.model, cls.scaler = ensemble_model(cls.X, cls.y)
+
+    def expected(self, model, features):
+        return model.predict_proba(self.scaler.transform(features))[:, 1]
+
+    def test_voting_ensemble_is_bit_for_bit_equivalent(self):
+        compiled = compile_model(self.model, self.scaler)
+        features = np.vstack([self.X, probe_features(compiled, n=200)])
+        np.testing.assert_array_equal(compiled.predict_proba(features), self.expected(self.model, features))
+        # Single rows take the same path
+        for row in features[:20]:
+            np.testing.assert_array_equal(
+                compiled.predict_proba(row[np.newaxis, :]), self.expected(self.model, row[np.newaxis, :])
+            )
+
+    def test_members_compile_on_their_own(self):
+        for member in self.model.estimators_:
+            compiled = compile_model(member, self.scaler)
+            np.testing.assert_array_equal(compiled.predict_proba(self.X), self.expected(member, self.X))
+
+    def test_real_feature_rows(self):
+        compiled = compile_model(self.model, self.scaler)
+        features = prepare_features_batch({
+            'age': [30, 70, None], 'sex': ['F', 'M', None], 'has_hypertension': [False, True, False],
+            'avg_daily_caffeine': [0.0, 650.0, 180.0], 'total_caffeine_week': [0.0, 4550.0, 5400.0],
+            'period_days': [7, 7, 30],
+        })
+        np.testing.assert_array_equal(compiled.predict_proba(features), self.expected(self.model, features))
+
+    def test_unsupported_models(self):
+        linear = LogisticRegression().fit(self.scaler.transform(self.X), self.y)
+        with self.assertRaises(UnsupportedModelError):
+            compile_model(linear, self.scaler)
+        compiled = compile_model(self.model, self.scaler)
+        with self.assertRaises(ValueError):
+            compiled.predict_proba(np.full((1, 24), np.nan))
+
+
+class TestCompileCommand(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        settings_override = override_settings(ML_MODEL_DIR=self.directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        ml_model_utils.clear_model_cache()
+        self.addCleanup(ml_model_utils.clear_model_cache)
+
+    def test_compiled_model_is_used_for_predictions(self):
+        X, y = training_data()
+        model, scaler = ensemble_model(X, y)
+        write_test_model(self.directory)
+        joblib.dump(model, os.path.join(self.directory, 'heart_disease_model.pkl'))
+        joblib.dump(scaler, os.path.join(self.directory, 'scaler.pkl'))
+
+        call_command('compile_risk_model', '--check-rows', 100, stdout=io.StringIO())
+        components = ml_model_utils.load_model_components()
+        self.assertIsNotNone(components['compiled'])
+        self.assertTrue(ml_model_utils.model_status()['compiled'])
+        np.testing.assert_array_equal(
+            ml_model_utils.predict_proba_batch(X[:10]), model.predict_proba(scaler.transform(X[:10]))[:, 1]
+        )
+
+        # A retrained model makes the compiled copy stale: it is ignored
+        retrained, _ = ensemble_model(X, 1 - y)
+        joblib.dump(retrained, os.path.join(self.directory, 'heart_disease_model.pkl'))
+        ml_model_utils.clear_model_cache()
+        self.assertIsNone(ml_model_utils.load_model_components()['compiled'])
+
+    def test_unsupported_model_is_not_compiled(self):
+        write_test_model(self.directory)
+        with self.assertRaises(CommandError):
+            call_command('compile_risk_model', stdout=io.StringIO())
+        self.assertFalse(os.path.exists(os.path.join(self.directory, COMPILED_FILE)))
@@ -0,0 +1,112 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.utils import timezone
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from coffee.models.coffee import Coffee, ConsumedCoffee, Origin, Like
+
+
+class TestUserCollections(TestCase):
+
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username='barista', email='barista@example.com', password='secret')
+        self.other = User.objects.create_user(username='other', email='other@example.com', password='secret')
+        origin = Origin.objects.create(name="Italy")
+        self.coffees = [
+            Coffee.objects.create(name=f"Coffee {i}", origin=origin, description="", user=self.user)
+            for i in range(5)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _walk(self, url, page_size=2):
+        ids = []
+        response = self.client.get(url, {'page_size': page_size})
+        while True:
+            ids += [item['id'] for item in response.json()['results']]
+            if not response.json()['next']:
+                return ids
+            response = self.client.get(response.json()['next'])
+
+    def test_my_recipes_are_paginated_newest_first(self):
+        Coffee.objects.create(name="Not mine", origin=self.coffees[0].origin, description="", user=self.other)
+        self.assertEqual(
+            self._walk(reverse('get-my-recipes')),
+            [coffee.id for coffee in reversed(self.coffees)]
+        )
+
+    def test_favorites_are_paginated_by_like_time(self):
+        now = Like.objects.create(user=self.other, coffee=self.coffees[0]).created_at
+        # Liked in the order 2, 0, 4, 1 (oldest first); 1 and 4 in the same instant
+        for offset, coffee in ((3, self.coffees[2]), (2, self.coffees[0]), (1, self.coffees[4]), (1, self.coffees[1])):
+            like = Like.objects.create(user=self.user, coffee=coffee)
+            Like.objects.filter(pk=like.pk).update(created_at=now - timedelta(minutes=offset))
+
+        ids = self._walk(reverse('get-favorites'))
+        self.assertEqual(ids[2:], [self.coffees[0].id, self.coffees[2].id])
+        self.assertEqual(set(ids[:2]), {self.coffees[1].id, self.coffees[4].id})
+
+    def test_favorites_page_is_a_constant_number_of_queries(self):
+        for coffee in self.coffees:
+            Like.objects.create(user=self.user, coffee=coffee)
+            Like.objects.create(user=self.other, coffee=coffee)
+
+        # Catalogue version and change counter for the ETag + the page query
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('get-favorites'))
+        results = response.json()['results']
+        self.assertEqual(len(results), 5)
+        self.assertTrue(all(item['is_liked'] and item['likes_count'] == 2 for item in results))
+
+    def _consume(self, days_ago):
+        today = timezone.now().replace(hour=12, minute=0, second=0, microsecond=0)
+        return ConsumedCoffee.objects.create(
+            user=self.user, coffee=self.coffees[0], consumed_at=today - timedelta(days=days_ago)
+        )
+
+    def test_consumed_history_is_tagged_and_counted(self):
+        today, yesterday, old = self._consume(0), self._consume(1), self._consume(100)
+        ConsumedCoffee.objects.create(user=self.other, coffee=self.coffees[0])
+
+        response = self.client.get(reverse('get-consumed-coffees'))
+        data = response.json()
+        self.assertEqual(
+            data['counts'],
+            {'all': 3, 'today': 1, 'yesterday': 1, 'last_7_days': 1, 'last_month': 1, 'last_year': 2}
+        )
+        by_id = {row['id']: row['buckets'] for row in data['results']}
+        self.assertEqual(by_id[today.id], ['today'])
+        self.assertEqual(by_id[yesterday.id], ['yesterday', 'last_7_days', 'last_month', 'last_year'])
+        self.assertEqual(by_id[old.id], ['last_year'])
+
+        response = self.client.get(reverse('get-consumed-coffees'), {'bucket': 'yesterday'})
+        self.assertEqual([row['id'] for row in response.json()['results']], [yesterday.id])
+
+    def test_consumed_history_range_and_pagination(self):
+        consumed = [self._consume(days_ago) for days_ago in range(5)]
+        self.assertEqual(self._walk(reverse('get-consumed-coffees')), [c.id for c in consumed])
+
+        since = consumed[2].consumed_at.date().isoformat()
+        until = consumed[0].consumed_at.date().isoformat()
+        response = self.client.get(reverse('get-consumed-coffees'), {'from': since, 'to': until})
+        self.assertEqual([row['id'] for row in response.json()['results']], [consumed[1].id, consumed[2].id])
+        self.assertEqual(response.json()['counts']['all'], 2)
+
+        response = self.client.get(reverse('get-consumed-coffees'), {'from': 'last week'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_consumed_page_is_a_constant_number_of_queries(self):
+        for days_ago in range(10):
+            self._consume(days_ago)
+        # Catalogue version + change counter + bucket counts + page + the page's coffees
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('get-consumed-coffees'))
+        self.assertEqual(len(response.json()['results']), 10)
+        # A root projection does not defer the nested coffees' columns
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('get-consumed-coffees'), {'fields': 'id,name'})
+        self.assertIn('description', response.json()['results'][0]['coffee'])
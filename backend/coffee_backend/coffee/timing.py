@@ -0,0 +1,176 @@
+"""
+Timing spans and in-process latency histograms.
+
+    with trace('prediction'):
+        with span('prediction.prepare_features'):
+            ...
+
+Every span adds its duration to the histogram of its name. Histograms use
+fixed, log-spaced millisecond buckets, so recording is a bisect and a few
+additions under a lock. They are per worker process and are exposed at
+/api/metrics/.
+
+A trace groups the spans of one request on the current thread. A sample
+of traces (ML_TRACE_SAMPLE_RATE) is logged at INFO as one structured line
+with every stage's time and any attached details (such as the feature
+vector). That replaces per-call logging, which costs real time at volume.
+"""
+import bisect
+import functools
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Upper bucket edges in milliseconds; the last bucket is unbounded
+BUCKET_EDGES_MS = (
+    0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000,
+)
+
+
+class Histogram:
+    """Latency histogram with fixed buckets, plus count, sum, min and max."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.buckets = [0] * (len(BUCKET_EDGES_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.min_ms = None
+        self.max_ms = 0.0
+
+    def record(self, milliseconds):
+        index = bisect.bisect_left(BUCKET_EDGES_MS, milliseconds)
+        with self._lock:
+            self.buckets[index] += 1
+            self.count += 1
+            self.total_ms += milliseconds
+            self.min_ms = milliseconds if self.min_ms is None else min(self.min_ms, milliseconds)
+            self.max_ms = max(self.max_ms, milliseconds)
+
+    def _quantile(self, buckets, count, q):
+        """Upper edge of the bucket holding the q-quantile (max for the open bucket)."""
+        rank = q * count
+        seen = 0
+        for index, bucket_count in enumerate(buckets):
+            seen += bucket_count
+            if seen >= rank and bucket_count:
+                return BUCKET_EDGES_MS[index] if index < len(BUCKET_EDGES_MS) else None
+        return None
+
+    def summary(self):
+        with self._lock:
+            buckets, count = list(self.buckets), self.count
+            total_ms, min_ms, max_ms = self.total_ms, self.min_ms, self.max_ms
+        if not count:
+            return {'count': 0}
+        quantiles = {}
+        for name, q in (('p50_ms', 0.5), ('p90_ms', 0.9), ('p99_ms', 0.99)):
+            edge = self._quantile(buckets, count, q)
+            quantiles[name] = min(edge, max_ms) if edge is not None else round(max_ms, 3)
+        return {
+            'count': count,
+            'mean_ms': round(total_ms / count, 3),
+            'min_ms': round(min_ms, 3),
+            'max_ms': round(max_ms, 3),
+            **quantiles,
+            'buckets': {
+                (f'le_{edge}' if index < len(BUCKET_EDGES_MS) else 'inf'): bucket_count
+                for index, (edge, bucket_count) in enumerate(zip((*BUCKET_EDGES_MS, None), buckets))
+                if bucket_count
+            },
+        }
+
+
+_histograms = {}
+_histograms_lock = threading.Lock()
+_local = threading.local()
+
+
+def histogram(name):
+    found = _histograms.get(name)
+    if found is None:
+        with _histograms_lock:
+            found = _histograms.setdefault(name, Histogram())
+    return found
+
+
+def record(name, milliseconds):
+    """Add one duration to histogram `name` and to the current trace, if any."""
+    histogram(name).record(milliseconds)
+    current = getattr(_local, 'trace', None)
+    if current is not None:
+        current['spans'].append((name, milliseconds))
+
+
+@contextmanager
+def span(name):
+    """Time the block into histogram `name` (also when it raises)."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, (time.perf_counter() - started) * 1000)
+
+
+def annotate(**details):
+    """Attach details to the current trace; they are only formatted if it is sampled."""
+    current = getattr(_local, 'trace', None)
+    if current is not None:
+        current['details'].update(details)
+
+
+@contextmanager
+def trace(name):
+    """
+    Span `name` that also collects the spans inside it on this thread and,
+    for a sample of calls, logs them as one line.
+    """
+    outer = getattr(_local, 'trace', None)
+    if outer is not None:
+        # Nested traces are plain spans of the outer one
+        with span(name):
+            yield
+        return
+
+    _local.trace = {'spans': [], 'details': {}}
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = (time.perf_counter() - started) * 1000
+        current, _local.trace = _local.trace, None
+        histogram(name).record(elapsed)
+        rate = getattr(settings, 'ML_TRACE_SAMPLE_RATE', 0.01)
+        if rate > 0 and random.random() < rate and logger.isEnabledFor(logging.INFO):
+            stages = ' '.join(f'{stage}={ms:.3f}ms' for stage, ms in current['spans'])
+            details = ' '.join(f'{key}={value}' for key, value in current['details'].items())
+            logger.info(f"trace {name} total={elapsed:.3f}ms {stages} {details}".rstrip())
+
+
+def traced(name):
+    """Decorator running the function inside trace(name)."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with trace(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def timings():
+    """Summaries of every histogram, by span name."""
+    with _histograms_lock:
+        items = sorted(_histograms.items())
+    return {name: found.summary() for name, found in items}
+
+
+def reset_timings():
+    with _histograms_lock:
+        _histograms.clear()
@@ -0,0 +1,276 @@
+"""
+Flat-array inference engine for the tree-ensemble heart-risk model.
+
+sklearn's predict_proba pays input validation, joblib dispatch and one
+Cython call per tree on every request, which dominates single-row latency
+for the 400-tree forest and the 350-stage boosting model. `compile_model`
+flattens the fitted StandardScaler and every tree into a handful of
+contiguous NumPy arrays; `CompiledModel.predict_proba` then walks all trees
+of an ensemble at once, one vectorized step per tree level.
+
+The evaluator repeats sklearn's floating-point operations in sklearn's
+order (float32 inputs to the trees, per-leaf class fractions, sequential
+accumulation over trees and stages, expit of the boosting raw score,
+np.average over the voting members), so the probabilities are identical to
+predict_proba with n_jobs=1. A threaded forest (n_jobs > 1) accumulates its
+trees in a nondeterministic order and can itself differ in the last bit.
+
+Supported: StandardScaler (or none) in front of a RandomForest/ExtraTrees
+classifier, a DecisionTreeClassifier, a binary GradientBoostingClassifier,
+or a soft-voting VotingClassifier over those. Anything else raises
+UnsupportedModelError and callers keep using sklearn.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+from scipy.special import expit
+
+COMPILED_FILE = 'compiled_model.joblib'
+ENGINE_VERSION = 1
+
+# Forest leaves hold the positive-class fraction, boosting leaves hold
+# learning_rate * leaf value
+FOREST = 'forest'
+BOOSTING = 'boosting'
+
+
+class UnsupportedModelError(ValueError):
+    """The model (or one of its parts) cannot be compiled."""
+
+
+@dataclass
+class TreeBlock:
+    """
+    All trees of one ensemble as flat node arrays. Node indices are global
+    (offset into the block); leaves point at themselves with an infinite
+    threshold, so every tree can be advanced `depth` times without masking.
+    """
+    kind: str
+    roots: np.ndarray       # int64 (n_trees,)
+    feature: np.ndarray     # int64 (n_nodes,)
+    threshold: np.ndarray   # float64 (n_nodes,)
+    left: np.ndarray        # int64 (n_nodes,)
+    right: np.ndarray       # int64 (n_nodes,)
+    value: np.ndarray       # float64 (n_nodes,), meaningful on leaves
+    depth: int
+    init: float = 0.0       # Boosting: raw score of the init estimator
+
+    def leaves(self, X32):
+        """Leaf value of every tree for every row: shape (n_trees, n_rows)."""
+        n_rows = X32.shape[0]
+        nodes = np.repeat(self.roots[:, np.newaxis], n_rows, axis=1)
+        rows = np.arange(n_rows)[np.newaxis, :]
+        for _ in range(self.depth):
+            go_left = X32[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return self.value[nodes]
+
+    def predict_proba(self, X32):
+        """Positive-class probability per row, as sklearn computes it."""
+        leaf_values = self.leaves(X32)
+        if self.kind == FOREST:
+            # ForestClassifier: zeros, += each tree in order, /= n_trees
+            # (cumsum is a strictly sequential sum)
+            return np.cumsum(leaf_values, axis=0)[-1] / len(self.roots)
+        # predict_stages: raw = init; raw += learning_rate * value per stage
+        raw = np.vstack([np.full((1, X32.shape[0]), self.init), leaf_values])
+        return expit(np.cumsum(raw, axis=0)[-1])
+
+
+@dataclass
+class CompiledModel:
+    """A compiled scaler + model; predict_proba takes unscaled features."""
+    n_features: int
+    mean: np.ndarray         # float64 (n_features,) or None
+    scale: np.ndarray        # float64 (n_features,) or None
+    blocks: list             # [TreeBlock]
+    weights: np.ndarray      # Voting weights, or None for a plain average
+    voting: bool
+    version: int = ENGINE_VERSION
+
+    def predict_proba(self, features):
+        """Positive-class probabilities for a (n, n_features) matrix."""
+        X = np.asarray(features, dtype=np.float64)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"Compiled model expects {self.n_features} features, got shape {X.shape}")
+        if np.isnan(X).any():
+            # sklearn routes NaNs per split; the flat arrays do not record that
+            raise ValueError("Compiled model cannot score rows with missing values")
+        # StandardScaler.transform: X -= mean_; X /= scale_
+        if self.mean is not None:
+            X = X - self.mean
+        if self.scale is not None:
+            X = X / self.scale
+        # Trees see float32 inputs (sklearn's DTYPE), compared against float64 thresholds
+        X32 = X.astype(np.float32)
+        probabilities = [block.predict_proba(X32) for block in self.blocks]
+        if not self.voting:
+            return probabilities[0]
+        return np.average(np.asarray(probabilities), axis=0, weights=self.weights)
+
+
+def _sklearn_stores_fractions():
+    import sklearn
+    major, minor = (int(part) for part in sklearn.__version__.split('.')[:2])
+    return (major, minor) >= (1, 4)
+
+
+def _tree_depth(tree):
+    return max(int(tree.max_depth), 1)
+
+
+def _flatten(trees, kind, leaf_values):
+    """TreeBlock from sklearn Tree objects and a per-tree leaf value function."""
+    roots, features, thresholds, lefts, rights, values = [], [], [], [], [], []
+    offset = 0
+    for tree in trees:
+        n_nodes = tree.node_count
+        index = np.arange(n_nodes, dtype=np.int64)
+        left = tree.children_left.astype(np.int64)
+        right = tree.children_right.astype(np.int64)
+        is_leaf = left == -1
+        feature = np.where(is_leaf, 0, tree.feature).astype(np.int64)
+        threshold = np.where(is_leaf, np.inf, tree.threshold).astype(np.float64)
+
+        roots.append(offset)
+        features.append(feature)
+        thresholds.append(threshold)
+        lefts.append(np.where(is_leaf, index, left) + offset)
+        rights.append(np.where(is_leaf, index, right) + offset)
+        values.append(np.where(is_leaf, leaf_values(tree), 0.0))
+        offset += n_nodes
+
+    return TreeBlock(
+        kind=kind,
+        roots=np.asarray(roots, dtype=np.int64),
+        feature=np.concatenate(features),
+        threshold=np.concatenate(thresholds),
+        left=np.concatenate(lefts),
+        right=np.concatenate(rights),
+        value=np.concatenate(values),
+        depth=max(_tree_depth(tree) for tree in trees),
+    )
+
+
+def _check_binary(estimator):
+    classes = getattr(estimator, 'classes_', None)
+    if classes is None or len(classes) != 2:
+        raise UnsupportedModelError(f"{type(estimator).__name__} is not a fitted binary classifier")
+    if getattr(estimator, 'n_outputs_', 1) != 1:
+        raise UnsupportedModelError(f"{type(estimator).__name__} has more than one output")
+
+
+def _class_fraction(tree):
+    # DecisionTreeClassifier.predict_proba: since sklearn 1.4 tree_.value
+    # already holds class fractions; older versions divide counts by their sum
+    value = tree.value[:, 0, :2]
+    if _sklearn_stores_fractions():
+        return value[:, 1].copy()
+    normalizer = value.sum(axis=1)
+    normalizer[normalizer == 0.0] = 1.0
+    return value[:, 1] / normalizer
+
+
+def _compile_forest(estimator):
+    _check_binary(estimator)
+    return _flatten([tree.tree_ for tree in estimator.estimators_], FOREST, _class_fraction)
+
+
+def _compile_decision_tree(estimator):
+    _check_binary(estimator)
+    return _flatten([estimator.tree_], FOREST, _class_fraction)
+
+
+def _compile_boosting(estimator):
+    _check_binary(estimator)
+    if estimator.estimators_.shape[1] != 1:
+        raise UnsupportedModelError("Only binary GradientBoostingClassifier models are supported")
+    learning_rate = estimator.learning_rate
+    trees = [stage[0].tree_ for stage in estimator.estimators_]
+    block = _flatten(trees, BOOSTING, lambda tree: learning_rate * tree.value[:, 0, 0])
+
+    # The init estimator (a class prior by default) gives a constant raw score
+    if estimator.init_ == 'zero':
+        block.init = 0.0
+    else:
+        from sklearn.dummy import DummyClassifier
+        if not isinstance(estimator.init_, DummyClassifier):
+            raise UnsupportedModelError("Only prior or zero init estimators are supported")
+        probe = np.zeros((1, estimator.n_features_in_), dtype=np.float32)
+        block.init = float(estimator._raw_predict_init(probe)[0, 0])
+    return block
+
+
+def _compile_estimator(estimator):
+    from sklearn.ensemble import (
+        ExtraTreesClassifier, GradientBoostingClassifier, RandomForestClassifier,
+    )
+    from sklearn.tree import DecisionTreeClassifier
+
+    if isinstance(estimator, (RandomForestClassifier, ExtraTreesClassifier)):
+        return _compile_forest(estimator)
+    if isinstance(estimator, GradientBoostingClassifier):
+        return _compile_boosting(estimator)
+    if isinstance(estimator, DecisionTreeClassifier):
+        return _compile_decision_tree(estimator)
+    raise UnsupportedModelError(f"Cannot compile {type(estimator).__name__}")
+
+
+def compile_model(model, scaler=None):
+    """
+    CompiledModel equivalent to `model.predict_proba(scaler.transform(X))[:, 1]`.
+    Raises UnsupportedModelError for models the engine cannot evaluate.
+    """
+    from sklearn.ensemble import VotingClassifier
+    from sklearn.preprocessing import StandardScaler
+
+    mean = scale = None
+    if scaler is not None:
+        if not isinstance(scaler, StandardScaler):
+            raise UnsupportedModelError(f"Cannot compile scaler {type(scaler).__name__}")
+        if scaler.mean_ is not None:
+            mean = np.array(scaler.mean_, dtype=np.float64)
+        if scaler.scale_ is not None:
+            scale = np.array(scaler.scale_, dtype=np.float64)
+
+    if isinstance(model, VotingClassifier):
+        if model.voting != 'soft':
+            raise UnsupportedModelError("Only soft-voting ensembles have probabilities")
+        _check_binary(model)
+        blocks = [_compile_estimator(estimator) for estimator in model.estimators_]
+        weights = model._weights_not_none
+        weights = None if weights is None else np.asarray(weights, dtype=np.float64)
+        voting = True
+    else:
+        blocks = [_compile_estimator(model)]
+        weights = None
+        voting = False
+
+    return CompiledModel(
+        n_features=int(model.n_features_in_),
+        mean=mean,
+        scale=scale,
+        blocks=blocks,
+        weights=weights,
+        voting=voting,
+    )
+
+
+def probe_features(compiled, n=64, seed=0):
+    """Deterministic rows spread around the training distribution, for equivalence checks."""
+    rng = np.random.default_rng(seed)
+    sample = rng.standard_normal((n, compiled.n_features))
+    mean = compiled.mean if compiled.mean is not None else 0.0
+    scale = compiled.scale if compiled.scale is not None else 1.0
+    return mean + sample * scale
+
+
+def matches(compiled, model, scaler=None, features=None, rtol=0.0):
+    """Whether the compiled model reproduces sklearn's probabilities on `features` (default: probe rows)."""
+    features = probe_features(compiled) if features is None else features
+    scaled = scaler.transform(features) if scaler is not None else features
+    expected = model.predict_proba(scaled)[:, 1]
+    actual = compiled.predict_proba(features)
+    if rtol:
+        return bool(np.allclose(actual, expected, rtol=rtol, atol=0.0))
+    return bool(np.array_equal(actual, expected))
@@ -1,6 +1,8 @@
 from django.urls import path
 from .views import (
     healthcheck,
+    readiness,
+    latency_metrics,
     CoffeeViewSet,
     OriginView,
     FileUploadView,
@@ -15,6 +17,8 @@ from .views import (
     get_my_recipes,
     toggle_privacy,
     most_popular_recipes,
+    search_recipes,
+    bulk_coffees,
     challenge_list,
     respond_to_challenge,
     submit_recipe,
@@ -26,15 +30,21 @@ from .views import (
     add_custom_consumed_coffee,
     remove_consumed_coffee,
     get_consumed_coffees,
+    caffeine_timeline_view,
     health_profile,
     add_blood_pressure,
     get_blood_pressure_entries,
     generate_prediction,
+    generate_prediction_batch,
+    simulate_prediction,
+    prediction_metrics,
 )
 
 urlpatterns = [
     # Health check
     path('healthcheck/', healthcheck, name='healthcheck'),
+    path('readiness/', readiness, name='readiness'),
+    path('metrics/', latency_metrics, name='metrics'),
 
     # Coffee CRUD
     path('',          CoffeeViewSet.as_view(), name='coffee-list'),
@@ -74,6 +84,12 @@ urlpatterns = [
     # Privacy
     path('privacy/<int:coffee_id>/', toggle_privacy, name='toggle-privacy'),
     
+    # Search
+    path('search/', search_recipes, name='search-recipes'),
+
+    # Batched create / update / delete
+    path('bulk/', bulk_coffees, name='bulk-coffees'),
+
     # Most popular recipes
     path('most-popular/', most_popular_recipes, name='most-popular-recipes'),
     
@@ -91,6 +107,7 @@ urlpatterns = [
     path('consumed/custom/', add_custom_consumed_coffee, name='add-custom-consumed-coffee'),
     path('consumed/remove/<int:consumed_id>/', remove_consumed_coffee, name='remove-consumed-coffee'),
     path('consumed/', get_consumed_coffees, name='get-consumed-coffees'),
+    path('consumed/timeline/', caffeine_timeline_view, name='caffeine-timeline'),
     
     # Health profile
     path('health-profile/', health_profile, name='health-profile'),
@@ -99,4 +116,7 @@ urlpatterns = [
     
     # Prediction
     path('prediction/', generate_prediction, name='generate-prediction'),
+    path('prediction/simulate/', simulate_prediction, name='simulate-prediction'),
+    path('prediction/batch/', generate_prediction_batch, name='generate-prediction-batch'),
+    path('prediction/metrics/', prediction_metrics, name='prediction-metrics'),
 ]
@@ -1,9 +1,11 @@
+import math
 import os
 from django.conf import settings
 from django.shortcuts import get_object_or_404
 from django.contrib.auth.models import User
 from django.utils import timezone
-from django.db import models
+from django.utils.dateparse import parse_date, parse_datetime
+from django.db import models, transaction
 
 from rest_framework import status
 from rest_framework.views import APIView
@@ -37,6 +39,16 @@ from .serializers import (
     UserHealthProfileSerializer,
     BloodPressureEntrySerializer,
 )
+from .cache import get_or_build_payload, overlay_user_fields
+from .conditional import catalogue_validators, conditional_get, not_modified, set_validators
+from .pagination import CoffeeCursorPagination, ConsumedCursorPagination, FavoritesCursorPagination
+from .search import search_coffees
+from .batching import expects_prediction
+from .bulk import MAX_BULK_OPERATIONS, BulkValidationError, apply_bulk_operations
+from .origins import resolve_origin
+from .rollups import caffeine_totals
+from .timing import span, timings, reset_timings, traced
+from .leaderboard import WINDOWS as LEADERBOARD_WINDOWS, top_coffee_ids
 from .models.operations import Operation
 from .models.user import User
 from django.contrib.auth.models import User as AuthUser
@@ -48,6 +60,24 @@ def healthcheck(request):
     return Response({"status": "ok"})
 
 
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def readiness(request):
+    """
+    Readiness probe: 503 until the risk model is loaded when it is preloaded
+    at startup (ML_PRELOAD_MODEL); with lazy loading the model state is only
+    reported.
+    """
+    from .ml_model_utils import model_status
+
+    model = model_status()
+    ready = model['loaded'] or not settings.ML_PRELOAD_MODEL
+    return Response(
+        {'status': 'ready' if ready else 'loading', 'model': model},
+        status=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE
+    )
+
+
 class RegisterView(APIView):
     permission_classes = [AllowAny]
 
@@ -111,6 +141,58 @@ def log_coffee_operation(user, operation_type, coffee_id=None, coffee_name=None)
         print(f"Failed to log coffee operation: {e}")
 
 
+def _parse_bool_param(value, name):
+    if value.lower() in ('1', 'true', 'yes'):
+        return True
+    if value.lower() in ('0', 'false', 'no'):
+        return False
+    raise ValueError(f"Invalid value for '{name}'. Use true or false")
+
+
+def _parse_float_param(value, name):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid value for '{name}'. Expected a number")
+
+
+def filter_coffee_queryset(qs, params):
+    """
+    Apply the server-side list filters to a Coffee queryset.
+
+    Supported query params:
+    - origin: origin id, or origin name (case-insensitive)
+    - name: name prefix (case-insensitive)
+    - caffeine_min / caffeine_max: inclusive caffeine range in mg
+    - is_community_winner: true / false
+    Raises ValueError for malformed values.
+    """
+    origin = params.get('origin')
+    if origin:
+        if origin.isdigit():
+            qs = qs.filter(origin_id=int(origin))
+        else:
+            qs = qs.filter(origin__name__iexact=origin)
+
+    name = params.get('name')
+    if name:
+        qs = qs.filter(name__istartswith=name)
+
+    caffeine_min = params.get('caffeine_min')
+    if caffeine_min:
+        qs = qs.filter(caffeine_mg__gte=_parse_float_param(caffeine_min, 'caffeine_min'))
+
+    caffeine_max = params.get('caffeine_max')
+    if caffeine_max:
+        qs = qs.filter(caffeine_mg__lte=_parse_float_param(caffeine_max, 'caffeine_max'))
+
+    is_community_winner = params.get('is_community_winner')
+    if is_community_winner:
+        qs = qs.filter(is_community_winner=_parse_bool_param(is_community_winner, 'is_community_winner'))
+
+    return qs
+
+
 class CoffeeViewSet(APIView):
     permission_classes = [IsAuthenticatedOrReadOnly]
 
@@ -122,14 +204,40 @@ class CoffeeViewSet(APIView):
                     {'error': 'Coffee not found'},
                     status=status.HTTP_404_NOT_FOUND
                 )
+            etag, last_modified = catalogue_validators(
+                request, 'coffee-detail', extra=(coffee.updated_at.isoformat(),)
+            )
+            last_modified = max(last_modified, int(coffee.updated_at.timestamp()))
+            response = not_modified(request, etag, last_modified)
+            if response is not None:
+                return response
             serializer = CoffeeSerializer(coffee, context={'request': request})
-            return Response(serializer.data)
-        else:
-            qs = Coffee.objects.select_related('origin', 'user').all()
-            qs = qs.filter(is_private=False)
-            
-        serializer = CoffeeSerializer(qs, many=True, context={'request': request})
-        return Response(serializer.data)
+            return set_validators(Response(serializer.data), etag, last_modified)
+
+        qs = Coffee.objects.filter(is_private=False)
+        try:
+            qs = filter_coffee_queryset(qs, request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Like writes bump the catalogue version, so it also covers is_liked
+        etag, last_modified = catalogue_validators(request, 'coffee-list')
+        response = not_modified(request, etag, last_modified)
+        if response is not None:
+            return response
+
+        def build():
+            # Shared payload: built for an anonymous viewer, is_liked is overlaid below
+            paginator = CoffeeCursorPagination()
+            page = paginator.paginate_queryset(
+                CoffeeSerializer.prepare_queryset(qs, request), request, view=self
+            )
+            serializer = CoffeeSerializer(page, many=True, context={'request': request})
+            return paginator.get_paginated_response(serializer.data).data
+
+        payload = get_or_build_payload('coffee-list', request, build)
+        overlay_user_fields(payload['results'], request)
+        return set_validators(Response(payload), etag, last_modified)
 
     def post(self, request, pk=None):
         if not request.user.is_authenticated:
@@ -199,9 +307,11 @@ class OriginView(APIView):
     permission_classes = [AllowAny]
 
     def get(self, request):
-        origins = Origin.objects.all()
-        serializer = OriginSerializer(origins, many=True)
-        return Response(serializer.data)
+        def build():
+            origins = Origin.objects.all()
+            return OriginSerializer(origins, many=True).data
+
+        return Response(get_or_build_payload('origins', request, build))
 
 
 class FileUploadView(APIView):
@@ -406,23 +516,86 @@ def generate_ai_recipe(request):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@conditional_get('my-recipes', user_counters=('likes_version',))
 def get_my_recipes(request):
-    """Get all recipes owned by the current user (including private ones), ordered by creation date (newest first)"""
+    """Get the recipes owned by the current user (including private ones), newest first, cursor-paginated"""
     # Get all recipes owned by the user, including private ones
-    # Order by id (descending) to show newest recipes first (most recently created)
-    user_recipes = Coffee.objects.filter(user=request.user).select_related('origin', 'user').order_by('-id')
-    serializer = CoffeeSerializer(user_recipes, many=True, context={'request': request})
-    return Response(serializer.data)
+    # The paginator orders by id (descending) to show newest recipes first
+    user_recipes = CoffeeSerializer.prepare_queryset(
+        Coffee.objects.filter(user=request.user), request, request.user
+    )
+    paginator = CoffeeCursorPagination()
+    page = paginator.paginate_queryset(user_recipes, request)
+    serializer = CoffeeSerializer(page, many=True, context={'request': request})
+    return paginator.get_paginated_response(serializer.data)
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@conditional_get('favorites', user_counters=('likes_version',))
 def get_favorites(request):
-    """Get all favorite coffees for the current user"""
+    """Get the current user's favorite coffees, most recently liked first, cursor-paginated"""
     # Include private recipes in favorites (user's own favorites)
-    liked_coffees = Coffee.objects.filter(likes__user=request.user).distinct()
-    serializer = CoffeeSerializer(liked_coffees, many=True, context={'request': request})
-    return Response(serializer.data)
+    # A user likes a coffee at most once, so the join needs no DISTINCT
+    liked_coffees = CoffeeSerializer.prepare_queryset(
+        Coffee.objects.filter(likes__user=request.user).annotate(liked_at=models.F('likes__created_at')),
+        request,
+        request.user
+    )
+    paginator = FavoritesCursorPagination()
+    page = paginator.paginate_queryset(liked_coffees, request)
+    serializer = CoffeeSerializer(page, many=True, context={'request': request})
+    return paginator.get_paginated_response(serializer.data)
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def search_recipes(request):
+    """Search recipes by name, description and origin (?q=, optional ?limit=)"""
+    query = request.query_params.get('q', '').strip()
+    try:
+        limit = int(request.query_params.get('limit', 20))
+    except ValueError:
+        return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    limit = max(1, min(limit, 100))
+
+    hits = search_coffees(query, request.user, limit=limit) if query else []
+    scores = dict(hits)
+    coffees = CoffeeSerializer.prepare_queryset(
+        Coffee.objects.filter(pk__in=scores), request, request.user
+    ).in_bulk()
+    results = []
+    for coffee_id, score in hits:
+        if coffee_id in coffees:
+            item = CoffeeSerializer(coffees[coffee_id], context={'request': request}).data
+            item['score'] = float(score)
+            results.append(item)
+    return Response({'query': query, 'results': results})
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def bulk_coffees(request):
+    """
+    Create, update and delete coffees in one request (see coffee/bulk.py).
+    Body: a list of operations, or {"operations": [...]}. All or nothing.
+    """
+    operations = request.data
+    if isinstance(operations, dict):
+        operations = operations.get('operations')
+    if not isinstance(operations, list) or not operations:
+        return Response({'error': 'Expected a non-empty list of operations'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(operations) > MAX_BULK_OPERATIONS:
+        return Response(
+            {'error': f'At most {MAX_BULK_OPERATIONS} operations per request'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        results = apply_bulk_operations(operations, request)
+    except BulkValidationError as e:
+        return Response({'results': e.results}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({'results': results})
 
 
 @api_view(['POST'])
@@ -455,57 +628,79 @@ def toggle_like(request, coffee_id):
     except Coffee.DoesNotExist:
         return Response({'error': 'Coffee not found'}, status=status.HTTP_404_NOT_FOUND)
     
-    like, created = Like.objects.get_or_create(user=request.user, coffee=coffee)
-    
-    if not created:
-        # Like already exists, so unlike it
-        like.delete()
-        liked = False
-    else:
-        # New like created
-        liked = True
-    
+    with transaction.atomic():
+        like, created = Like.objects.get_or_create(user=request.user, coffee=coffee)
+
+        if not created:
+            # Like already exists, so unlike it
+            like.delete()
+            liked = False
+        else:
+            # New like created
+            liked = True
+
+        # like_count was adjusted by the Like signals in this transaction
+        likes_count = Coffee.objects.filter(pk=coffee.pk).values_list('like_count', flat=True).get()
+
     return Response({
         'liked': liked,
-        'likes_count': coffee.likes_count
+        'likes_count': likes_count
     }, status=status.HTTP_200_OK)
 
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def most_popular_recipes(request):
-    """Get the 3 most liked coffee recipes (excluding private recipes)"""
-    # Filter out private recipes (unless owned by current user)
-    base_qs = Coffee.objects.all()
-    if request.user.is_authenticated:
-        base_qs = base_qs.filter(
-            models.Q(is_private=False) | models.Q(user=request.user)
+    """
+    Get the most liked coffee recipes (excluding private recipes).
+
+    ?window=all (default), day or week ranks by all-time or trending likes;
+    ?limit= sets the number of recipes (default 3, at most 50).
+    """
+    window = request.query_params.get('window', 'all')
+    if window not in LEADERBOARD_WINDOWS:
+        return Response(
+            {'error': f"window must be one of: {', '.join(LEADERBOARD_WINDOWS)}"},
+            status=status.HTTP_400_BAD_REQUEST
         )
+    try:
+        limit = int(request.query_params.get('limit', 3))
+    except ValueError:
+        return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    limit = max(1, min(limit, 50))
+
+    # Recipe owners also see their own private recipes, so their ranking can't be shared
+    has_private = (
+        request.user.is_authenticated
+        and Coffee.objects.filter(user=request.user, is_private=True).exists()
+    )
+    if has_private:
+        data = _most_popular_payload(request, window, limit, owner=request.user)
     else:
-        base_qs = base_qs.filter(is_private=False)
-    
-    # Get top 3 coffees by likes count, with a minimum of 1 like
-    popular_coffees = base_qs.annotate(
-        total_likes=models.Count('likes')
-    ).filter(
-        total_likes__gt=0
-    ).order_by('-total_likes')[:3]
-    
-    # If we don't have 3 liked recipes, fill with most recent recipes
-    if len(popular_coffees) < 3:
-        remaining_count = 3 - len(popular_coffees)
-        popular_ids = [coffee.id for coffee in popular_coffees]
-        
-        # Get most recent recipes that aren't already in popular list
-        recent_coffees = base_qs.exclude(
-            id__in=popular_ids
-        ).order_by('-id')[:remaining_count]
-        
-        # Combine popular and recent
-        popular_coffees = list(popular_coffees) + list(recent_coffees)
-    
+        data = get_or_build_payload(
+            'most-popular', request, lambda: _most_popular_payload(request, window, limit)
+        )
+    return Response(overlay_user_fields(data, request))
+
+
+def _most_popular_payload(request, window, limit, owner=None):
+    # Filter out private recipes (unless owned by current user)
+    visible = Coffee.objects.filter(is_private=False)
+    if owner is not None:
+        visible = Coffee.objects.filter(models.Q(is_private=False) | models.Q(user=owner))
+
+    # Top recipes with at least 1 like, read from the leaderboard in O(limit)
+    coffee_ids = top_coffee_ids(window, limit, owner=owner)
+
+    # If we don't have enough liked recipes, fill with most recent recipes
+    if len(coffee_ids) < limit:
+        recent_ids = visible.exclude(id__in=coffee_ids).order_by('-id').values_list('id', flat=True)
+        coffee_ids += list(recent_ids[:limit - len(coffee_ids)])
+
+    coffees = CoffeeSerializer.prepare_queryset(Coffee.objects.filter(pk__in=coffee_ids), request).in_bulk()
+    popular_coffees = [coffees[coffee_id] for coffee_id in coffee_ids if coffee_id in coffees]
     serializer = CoffeeSerializer(popular_coffees, many=True, context={'request': request})
-    return Response(serializer.data)
+    return serializer.data
 
 
 # Challenge System Views
@@ -515,9 +710,9 @@ def most_popular_recipes(request):
 def challenge_list(request):
     """Get all challenges or create a new challenge"""
     if request.method == 'GET':
-        challenges = Challenge.objects.select_related(
-            'challenger', 'challenged', 'winner'
-        ).prefetch_related('recipes', 'votes').all().order_by('-created_at')
+        challenges = ChallengeSerializer.prepare_queryset(
+            Challenge.objects.all(), request
+        ).order_by('-created_at')
         
         serializer = ChallengeSerializer(challenges, many=True, context={'request': request})
         return Response(serializer.data)
@@ -777,8 +972,9 @@ def vote_challenge(request, challenge_id):
         
         # Create likes from all the voters who voted for this winner
         winning_votes = Vote.objects.filter(challenge=challenge, voted_for=winner)
-        for vote in winning_votes:
-            Like.objects.create(coffee=new_coffee, user=vote.voter)
+        with transaction.atomic():
+            for vote in winning_votes:
+                Like.objects.create(coffee=new_coffee, user=vote.voter)
         
         # Create notifications
         Notification.objects.create(
@@ -924,7 +1120,7 @@ def add_custom_consumed_coffee(request):
     grams = request.data.get('grams')
     coffee_type = request.data.get('coffee_type', name)  # Use name as fallback for coffee type
     
-    if not name or not origin_name:
+    if not name or not origin_name or not str(origin_name).strip():
         return Response(
             {'error': 'Name and origin are required'},
             status=status.HTTP_400_BAD_REQUEST
@@ -959,16 +1155,17 @@ def add_custom_consumed_coffee(request):
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    # Get or create origin
-    origin, _ = Origin.objects.get_or_create(name=origin_name)
+    # Resolve (or create) the origin from the in-process registry
+    origin = resolve_origin(str(origin_name))
     
-    # Create coffee with custom caffeine
+    # Create coffee with custom caffeine (no estimate version: keep the value as entered)
     coffee = Coffee.objects.create(
         name=name,
         origin=origin,
         description=description,
         user=request.user,
-        caffeine_mg=caffeine_mg
+        caffeine_mg=caffeine_mg,
+        caffeine_estimate_version=None
     )
     
     # Add to consumed list
@@ -993,42 +1190,126 @@ def remove_consumed_coffee(request, consumed_id):
         return Response({'error': 'Consumed coffee not found'}, status=status.HTTP_404_NOT_FOUND)
 
 
+def _consumption_buckets(now):
+    """History buckets as {name: (start, end)}; `end` is exclusive, None if open."""
+    from datetime import timedelta
+
+    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    return {
+        'today': (today_start, None),
+        'yesterday': (today_start - timedelta(days=1), today_start),
+        'last_7_days': (today_start - timedelta(days=7), today_start),
+        'last_month': (today_start - timedelta(days=30), today_start),
+        'last_year': (today_start - timedelta(days=365), today_start),
+    }
+
+
+def _consumed_range(start, end):
+    condition = models.Q(consumed_at__gte=start)
+    if end is not None:
+        condition &= models.Q(consumed_at__lt=end)
+    return condition
+
+
+def _parse_moment_param(value, name):
+    """An ISO date (start of that day) or datetime query parameter."""
+    from datetime import datetime, time
+
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"Invalid value for '{name}': expected an ISO date or datetime")
+        moment = datetime.combine(day, time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@conditional_get(
+    'consumed',
+    user_counters=('likes_version', 'consumption_version'),
+    # Entries move between the day-relative buckets as time passes
+    extra=lambda request: (timezone.now().date().isoformat(),)
+)
 def get_consumed_coffees(request):
-    """Get consumed coffees organized by time periods"""
-    from datetime import datetime, timedelta
-    
-    now = timezone.now()
-    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-    yesterday_start = today_start - timedelta(days=1)
-    week_ago = today_start - timedelta(days=7)
-    month_ago = today_start - timedelta(days=30)
-    year_ago = today_start - timedelta(days=365)
-    
-    # Get all consumed coffees for user
-    all_consumed = ConsumedCoffee.objects.filter(user=request.user).select_related('coffee').order_by('-consumed_at')
-    
-    # Organize by periods
-    today = [ConsumedCoffeeSerializer(cc, context={'request': request}).data 
-             for cc in all_consumed if cc.consumed_at >= today_start]
-    yesterday = [ConsumedCoffeeSerializer(cc, context={'request': request}).data 
-                 for cc in all_consumed if yesterday_start <= cc.consumed_at < today_start]
-    last_7_days = [ConsumedCoffeeSerializer(cc, context={'request': request}).data 
-                   for cc in all_consumed if cc.consumed_at >= week_ago and cc.consumed_at < today_start]
-    last_month = [ConsumedCoffeeSerializer(cc, context={'request': request}).data 
-                  for cc in all_consumed if cc.consumed_at >= month_ago and cc.consumed_at < today_start]
-    last_year = [ConsumedCoffeeSerializer(cc, context={'request': request}).data
-                 for cc in all_consumed if cc.consumed_at >= year_ago and cc.consumed_at < today_start]
-    
-    return Response({
-        'today': today,
-        'yesterday': yesterday,
-        'last_7_days': last_7_days,
-        'last_month': last_month,
-        'last_year': last_year,
-        'all': ConsumedCoffeeSerializer(all_consumed, many=True, context={'request': request}).data
-    })
+    """
+    Get the user's consumption history, most recent first, cursor-paginated.
+
+    Optional ?bucket= (today, yesterday, last_7_days, last_month, last_year)
+    and ?from=/?to= (ISO date or datetime, `to` exclusive) narrow the rows.
+    Every row is serialized once and tagged with the buckets it falls in;
+    `counts` holds the size of each bucket (and `all`) within ?from=/?to=,
+    computed in a single aggregate query.
+    """
+    buckets = _consumption_buckets(timezone.now())
+    consumed = ConsumedCoffee.objects.filter(user=request.user)
+    try:
+        if request.query_params.get('from'):
+            consumed = consumed.filter(consumed_at__gte=_parse_moment_param(request.query_params['from'], 'from'))
+        if request.query_params.get('to'):
+            consumed = consumed.filter(consumed_at__lt=_parse_moment_param(request.query_params['to'], 'to'))
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    counts = consumed.aggregate(
+        all=models.Count('pk'),
+        **{name: models.Count('pk', filter=_consumed_range(*bounds)) for name, bounds in buckets.items()}
+    )
+
+    bucket = request.query_params.get('bucket')
+    if bucket and bucket != 'all':
+        if bucket not in buckets:
+            return Response(
+                {'error': f"Invalid value for 'bucket': expected one of all, {', '.join(buckets)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        consumed = consumed.filter(_consumed_range(*buckets[bucket]))
+
+    # The nested coffees are rendered in full, whatever ?fields= says for the root
+    consumed = consumed.prefetch_related(
+        models.Prefetch('coffee', queryset=CoffeeSerializer.prepare_queryset(Coffee.objects.all(), user=request.user))
+    )
+    paginator = ConsumedCursorPagination()
+    page = paginator.paginate_queryset(consumed, request)
+    rows = ConsumedCoffeeSerializer(page, many=True, context={'request': request}).data
+    for entry, row in zip(page, rows):
+        row['buckets'] = [
+            name for name, (start, end) in buckets.items()
+            if entry.consumed_at >= start and (end is None or entry.consumed_at < end)
+        ]
+
+    response = paginator.get_paginated_response(rows)
+    response.data['counts'] = counts
+    return response
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def caffeine_timeline_view(request):
+    """
+    Estimated caffeine in the user's bloodstream every 5 minutes over today
+    and the ?days=-1 days before (default 1, at most 30), with the current
+    and peak values. ?half_life_hours= (1-24) overrides the default
+    elimination half-life.
+    """
+    from .caffeine_timeline import MAX_DAYS, caffeine_timeline
+
+    try:
+        days = int(request.query_params.get('days', 1))
+        half_life_hours = request.query_params.get('half_life_hours')
+        half_life_hours = float(half_life_hours) if half_life_hours else None
+    except ValueError:
+        return Response({'error': 'days must be an integer and half_life_hours a number'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    if not 1 <= days <= MAX_DAYS:
+        return Response({'error': f'days must be between 1 and {MAX_DAYS}'}, status=status.HTTP_400_BAD_REQUEST)
+    if half_life_hours is not None and not 1 <= half_life_hours <= 24:
+        return Response({'error': 'half_life_hours must be between 1 and 24'}, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response(caffeine_timeline(request.user, days, half_life_hours))
 
 
 # Health Profile Endpoints
@@ -1075,9 +1356,11 @@ def get_blood_pressure_entries(request):
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@traced('prediction')
+@expects_prediction
 def generate_prediction(request):
     """Generate heart disease risk prediction based on consumed coffees and health profile"""
-    from datetime import datetime, timedelta
+    from datetime import timedelta
     
     period = request.data.get('period', 'week')  # week, month, year
     # Optional BP override for this prediction
@@ -1097,42 +1380,40 @@ def generate_prediction(request):
         return Response({'error': 'Invalid period. Use: week, month, or year'}, 
                        status=status.HTTP_400_BAD_REQUEST)
     
-    # Get consumed coffees in period
-    consumed_coffees = ConsumedCoffee.objects.filter(
-        user=request.user,
-        consumed_at__gte=start_date
-    ).select_related('coffee')
+    # Caffeine consumed in the period, from the daily rollups (one query
+    # covers both the consumption lookup and the sum)
+    with span('prediction.caffeine_totals'):
+        total_caffeine, num_coffees = caffeine_totals(request.user.pk, start_date, now)
     
     # Calculate caffeine features
-    total_caffeine = sum(cc.coffee.get_caffeine_mg() for cc in consumed_coffees)
     avg_daily_caffeine = total_caffeine / max((now - start_date).days, 1)
-    num_coffees = consumed_coffees.count()
-    
-    # Get health profile
-    try:
-        health_profile = request.user.health_profile
-    except UserHealthProfile.DoesNotExist:
-        health_profile = None
     
-    # Get latest BP (use override if provided, otherwise latest entry)
-    bp_entry = None
-    if systolic and diastolic:
-        # Use provided BP
-        bp_entry = {
-            'systolic': systolic,
-            'diastolic': diastolic,
-            'pulse': pulse
-        }
-    else:
-        # Get latest BP entry
-        latest_bp = BloodPressureEntry.objects.filter(user=request.user).order_by('-measured_at').first()
-        if latest_bp:
+    with span('prediction.profile_bp_lookup'):
+        # Get health profile
+        try:
+            health_profile = request.user.health_profile
+        except UserHealthProfile.DoesNotExist:
+            health_profile = None
+
+        # Get latest BP (use override if provided, otherwise latest entry)
+        bp_entry = None
+        if systolic and diastolic:
+            # Use provided BP
             bp_entry = {
-                'systolic': latest_bp.systolic,
-                'diastolic': latest_bp.diastolic,
-                'pulse': latest_bp.pulse,
-                'measured_at': latest_bp.measured_at
+                'systolic': systolic,
+                'diastolic': diastolic,
+                'pulse': pulse
             }
+        else:
+            # Get latest BP entry
+            latest_bp = BloodPressureEntry.objects.filter(user=request.user).order_by('-measured_at').first()
+            if latest_bp:
+                bp_entry = {
+                    'systolic': latest_bp.systolic,
+                    'diastolic': latest_bp.diastolic,
+                    'pulse': latest_bp.pulse,
+                    'measured_at': latest_bp.measured_at
+                }
     
     # Use ML model for prediction
     from .ml_model_utils import predict_heart_disease_risk
@@ -1168,68 +1449,252 @@ def generate_prediction(request):
         if not health_profile.weight_kg:
             missing_fields.append('weight_kg')
     
-    # Calculate risk factors breakdown for charts
-    risk_factors = {}
-    total_risk_points = 0
-    
-    # Caffeine contribution (normalized to percentage)
-    if avg_daily_caffeine > 0:
-        caffeine_risk = min((avg_daily_caffeine / 600) * 100, 100)  # 600mg = very high risk
-        risk_factors['Caffeine Intake'] = round(caffeine_risk, 1)
-        total_risk_points += caffeine_risk
-    
-    # Blood pressure contribution
-    if bp_entry:
-        bp_risk = 0
-        # bp_entry is always a dict in this function
-        systolic = bp_entry.get('systolic')
-        diastolic = bp_entry.get('diastolic')
-        
-        if systolic and diastolic:
-            if systolic >= 140 or diastolic >= 90:
-                bp_risk = 40  # High BP
-            elif systolic >= 130 or diastolic >= 85:
-                bp_risk = 20  # Elevated BP
-            else:
-                bp_risk = 5  # Normal but still a factor
-            risk_factors['Blood Pressure'] = round(bp_risk, 1)
-            total_risk_points += bp_risk
-    
-    # Health profile factors
-    if health_profile:
-        if health_profile.has_family_history_chd:
-            risk_factors['Family History'] = 15
-            total_risk_points += 15
-        if health_profile.has_hypertension:
-            risk_factors['Hypertension'] = 20
-            total_risk_points += 20
-        if health_profile.has_diabetes:
-            risk_factors['Diabetes'] = 15
-            total_risk_points += 15
-        if health_profile.is_smoker:
-            risk_factors['Smoking'] = 25
-            total_risk_points += 25
-        if health_profile.has_high_cholesterol:
-            risk_factors['High Cholesterol'] = 10
-            total_risk_points += 10
-    
-    # Normalize risk factors to percentages
-    if total_risk_points > 0:
-        for factor in risk_factors:
-            risk_factors[factor] = round((risk_factors[factor] / total_risk_points) * 100, 1)
-    
+    with span('prediction.serialize'):
+        # Calculate risk factors breakdown for charts
+        risk_factors = {}
+        total_risk_points = 0
+
+        # Caffeine contribution (normalized to percentage)
+        if avg_daily_caffeine > 0:
+            caffeine_risk = min((avg_daily_caffeine / 600) * 100, 100)  # 600mg = very high risk
+            risk_factors['Caffeine Intake'] = round(caffeine_risk, 1)
+            total_risk_points += caffeine_risk
+
+        # Blood pressure contribution
+        if bp_entry:
+            bp_risk = 0
+            # bp_entry is always a dict in this function
+            systolic = bp_entry.get('systolic')
+            diastolic = bp_entry.get('diastolic')
+
+            if systolic and diastolic:
+                if systolic >= 140 or diastolic >= 90:
+                    bp_risk = 40  # High BP
+                elif systolic >= 130 or diastolic >= 85:
+                    bp_risk = 20  # Elevated BP
+                else:
+                    bp_risk = 5  # Normal but still a factor
+                risk_factors['Blood Pressure'] = round(bp_risk, 1)
+                total_risk_points += bp_risk
+
+        # Health profile factors
+        if health_profile:
+            if health_profile.has_family_history_chd:
+                risk_factors['Family History'] = 15
+                total_risk_points += 15
+            if health_profile.has_hypertension:
+                risk_factors['Hypertension'] = 20
+                total_risk_points += 20
+            if health_profile.has_diabetes:
+                risk_factors['Diabetes'] = 15
+                total_risk_points += 15
+            if health_profile.is_smoker:
+                risk_factors['Smoking'] = 25
+                total_risk_points += 25
+            if health_profile.has_high_cholesterol:
+                risk_factors['High Cholesterol'] = 10
+                total_risk_points += 10
+
+        # Normalize risk factors to percentages
+        if total_risk_points > 0:
+            for factor in risk_factors:
+                risk_factors[factor] = round((risk_factors[factor] / total_risk_points) * 100, 1)
+
+        payload = {
+            'period': period,
+            'risk_probability': round(risk_probability, 3),
+            'risk_percentage': risk_percentage,
+            'risk_category': risk_category,
+            'caffeine_stats': {
+                'total_mg': round(total_caffeine, 2),
+                'avg_daily_mg': round(avg_daily_caffeine, 2),
+                'num_coffees': num_coffees
+            },
+            'used_bp': bp_entry,
+            'risk_factors': risk_factors,
+            'missing_fields': missing_fields,
+            'note': 'This prediction is generated using a trained machine learning model based on your health profile, caffeine consumption, and blood pressure data.'
+        }
+    return Response(payload)
+
+
+# What-if simulation grid: extra cups per day, at mg_per_cup each
+DEFAULT_SIMULATION_CUPS = [0, 1, 2, 3, 4, 5]
+DEFAULT_MG_PER_CUP = 95.0  # A typical brewed cup
+MAX_SIMULATION_POINTS = 200
+SIMULATION_BP_RANGES = (('systolic', 70, 250), ('diastolic', 40, 150))
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def simulate_prediction(request):
+    """
+    Risk curve for drinking more (or fewer) cups a day than now.
+
+    Body: {"period": "week"|"month"|"year", "extra_cups": [0, 1, 2, 5],
+    "mg_per_cup": 95, "systolic": ..., "diastolic": ...}; every field is
+    optional. All grid points are scored in one model call.
+    """
+    from .risk import PERIOD_DAYS, simulate_caffeine
+
+    period = request.data.get('period', 'week')
+    if period not in PERIOD_DAYS:
+        return Response({'error': 'Invalid period. Use: week, month, or year'},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    extra_cups = request.data.get('extra_cups', DEFAULT_SIMULATION_CUPS)
+    mg_per_cup = request.data.get('mg_per_cup', DEFAULT_MG_PER_CUP)
+    if not isinstance(extra_cups, list) or not extra_cups:
+        return Response({'error': 'extra_cups must be a non-empty list of numbers'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    try:
+        extra_cups = [float(cups) for cups in extra_cups]
+        mg_per_cup = float(mg_per_cup)
+    except (TypeError, ValueError):
+        return Response({'error': 'extra_cups and mg_per_cup must be numbers'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    if not all(math.isfinite(value) for value in [*extra_cups, mg_per_cup]) or mg_per_cup < 0:
+        return Response({'error': 'extra_cups must be finite and mg_per_cup a non-negative number'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    if len(extra_cups) > MAX_SIMULATION_POINTS:
+        return Response({'error': f'At most {MAX_SIMULATION_POINTS} grid points per request'},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    # Optional blood pressure override, within the range BloodPressureEntry accepts
+    bp_override = {}
+    for name, low, high in SIMULATION_BP_RANGES:
+        value = request.data.get(name)
+        if value in (None, ''):
+            continue
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            value = math.nan
+        if not math.isfinite(value) or not low <= value <= high:
+            return Response({'error': f'{name} must be a number between {low} and {high}'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        bp_override[name] = value
+    bp_override = bp_override if len(bp_override) == 2 else None
+
+    try:
+        baseline, curve = simulate_caffeine(
+            request.user.pk, [cups * mg_per_cup for cups in extra_cups], period, bp_override
+        )
+    except (FileNotFoundError, RuntimeError, ValueError) as e:
+        return Response({'error': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    return Response({
+        'period': period,
+        'mg_per_cup': mg_per_cup,
+        'baseline_avg_daily_mg': round(baseline, 2),
+        'points': [
+            {'extra_cups': cups, 'avg_daily_mg': round(daily_mg, 2), **risk}
+            for cups, (daily_mg, risk) in zip(extra_cups, curve)
+        ],
+    })
+
+
+MAX_BATCH_PREDICTIONS = 10000
+
+
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def generate_prediction_batch(request):
+    """
+    Score many people in one model call (admin only).
+
+    Body: {"period": "week"|"month"|"year", "user_ids": [...]} to score users
+    from their stored data (all users with a health profile if user_ids is
+    omitted), or {"profiles": [{...}, ...]} to score raw feature records
+    (keys as in ml_model_utils.FEATURE_COLUMNS; missing keys use defaults).
+    """
+    from .ml_model_utils import FEATURE_COLUMNS, predict_proba_batch, prepare_features_batch, risk_from_probabilities
+    from .risk import PERIOD_DAYS, user_feature_columns
+
+    profiles = request.data.get('profiles')
+    if profiles is not None:
+        if not isinstance(profiles, list) or not all(isinstance(profile, dict) for profile in profiles):
+            return Response({'error': 'profiles must be a list of objects'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(profiles) > MAX_BATCH_PREDICTIONS:
+            return Response(
+                {'error': f'At most {MAX_BATCH_PREDICTIONS} profiles per request'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        columns = {name: [profile.get(name) for profile in profiles] for name in FEATURE_COLUMNS}
+        keys = [{'index': index} for index in range(len(profiles))]
+        period = None
+    else:
+        period = request.data.get('period', 'year')
+        if period not in PERIOD_DAYS:
+            return Response({'error': 'Invalid period. Use: week, month, or year'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        user_ids = request.data.get('user_ids')
+        if user_ids is not None:
+            if not isinstance(user_ids, list) or not all(isinstance(pk, int) for pk in user_ids):
+                return Response({'error': 'user_ids must be a list of integers'}, status=status.HTTP_400_BAD_REQUEST)
+            if len(user_ids) > MAX_BATCH_PREDICTIONS:
+                return Response(
+                    {'error': f'At most {MAX_BATCH_PREDICTIONS} users per request'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        scored_ids, columns = user_feature_columns(user_ids, period)
+        keys = [{'user_id': user_id} for user_id in scored_ids]
+
+    try:
+        features = prepare_features_batch(columns)
+    except (TypeError, ValueError) as e:
+        return Response({'error': f'Invalid feature values: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        risks = risk_from_probabilities(predict_proba_batch(features))
+    except (FileNotFoundError, RuntimeError, ValueError) as e:
+        return Response({'error': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
     return Response({
         'period': period,
-        'risk_probability': round(risk_probability, 3),
-        'risk_percentage': risk_percentage,
-        'risk_category': risk_category,
-        'caffeine_stats': {
-            'total_mg': round(total_caffeine, 2),
-            'avg_daily_mg': round(avg_daily_caffeine, 2),
-            'num_coffees': num_coffees
-        },
-        'used_bp': bp_entry,
-        'risk_factors': risk_factors,
-        'missing_fields': missing_fields,
-        'note': 'This prediction is generated using a trained machine learning model based on your health profile, caffeine consumption, and blood pressure data.'
+        'count': len(risks),
+        'results': [{**key, **risk} for key, risk in zip(keys, risks)],
     })
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def prediction_metrics(request):
+    """
+    Prediction metrics of this worker process (admin only): micro-batch
+    sizes, the time single-row predictions waited for their batch,
+    prediction cache hits and misses, the served model version and how a
+    shadow candidate agrees with it. ?reset=true starts a new measurement
+    period (and empties the cache).
+    """
+    from .batching import get_prediction_batcher
+    from .model_registry import get_registry
+    from .prediction_cache import get_prediction_cache
+
+    batcher = get_prediction_batcher()
+    cache = get_prediction_cache()
+    registry = get_registry()
+    metrics = {
+        'pid': os.getpid(),
+        'batching': batcher.metrics(),
+        'cache': cache.metrics(),
+        'model': registry.status(),
+        'shadow': registry.shadow_stats.as_dict(),
+    }
+    if request.query_params.get('reset') == 'true':
+        batcher.reset_metrics()
+        cache.clear()
+    return Response(metrics)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def latency_metrics(request):
+    """
+    Latency histograms of this worker process (admin only), by span name:
+    count, mean/min/max, approximate p50/p90/p99 and bucket counts in ms.
+    ?reset=true starts a new measurement period.
+    """
+    payload = {'pid': os.getpid(), 'timings': timings()}
+    if request.query_params.get('reset') == 'true':
+        reset_timings()
+    return Response(payload)
@@ -188,10 +188,57 @@ else:
         "default": {
             "ENGINE": "django.db.backends.sqlite3",
             "NAME": os.path.join(BASE_DIR, "db.sqlite3"),
+            # On disk rather than in memory, so tests can reach it from
+            # worker processes (export_heart_risk_dataset --workers)
+            "TEST": {"NAME": os.path.join(BASE_DIR, "test_db.sqlite3")},
         }
     }
 
 
+# Caches
+# The `catalogue` cache stores serialized public catalogue responses (see coffee/cache.py).
+# CATALOGUE_CACHE_BACKEND selects where they live:
+#   'locmem' - in-process LRU cache (default)
+#   'file'   - on-disk cache under CATALOGUE_CACHE_DIR
+#   'redis'  - cache shared by all workers at REDIS_URL; falls back to the
+#              in-process cache when REDIS_URL or the redis package is missing
+CATALOGUE_CACHE_BACKEND = os.environ.get('CATALOGUE_CACHE_BACKEND', 'locmem')
+CATALOGUE_CACHE_TIMEOUT = int(os.environ.get('CATALOGUE_CACHE_TIMEOUT', 300))
+REDIS_URL = os.environ.get('REDIS_URL')
+
+try:
+    import redis  # noqa: F401
+    HAS_REDIS = True
+except ImportError:
+    HAS_REDIS = False
+
+if CATALOGUE_CACHE_BACKEND == 'redis' and REDIS_URL and HAS_REDIS:
+    CATALOGUE_CACHE = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": REDIS_URL,
+        "KEY_PREFIX": "coffee",
+    }
+elif CATALOGUE_CACHE_BACKEND == 'file':
+    CATALOGUE_CACHE = {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.environ.get('CATALOGUE_CACHE_DIR', os.path.join(BASE_DIR, "cache", "catalogue")),
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    }
+else:
+    CATALOGUE_CACHE = {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "coffee-catalogue",
+        "OPTIONS": {"MAX_ENTRIES": 1000},
+    }
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "catalogue": CATALOGUE_CACHE,
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -237,3 +284,34 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 # Groq API Configuration (Free AI Service)
 GROQ_API_KEY = os.environ.get('GROQ_API_KEY', '')
+
+# Heart-risk model: load it at startup instead of on the first prediction.
+# gunicorn.conf.py turns this on so the model is loaded before workers fork.
+ML_PRELOAD_MODEL = os.environ.get('ML_PRELOAD_MODEL', 'False') == 'True'
+
+# Concurrent single-row predictions arriving within this window (ms) are
+# scored in one model call, up to ML_BATCH_MAX_SIZE rows. 0 disables batching;
+# gunicorn.conf.py sets a window when workers run several threads.
+ML_BATCH_WINDOW_MS = float(os.environ.get('ML_BATCH_WINDOW_MS', 0))
+ML_BATCH_MAX_SIZE = int(os.environ.get('ML_BATCH_MAX_SIZE', 64))
+
+# Per-process cache of predictions, keyed by feature vector and model version
+ML_PREDICTION_CACHE_SIZE = int(os.environ.get('ML_PREDICTION_CACHE_SIZE', 4096))
+ML_PREDICTION_CACHE_TTL = int(os.environ.get('ML_PREDICTION_CACHE_TTL', 600))
+
+# Model versions (coffee/model_registry.py): how often workers check the
+# ACTIVE/SHADOW markers (seconds), how many loaded versions each keeps, and
+# the share of live prediction batches scored by a shadow candidate.
+ML_MODEL_CHECK_INTERVAL = float(os.environ.get('ML_MODEL_CHECK_INTERVAL', 5))
+ML_MODEL_KEEP_VERSIONS = int(os.environ.get('ML_MODEL_KEEP_VERSIONS', 2))
+ML_SHADOW_SAMPLE_RATE = float(os.environ.get('ML_SHADOW_SAMPLE_RATE', 1.0))
+
+# Share of traced requests (see coffee/timing.py) logged at INFO with their
+# per-stage timings; latency histograms at /api/metrics/ cover every request.
+ML_TRACE_SAMPLE_RATE = float(os.environ.get('ML_TRACE_SAMPLE_RATE', 0.01))
+
+# Caffeine timeline (coffee/caffeine_timeline.py): default elimination and
+# absorption half-lives, and how long a computed timeline may stay cached.
+CAFFEINE_HALF_LIFE_HOURS = float(os.environ.get('CAFFEINE_HALF_LIFE_HOURS', 5.0))
+CAFFEINE_ABSORPTION_HALF_LIFE_MINUTES = float(os.environ.get('CAFFEINE_ABSORPTION_HALF_LIFE_MINUTES', 15.0))
+CAFFEINE_TIMELINE_CACHE_TIMEOUT = int(os.environ.get('CAFFEINE_TIMELINE_CACHE_TIMEOUT', 3600))
@@ -0,0 +1,39 @@
+"""
+Gunicorn configuration (read automatically from the working directory).
+
+The Django app is loaded in the master process before the workers are forked
+(preload_app), with ML_PRELOAD_MODEL on, so the heart-risk model and sklearn
+are imported once per host and shared copy-on-write by every worker.
+
+With GUNICORN_THREADS > 1 each worker serves requests in that many threads
+(gthread), and concurrent predictions within a worker are micro-batched
+(coffee/batching.py); sync workers handle one request at a time, so
+batching stays off for them.
+"""
+import gc
+import os
+
+# Read by settings.py when the app is preloaded below
+os.environ.setdefault('ML_PRELOAD_MODEL', 'True')
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:' + os.environ.get('PORT', '8000'))
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
+if threads > 1:
+    worker_class = 'gthread'
+    # Read by settings.py, like ML_PRELOAD_MODEL
+    os.environ.setdefault('ML_BATCH_WINDOW_MS', '3')
+preload_app = True
+
+
+def when_ready(server):
+    # Move everything loaded so far out of the collector's generations, so
+    # collections in the workers do not write to (and un-share) those pages
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # Locks and loader/shadow threads of the master are not usable in the worker
+    from coffee.model_registry import get_registry
+
+    get_registry().after_fork()
@@ -623,7 +623,9 @@ export const CoffeeProvider = ({ children }) => {
             const resp = await authenticatedFetch(`${API_ROOT}/favorites/`);
             
             if (resp.ok) {
-                const favoritesList = await resp.json();
+                const json = await resp.json();
+                // Paginated response: unwrap `.results`
+                const favoritesList = Array.isArray(json) ? json : Array.isArray(json.results) ? json.results : [];
                 setFavorites(favoritesList);
             }
         } catch (error) {
@@ -64,7 +64,9 @@ export default function MyRecipes() {
                     });
                     
                     if (response.ok) {
-                        const userRecipes = await response.json();
+                        const json = await response.json();
+                        // Paginated response: unwrap `.results`
+                        const userRecipes = Array.isArray(json) ? json : Array.isArray(json.results) ? json.results : [];
                         setMyRecipes(userRecipes);
                     } else {
                         console.error('Failed to fetch my recipes:', response.status);
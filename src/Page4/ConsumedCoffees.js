@@ -13,7 +13,8 @@ export default function ConsumedCoffees() {
         last_7_days: [],
         last_month: [],
         last_year: [],
-        all: []
+        all: [],
+        counts: {}
     });
     const [loading, setLoading] = useState(true);
     const [error, setError] = useState(null);
@@ -56,7 +57,9 @@ export default function ConsumedCoffees() {
             });
             
             if (response.ok) {
-                const recipes = await response.json();
+                const json = await response.json();
+                // Paginated response: unwrap `.results`
+                const recipes = Array.isArray(json) ? json : Array.isArray(json.results) ? json.results : [];
                 setMyRecipes(recipes);
             }
         } catch (err) {
@@ -67,20 +70,38 @@ export default function ConsumedCoffees() {
     const fetchConsumedCoffees = async () => {
         try {
             setLoading(true);
-            const response = await authenticatedFetch(`${API_URL}/consumed/`, {
-                method: 'GET',
-                headers: {
-                    'Content-Type': 'application/json'
+            // The last year's history, following the cursor until the last page
+            const since = new Date();
+            since.setDate(since.getDate() - 365);
+            const params = new URLSearchParams({ from: since.toISOString().slice(0, 10), page_size: 200 });
+            let url = `${API_URL}/consumed/?${params}`;
+            let rows = [];
+            let counts = {};
+            while (url) {
+                const response = await authenticatedFetch(url, {
+                    method: 'GET',
+                    headers: {
+                        'Content-Type': 'application/json'
+                    }
+                });
+
+                if (!response.ok) {
+                    const errorData = await response.json().catch(() => ({ detail: 'Failed to fetch consumed coffees' }));
+                    throw new Error(errorData.detail || errorData.error || 'Failed to fetch consumed coffees');
                 }
-            });
 
-            if (!response.ok) {
-                const errorData = await response.json().catch(() => ({ detail: 'Failed to fetch consumed coffees' }));
-                throw new Error(errorData.detail || errorData.error || 'Failed to fetch consumed coffees');
+                const data = await response.json();
+                rows = rows.concat(data.results || []);
+                counts = data.counts || counts;
+                url = data.next;
             }
 
-            const data = await response.json();
-            setConsumedCoffees(data);
+            // Rows come once, tagged with their buckets; rebuild the per-tab lists
+            const grouped = { today: [], yesterday: [], last_7_days: [], last_month: [], last_year: [], all: rows };
+            grouped.all.forEach(entry => {
+                (entry.buckets || []).forEach(bucket => grouped[bucket] && grouped[bucket].push(entry));
+            });
+            setConsumedCoffees({ ...grouped, counts });
             setError(null);
         } catch (err) {
             setError(err.message);
@@ -404,31 +425,31 @@ export default function ConsumedCoffees() {
                         className={`${styles.tab} ${activeTab === 'today' ? styles.activeTab : ''}`}
                         onClick={() => setActiveTab('today')}
                     >
-                        Today ({consumedCoffees.today.length})
+                        Today ({consumedCoffees.counts.today ?? consumedCoffees.today.length})
                     </button>
                     <button
                         className={`${styles.tab} ${activeTab === 'yesterday' ? styles.activeTab : ''}`}
                         onClick={() => setActiveTab('yesterday')}
                     >
-                        Yesterday ({consumedCoffees.yesterday.length})
+                        Yesterday ({consumedCoffees.counts.yesterday ?? consumedCoffees.yesterday.length})
                     </button>
                     <button
                         className={`${styles.tab} ${activeTab === 'last_7_days' ? styles.activeTab : ''}`}
                         onClick={() => setActiveTab('last_7_days')}
                     >
-                        Last 7 Days ({consumedCoffees.last_7_days.length})
+                        Last 7 Days ({consumedCoffees.counts.last_7_days ?? consumedCoffees.last_7_days.length})
                     </button>
                     <button
                         className={`${styles.tab} ${activeTab === 'last_month' ? styles.activeTab : ''}`}
                         onClick={() => setActiveTab('last_month')}
                     >
-                        Last Month ({consumedCoffees.last_month.length})
+                        Last Month ({consumedCoffees.counts.last_month ?? consumedCoffees.last_month.length})
                     </button>
                     <button
                         className={`${styles.tab} ${activeTab === 'last_year' ? styles.activeTab : ''}`}
                         onClick={() => setActiveTab('last_year')}
                     >
-                        Last Year ({consumedCoffees.last_year.length})
+                        Last Year ({consumedCoffees.counts.last_year ?? consumedCoffees.last_year.length})
                     </button>
                 </div>
 